@@ -0,0 +1,281 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Benchmark grep() and grep_iter() on synthetic corpora, for every input type and flag.
+
+Usage (from benchmarks dir):
+
+    python bench.py --output results.json
+    python bench.py --baseline results.json --threshold 0.2
+
+Results are saved as json, with the best time of every case, lines per second, MB per second and peak memory. When a
+baseline is given, every case is compared to it and the script exits with status 1 if any case got slower than the
+threshold (or returned different results), so it can be used to gate changes. Baselines are only comparable when
+created on the same machine, with the same corpus size.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import re
+import shutil
+import sys
+import tempfile
+import time
+from collections import deque
+
+# to make the imports work when running from benchmarks dir
+if __package__ is None:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import grepfunc
+import corpus
+
+# memory measuring is only available in python 3
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# flags to benchmark, by name
+FLAG_SETS = [
+    ('none', {}),
+    ('F', {'F': True}),
+    ('i', {'i': True}),
+    ('w', {'w': True}),
+    ('x', {'x': True}),
+    ('v', {'v': True}),
+    ('A2B2', {'A': 2, 'B': 2}),
+    ('o', {'o': True}),
+    ('n', {'n': True}),
+    ('b', {'b': True}),
+    ('c', {'c': True}),
+    ('q', {'q': True}),
+    ('m10', {'m': 10}),
+]
+
+# input types to benchmark
+INPUT_TYPES = ['str', 'list', 'generator', 'file', 'bytes_file', 'callable']
+
+# functions to benchmark
+FUNCTIONS = ['grep', 'grep_iter']
+
+# block size to grep string targets with (without it, a string is a single line)
+STR_BLOCK_SIZE = 64 * 1024
+
+# a case must be slower by at least this many seconds to count as a regression, to ignore timer noise
+MIN_REGRESSION_SECONDS = 0.002
+
+
+def build_corpora(lines):
+    """
+    Build the benchmark corpora.
+    :param lines: Number of lines in the log corpora (other corpora are scaled to about the same size in bytes).
+    :return: List of (name, lines, pattern, base flags).
+    """
+    log = corpus.log_lines(lines)
+    return [
+        ('log_sparse', log, corpus.HIT_LEVEL, {}),
+        ('log_dense', corpus.log_lines(lines, hit_rate=0.5, seed=5), corpus.HIT_LEVEL, {}),
+        ('long_lines', corpus.long_lines(max(1, lines // 20)), corpus.HIT_LEVEL, {}),
+        ('unicode', corpus.unicode_lines(lines), u'größe', {}),
+        ('fixed_list', log, corpus.fixed_strings(1000), {'F': True}),
+    ]
+
+
+def build_cases(corpora, temp_dir, inputs, functions, name_filter):
+    """
+    Build all benchmark cases.
+    :return: List of (case name, function, target factory, pattern, flags, lines count, size in bytes).
+    """
+    cases = []
+    for corpus_name, lines, pattern, base_flags in corpora:
+        text = u'\n'.join(lines) + u'\n'
+        size = len(text.encode('utf-8'))
+
+        # write corpus file for the file input type
+        path = os.path.join(temp_dir, corpus_name + '.txt')
+        with io.open(path, 'w', encoding='utf-8', newline='\n') as outfile:
+            outfile.write(text)
+
+        # target factories (a new target for every run, since generators and files are consumed)
+        factories = {
+            'str': lambda text=text: text,
+            'list': lambda lines=lines: lines,
+            'generator': lambda lines=lines: (line for line in lines),
+            'file': lambda path=path: io.open(path, 'r', encoding='utf-8'),
+            'bytes_file': lambda path=path: io.open(path, 'rb'),
+            'callable': lambda lines=lines: lambda: lines,
+        }
+
+        for input_type in inputs:
+            for function in functions:
+                for flags_name, flags in FLAG_SETS:
+
+                    # grep_iter doesn't support count and quiet
+                    if function == 'grep_iter' and (flags.get('c') or flags.get('q')):
+                        continue
+
+                    name = '%s/%s/%s/%s' % (corpus_name, input_type, function, flags_name)
+                    if name_filter and not re.search(name_filter, name):
+                        continue
+                    case_flags = dict(base_flags, **flags)
+                    if input_type == 'str':
+                        case_flags['block_size'] = STR_BLOCK_SIZE
+                    case_pattern = pattern
+                    if input_type == 'bytes_file':
+                        case_pattern = __encode_pattern(pattern)
+                    cases.append((name, function, factories[input_type], case_pattern, case_flags, len(lines), size))
+    return cases
+
+
+def __encode_pattern(pattern):
+    """
+    Encode a pattern (or a list of fixed strings) to match bytes lines.
+    """
+    if isinstance(pattern, list):
+        return [p.encode('utf-8') for p in pattern]
+    return pattern.encode('utf-8')
+
+
+def run_once(function, factory, pattern, flags):
+    """
+    Run a single grep.
+    :return: Number of matches (or count result, or quiet result as 0 / 1).
+    """
+    target = factory()
+    try:
+        if function == 'grep':
+            result = grepfunc.grep(target, pattern, **flags)
+            return len(result) if isinstance(result, list) else int(result)
+        count = [0]
+
+        def counted(values):
+            for value in values:
+                count[0] += 1
+                yield value
+        deque(counted(grepfunc.grep_iter(target, pattern, **flags)), maxlen=0)
+        return count[0]
+    finally:
+        if hasattr(target, 'close'):
+            target.close()
+
+
+def run_case(case, repeat, measure_memory):
+    """
+    Run a single benchmark case.
+    :return: Dictionary with the case results.
+    """
+    name, function, factory, pattern, flags, lines, size = case
+
+    # compile once so we only measure grepping
+    matcher = grepfunc.compile(pattern, **flags)
+
+    # time the best of several runs
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        matches = run_once(function, factory, matcher, {})
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    best = max(best, 1e-9)
+
+    # measure peak memory in a separate run, since tracing allocations makes it slower
+    peak = None
+    if measure_memory and tracemalloc is not None:
+        tracemalloc.start()
+        run_once(function, factory, matcher, {})
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        'seconds': best,
+        'lines_per_sec': lines / best,
+        'mb_per_sec': size / best / (1024 * 1024),
+        'peak_kb': None if peak is None else peak // 1024,
+        'matches': matches,
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare results to a baseline.
+    :return: List of problem descriptions (empty if there are no regressions).
+    """
+    problems = []
+    if baseline.get('lines') != results['lines']:
+        return ["baseline was created with %s lines, but current run has %s lines." %
+                (baseline.get('lines'), results['lines'])]
+    for name, current in sorted(results['cases'].items()):
+        old = baseline['cases'].get(name)
+        if old is None:
+            continue
+        if old['matches'] != current['matches']:
+            problems.append("%s: returned %d matches, baseline returned %d." % (name, current['matches'],
+                                                                                old['matches']))
+        elif current['seconds'] > old['seconds'] * (1 + threshold) and \
+                current['seconds'] - old['seconds'] > MIN_REGRESSION_SECONDS:
+            problems.append("%s: %.4fs, baseline %.4fs (%.0f%% slower)." % (
+                name, current['seconds'], old['seconds'], (current['seconds'] / old['seconds'] - 1) * 100))
+    return problems
+
+
+def main(argv=None):
+    """
+    Run benchmarks from command line.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark grepfunc.")
+    parser.add_argument('--lines', type=int, default=20000, help="number of lines in corpora (default: 20000).")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per case, best time is used (default: 3).")
+    parser.add_argument('--filter', help="only run cases with names matching this regex, like 'log_sparse/file'.")
+    parser.add_argument('--inputs', default=','.join(INPUT_TYPES), help="comma separated input types to run.")
+    parser.add_argument('--functions', default=','.join(FUNCTIONS), help="comma separated functions to run.")
+    parser.add_argument('--no-memory', action='store_true', help="don't measure peak memory.")
+    parser.add_argument('--output', help="save results to this json file.")
+    parser.add_argument('--baseline', help="compare results to this json file, and exit with 1 on regressions.")
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help="allowed slowdown relative to baseline (default: 0.15, eg 15%%).")
+    args = parser.parse_args(argv)
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        corpora = build_corpora(args.lines)
+        cases = build_cases(corpora, temp_dir, args.inputs.split(','), args.functions.split(','), args.filter)
+
+        # run all cases
+        results = {
+            'python': platform.python_version(),
+            'grepfunc': grepfunc.__version__,
+            'lines': args.lines,
+            'cases': {},
+        }
+        print("%-48s %10s %14s %10s %10s %9s" % ('case', 'seconds', 'lines/s', 'MB/s', 'peak KB', 'matches'))
+        for case in cases:
+            result = run_case(case, args.repeat, not args.no_memory)
+            results['cases'][case[0]] = result
+            print("%-48s %10.4f %14.0f %10.2f %10s %9d" % (case[0], result['seconds'], result['lines_per_sec'],
+                                                          result['mb_per_sec'], result['peak_kb'], result['matches']))
+    finally:
+        shutil.rmtree(temp_dir)
+
+    # save results
+    if args.output:
+        with open(args.output, 'w') as outfile:
+            json.dump(results, outfile, indent=2, sort_keys=True)
+
+    # compare to baseline
+    if args.baseline:
+        with open(args.baseline, 'r') as infile:
+            baseline = json.load(infile)
+        problems = compare(results, baseline, args.threshold)
+        for problem in problems:
+            print("REGRESSION: " + problem)
+        if problems:
+            return 1
+        print("No regressions compared to baseline.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
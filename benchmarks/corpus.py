@@ -0,0 +1,87 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Deterministic synthetic corpora for the benchmarks.
+Every generator gets a number of lines and a seed, and always returns the same lines for the same arguments.
+"""
+import random
+
+# words to build lines from
+_WORDS = ['request', 'user', 'session', 'timeout', 'connection', 'database', 'query', 'cache', 'server', 'client',
+          'started', 'finished', 'failed', 'retry', 'token', 'upload', 'download', 'worker', 'queue', 'message']
+
+# non-ascii words, for the unicode corpus
+_UNICODE_WORDS = [u'größe', u'café', u'naïve', u'Ærø', u'łódź', u'привет', u'мир', u'γειά', u'σου', u'日本語',
+                  u'テキスト', u'שלום', u'مرحبا', u'İstanbul', u'façade', u'jalapeño', u'smörgåsbord', u'crème']
+
+# log levels, and the one we search for
+_LEVELS = ['INFO', 'DEBUG', 'WARNING']
+HIT_LEVEL = 'ERROR'
+
+
+def log_lines(count, hit_rate=0.001, seed=1):
+    """
+    Generate log-like lines, where hit_rate of the lines have the 'ERROR' level.
+    :return: List of lines (without end-of-line).
+    """
+    rand = random.Random(seed)
+    ret = []
+    for index in range(count):
+        level = HIT_LEVEL if rand.random() < hit_rate else rand.choice(_LEVELS)
+        words = ' '.join(rand.choice(_WORDS) for _ in range(rand.randint(3, 12)))
+        ret.append('2017-03-%02d %02d:%02d:%02d.%03d %s [worker-%d] %s id=%d' % (
+            index % 28 + 1, index // 3600 % 24, index // 60 % 60, index % 60, index % 1000, level, rand.randint(1, 32),
+            words, rand.randint(0, 10 ** 9)))
+    return ret
+
+
+def long_lines(count, hit_rate=0.001, seed=2, length=2000):
+    """
+    Generate long lines of about 'length' characters, where hit_rate of the lines contain 'ERROR' near their end.
+    :return: List of lines (without end-of-line).
+    """
+    rand = random.Random(seed)
+    ret = []
+    for _ in range(count):
+        words = []
+        size = 0
+        while size < length:
+            word = rand.choice(_WORDS)
+            words.append(word)
+            size += len(word) + 1
+        if rand.random() < hit_rate:
+            words.insert(len(words) - 3, HIT_LEVEL)
+        ret.append(' '.join(words))
+    return ret
+
+
+def unicode_lines(count, hit_rate=0.001, seed=3):
+    """
+    Generate lines of mixed ascii and non-ascii words, where hit_rate of the lines contain the word u'größe'.
+    :return: List of lines (without end-of-line).
+    """
+    rand = random.Random(seed)
+    words = [w for w in _UNICODE_WORDS if w != u'größe'] + _WORDS
+    ret = []
+    for _ in range(count):
+        line = [rand.choice(words) for _ in range(rand.randint(4, 14))]
+        if rand.random() < hit_rate:
+            line.insert(rand.randint(0, len(line)), u'größe')
+        ret.append(u' '.join(line))
+    return ret
+
+
+def fixed_strings(count, seed=4):
+    """
+    Generate a list of distinct fixed strings to search, like a list of ids or tokens. About 1 in 50 of them are
+    words that appear in the other corpora.
+    :return: List of strings.
+    """
+    rand = random.Random(seed)
+    ret = set()
+    while len(ret) < count:
+        if rand.random() < 0.02:
+            ret.add('%s %s' % (rand.choice(_WORDS), rand.choice(_WORDS)))
+        else:
+            ret.add('tok%x' % rand.getrandbits(40))
+    return sorted(ret)
@@ -1,6 +1,10 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
-__all__ = ['grep', 'grep_iter', ]
+__all__ = ['grep', 'grep_iter', 'compile', 'Matcher', 'grep_file', 'grep_file_iter', 'grep_paths', 'grep_paths_iter',
+           'grep_indices', 'grep_mask', 'build_index', 'TrigramIndex', 'ResultCache',
+           'GrepStats', 'grep_multi', 'grep_follow', 'FollowCheckpoint', 'GrepResults',
+           'GrepMatch', 'build_line_index', 'LineIndex', 'register_backend', 'available_backends',
+           'GrepTimeout', 'grep_batches', 'grep_batches_iter', 'grep_aiter', ]
 
 __title__ = 'grepfunc'
 __version__ = '1.0.3'
@@ -10,4 +14,58 @@ __license__ = 'MIT'
 from . import grepfunc as _grepfunc
 grep = _grepfunc.grep
 grep_iter = _grepfunc.grep_iter
+compile = _grepfunc.compile
+Matcher = _grepfunc.Matcher
 
+from . import backends as _backends
+register_backend = _backends.register_backend
+available_backends = _backends.available_backends
+
+from . import limits as _limits
+GrepTimeout = _limits.GrepTimeout
+
+from . import results as _results
+GrepResults = _results.GrepResults
+GrepMatch = _results.GrepMatch
+
+from . import files as _files
+grep_file = _files.grep_file
+grep_file_iter = _files.grep_file_iter
+grep_paths = _files.grep_paths
+grep_paths_iter = _files.grep_paths_iter
+
+from . import batch as _batch
+grep_indices = _batch.grep_indices
+grep_mask = _batch.grep_mask
+
+from . import index as _index
+build_index = _index.build_index
+TrigramIndex = _index.TrigramIndex
+
+from . import cache as _cache
+ResultCache = _cache.ResultCache
+
+from . import stats as _stats
+GrepStats = _stats.GrepStats
+
+from . import multi as _multi
+grep_multi = _multi.grep_multi
+
+from . import follow as _follow
+grep_follow = _follow.grep_follow
+FollowCheckpoint = _follow.FollowCheckpoint
+
+from . import lineindex as _lineindex
+build_line_index = _lineindex.build_line_index
+LineIndex = _lineindex.LineIndex
+
+from . import chunked as _chunked
+grep_batches = _chunked.grep_batches
+grep_batches_iter = _chunked.grep_batches_iter
+
+# async grep requires python 3.6 or newer
+try:
+    from . import aio as _aio
+    grep_aiter = _aio.grep_aiter
+except SyntaxError:
+    __all__.remove('grep_aiter')
@@ -0,0 +1,121 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Aho-Corasick automaton to match a large list of fixed strings in a single pass.
+
+Author: Ronen Ness.
+Since: 2017.
+"""
+
+
+class AhoCorasick(object):
+    """
+    Multi-pattern automaton, built once per patterns list.
+    Matching follows the same rules as trying every pattern with str.find() in list order: the result is the first
+    pattern (by list index) that appears in text, at its first position.
+    """
+
+    def __init__(self, patterns):
+        """
+        Build the automaton.
+        :param patterns: List of strings to match.
+        """
+        self.patterns = tuple(patterns)
+        self.lengths = tuple(len(p) for p in self.patterns)
+
+        # index of the first empty pattern, which matches any text at position 0
+        self.empty_index = -1
+
+        # states transitions, failure links, and the lowest pattern index that ends at every state (or -1)
+        goto = [{}]
+        best = [-1]
+
+        # build the trie
+        for index, pattern in enumerate(self.patterns):
+
+            # empty pattern always match at 0, no need to add to trie
+            if not pattern:
+                if self.empty_index == -1:
+                    self.empty_index = index
+                continue
+
+            # add pattern to trie
+            state = 0
+            for c in pattern:
+                next_state = goto[state].get(c)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][c] = next_state
+                    goto.append({})
+                    best.append(-1)
+                state = next_state
+
+            # set output (first index wins for duplicated patterns)
+            if best[state] == -1:
+                best[state] = index
+
+        # build failure links with BFS, and merge outputs from failure states
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for state in queue:
+            for c, next_state in goto[state].items():
+                queue.append(next_state)
+
+                # find the longest proper suffix that is also in trie
+                f = fail[state]
+                while f and c not in goto[f]:
+                    f = fail[f]
+                f = goto[f].get(c, 0)
+                fail[next_state] = f
+
+                # lowest index of all patterns ending at this state, including suffixes
+                if best[f] != -1 and (best[next_state] == -1 or best[f] < best[next_state]):
+                    best[next_state] = best[f]
+
+        self._goto = goto
+        self._fail = fail
+        self._best = best
+
+    def __len__(self):
+        """
+        Return number of patterns.
+        """
+        return len(self.patterns)
+
+    def search(self, text):
+        """
+        Search text for patterns.
+        :param text: Text to search.
+        :return: (pattern index, position) of the first pattern in list order found in text, or (-1, -1).
+        """
+        goto = self._goto
+        fail = self._fail
+        best = self._best
+        lengths = self.lengths
+
+        # empty pattern match at 0, and if its the first pattern nothing else can win
+        found_index = self.empty_index
+        found_pos = 0 if found_index != -1 else -1
+        if found_index == 0:
+            return 0, 0
+
+        # scan text
+        state = 0
+        for i, c in enumerate(text):
+
+            # follow failure links until we can advance with current char
+            next_state = goto[state].get(c)
+            while next_state is None and state:
+                state = fail[state]
+                next_state = goto[state].get(c)
+            state = next_state or 0
+
+            # check if got a better pattern ending here
+            index = best[state]
+            if index != -1 and (found_index == -1 or index < found_index):
+                found_index = index
+                found_pos = i - lengths[index] + 1
+                if index == 0:
+                    break
+
+        return found_index, found_pos
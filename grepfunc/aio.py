@@ -0,0 +1,186 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Grep for asyncio streams and async iterators, without blocking the event loop.
+Requires Python 3.6 or newer.
+
+Author: Ronen Ness.
+Since: 2017.
+"""
+import asyncio
+import codecs
+import inspect
+from itertools import islice
+from . import grepfunc as _grepfunc
+
+# default number of bytes to read from a stream at once
+_READ_SIZE = 64 * 1024
+
+# batches of lines with at least this many characters are grepped in an executor, so they won't block the event loop
+_EXECUTOR_MIN_SIZE = 64 * 1024
+
+# how many values to get at once when grepping a regular (not async) target in an executor
+_SYNC_BATCH = 1024
+
+
+async def grep_aiter(target, pattern, **kwargs):
+    """
+    Grep an async target, as an async iterator.
+    Matching large batches of lines (and grepping regular targets) runs in an executor, so even big inputs won't block
+    the event loop.
+    :param target: Target to apply grep on. Can be an asyncio.StreamReader (or any object with an async read()
+                   method), an async iterable of lines, or any target grep_iter() accepts (in which case grep_iter() is
+                   called in an executor). With text patterns bytes are decoded, and with bytes patterns bytes lines
+                   are matched as they are. End-of-line is removed from lines unless keep_eol is set (from streams,
+                   a '\\r' before it is removed too, for text patterns).
+    :param pattern: Grep pattern to search, or a Matcher returned by compile().
+    :param kwargs: See grep() help for info about flags. Like grep_iter(), doesn't support the 'quiet' or 'count'
+                   flags. If max_count is set, stops reading target right after the last match (and its trailing
+                   context). In addition, accept:
+
+        - encoding:              Encoding to decode bytes with (default to 'utf-8'). With bytes patterns, input is
+                                 not decoded, and only returned lines are decoded if encoding is set (like grep()).
+        - errors:                How to handle decoding errors (default to 'strict', see str.decode).
+        - executor:              Executor to run large batches in (default to the event loop default executor).
+        - read_size:             How many bytes to read from a stream at once (default to 64KB).
+
+    :return: Next match.
+    """
+    matcher = _grepfunc.compile(pattern, **kwargs)
+    flags = matcher.flags
+    loop = asyncio.get_event_loop()
+    executor = flags.get('executor')
+
+    # stream with async read(): read blocks and split to lines
+    if inspect.iscoroutinefunction(getattr(target, 'read', None)):
+        values = __grep_stream(target, matcher, loop, executor)
+
+    # async iterable of lines
+    elif hasattr(target, '__aiter__'):
+        values = __grep_async_lines(target, matcher)
+
+    # regular target: run grep_iter() in executor, batch by batch (grep_iter() decodes returned lines itself)
+    else:
+        values = __grep_in_executor(target, matcher, loop, executor)
+        async for value in values:
+            yield value
+        return
+
+    # decode returned lines of bytes patterns, if requested
+    encoding = _grepfunc._decode_encoding(matcher)
+    errors = flags.get('errors') or 'strict'
+    async for value in values:
+        yield _grepfunc._decode_value(value, encoding, errors) if encoding else value
+
+
+async def __grep_stream(stream, matcher, loop, executor):
+    """
+    Grep a stream with async read() method.
+    :return: Next match.
+    """
+    flags = matcher.flags
+    f_keep_eol = flags.get('keep_eol')
+    read_size = flags.get('read_size') or _READ_SIZE
+    state = _grepfunc._LinesState(flags)
+
+    # bytes patterns match bytes lines as they are, text patterns match decoded lines
+    is_bytes = matcher.is_bytes
+    eol = matcher.eol
+    decoder = None if is_bytes else \
+        codecs.getincrementaldecoder(flags.get('encoding') or 'utf-8')(flags.get('errors') or 'strict')
+
+    # incomplete last line from previous block
+    leftover = eol[:0]
+
+    while not state.done:
+
+        # read next block (empty block means end of stream)
+        data = await stream.read(read_size)
+        eof = not data
+        if isinstance(data, bytes) and not is_bytes:
+            data = decoder.decode(data, eof)
+
+        # split to lines, and keep incomplete last line for next block
+        buff = leftover + data if is_bytes else (leftover + data).replace('\r\n', '\n')
+        if not eof:
+            end = buff.rfind(eol) + 1
+            if not end:
+                leftover = buff
+                continue
+            buff, leftover = buff[:end - 1], buff[end:]
+        elif not buff:
+            break
+        lines = buff.split(eol)
+        if f_keep_eol:
+            lines = [line + eol for line in lines]
+
+        # grep lines, in executor if its a large batch
+        if len(buff) >= _EXECUTOR_MIN_SIZE:
+            values = await loop.run_in_executor(executor, __grep_batch, lines, matcher, state)
+        else:
+            values = __grep_batch(lines, matcher, state)
+        for value in values:
+            yield value
+
+        # if reached end of stream, stop
+        if eof:
+            break
+
+    for value in _grepfunc._grep_lines_end(matcher, state):
+        yield value
+
+
+async def __grep_async_lines(lines, matcher):
+    """
+    Grep an async iterable of lines.
+    :return: Next match.
+    """
+    flags = matcher.flags
+    encoding = flags.get('encoding') or 'utf-8'
+    errors = flags.get('errors') or 'strict'
+    strip_eol = not flags.get('keep_eol')
+    is_bytes = matcher.is_bytes
+    state = _grepfunc._LinesState(flags)
+
+    async for line in lines:
+        if isinstance(line, bytes) and not is_bytes:
+            line = line.decode(encoding, errors)
+        for value in _grepfunc._grep_lines((line,), matcher, state, strip_eol):
+            yield value
+
+        # if reached max_count, stop reading lines
+        if state.done:
+            break
+
+    for value in _grepfunc._grep_lines_end(matcher, state):
+        yield value
+
+
+async def __grep_in_executor(target, matcher, loop, executor):
+    """
+    Grep a regular target with grep_iter(), in an executor.
+    :return: Next match.
+    """
+    values = _grepfunc.grep_iter(target, matcher)
+    while True:
+        batch = await loop.run_in_executor(executor, __next_values, values, _SYNC_BATCH)
+        for value in batch:
+            yield value
+        if len(batch) < _SYNC_BATCH:
+            break
+
+
+def __grep_batch(lines, matcher, state):
+    """
+    Grep a batch of lines from a stream.
+    :return: List of matches.
+    """
+    return list(_grepfunc._grep_lines(lines, matcher, state))
+
+
+def __next_values(values, count):
+    """
+    Get the next values from an iterator.
+    :return: List of up to 'count' values.
+    """
+    return list(islice(values, count))
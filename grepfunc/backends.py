@@ -0,0 +1,144 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Matcher backends: the engines that match lines, selected by the 'backend' flag.
+
+Fixed strings are matched by the literal backends ('literal' searches every string with str.find(), and
+'multi_literal' uses an Aho-Corasick automaton). Regex patterns are matched by a regex engine, which is any object
+with a compile(pattern, flags) function that returns a compiled regex with search() and finditer() (like the python
+'re' module). The 're' engine is always available, 're2' is available if the re2 module is installed, and more
+engines can be added with register_backend().
+
+Author: Ronen Ness.
+Since: 2017.
+"""
+import re
+
+# linear-time regex engine (google-re2 or pyre2), if installed
+try:
+    import re2 as _re2
+except ImportError:
+    _re2 = None
+
+# names of the backends that match fixed strings
+LITERAL_BACKENDS = ('literal', 'multi_literal')
+
+# regex tokens that re2 matches differently than python (character classes and word boundaries are ascii-only in
+# re2, while python matches any unicode word character), so the 'auto' backend won't use re2 for patterns with them
+# (or with the words flag, which adds word boundaries)
+_RE2_UNSAFE_REGEX = re.compile(r'\\[wWbBdDsS]')
+
+# python regex flags that can be passed to re2 as inline flags (unicode is the default for text patterns)
+_RE2_INLINE_FLAGS = ((re.IGNORECASE, 'i'), (re.MULTILINE, 'm'), (re.DOTALL, 's'))
+_RE2_IGNORED_FLAGS = re.UNICODE
+
+
+class _Re2Engine(object):
+    """
+    Regex engine adapter for the re2 module, which runs in linear time (so it never backtracks catastrophically), but
+    doesn't support some python regex features (like back-references and lookarounds).
+    """
+    name = 're2'
+
+    # re2 never backtracks, so matching a line never needs to be interrupted
+    linear = True
+
+    def compile(self, pattern, flags=0):
+        """
+        Compile a pattern with re2. Python regex flags are converted to inline flags.
+        :return: Compiled regex.
+        """
+        inline = ''.join(char for flag, char in _RE2_INLINE_FLAGS if flags & flag)
+        flags &= ~(re.IGNORECASE | re.MULTILINE | re.DOTALL | _RE2_IGNORED_FLAGS)
+        if flags:
+            raise ValueError("re2 backend does not support regex flags %d." % flags)
+        if inline:
+            prefix = '(?%s)' % inline
+            pattern = (prefix if isinstance(pattern, type(u'')) else prefix.encode('ascii')) + pattern
+        return _re2.compile(pattern)
+
+
+# regex engines by name
+_ENGINES = {'re': re}
+if _re2 is not None:
+    _ENGINES['re2'] = _Re2Engine()
+
+
+def register_backend(name, engine):
+    """
+    Register a regex engine, to use by name as the backend flag.
+    :param name: Backend name.
+    :param engine: Regex engine: an object with a compile(pattern, flags) function that returns a compiled regex with
+                   search() and finditer() functions (like the python 're' module), where flags are python regex flags.
+                   Engine must match literal characters of patterns like python regex does, since lines that don't
+                   contain the literals a pattern requires (parsed as a python regex) are rejected without matching.
+                   If the engine has a 'linear' attribute set to true, matching is never interrupted by the
+                   line_timeout flag (since it can't backtrack catastrophically).
+    """
+    if name in LITERAL_BACKENDS or name == 'auto':
+        raise ValueError("Backend name '%s' is reserved." % name)
+    _ENGINES[name] = engine
+
+
+def available_backends():
+    """
+    Get the names of all available backends.
+    :return: List of names.
+    """
+    return sorted(_ENGINES) + list(LITERAL_BACKENDS) + ['auto']
+
+
+def _resolve(pattern, flags, automaton_min_patterns):
+    """
+    Pick the backend to match lines with, by the backend flag.
+    :param pattern: Pattern to match (after converting shortcuts, and with fixed_strings set for literal backends).
+    :param flags: Flags after converting shortcuts.
+    :param automaton_min_patterns: Minimal number of fixed strings to match with an automaton, by default.
+    :return: (backend name, regex engine), where regex engine is None for fixed strings.
+    """
+    backend = flags.get('backend')
+
+    # fixed strings are always matched by a literal backend
+    if flags.get('fixed_strings'):
+        if backend in LITERAL_BACKENDS:
+            return backend, None
+        is_list = not isinstance(pattern, (type(u''), bytes, str))
+        return 'multi_literal' if is_list and len(pattern) >= automaton_min_patterns else 'literal', None
+
+    # default regex engine
+    if backend is None or backend == 're':
+        return 're', re
+
+    # linear engine when it supports pattern, and python regex otherwise
+    if backend == 'auto':
+        if 're2' in _ENGINES and not flags.get('words') and \
+                not _RE2_UNSAFE_REGEX.search(pattern if isinstance(pattern, str) else pattern.decode('latin-1')):
+            try:
+                _ENGINES['re2'].compile(pattern, __regex_flags(flags))
+                return 're2', _ENGINES['re2']
+            except Exception:
+                pass
+        return 're', re
+
+    # engine by name, or engine object
+    if isinstance(backend, str):
+        if backend not in _ENGINES:
+            raise ValueError("Unknown backend '%s' (available backends: %s)." %
+                             (backend, ', '.join(available_backends())))
+        return backend, _ENGINES[backend]
+    return getattr(backend, 'name', None) or type(backend).__name__, backend
+
+
+def _is_linear(engine):
+    """
+    Return if a regex engine (or None, for literal backends) always matches in linear time.
+    """
+    return engine is None or bool(getattr(engine, 'linear', False))
+
+
+def __regex_flags(flags):
+    """
+    Get the python regex flags of a grep call.
+    """
+    re_flags = flags.get('regex_flags') or 0
+    return re_flags | (re.IGNORECASE if flags.get('ignore_case') else 0)
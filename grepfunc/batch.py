@@ -0,0 +1,133 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Grep large sequences of strings as a batch, returning indices or a boolean mask instead of the matching strings.
+If NumPy is installed, NumPy arrays of strings are matched with vectorized string operations when possible.
+
+Author: Ronen Ness.
+Since: 2017.
+"""
+import re
+from itertools import islice
+from . import grepfunc as _grepfunc
+
+# numpy is optional
+try:
+    import numpy as _np
+except ImportError:
+    _np = None
+
+# get python base string for either Python 2.x or 3.x
+try:
+    _basestring = basestring
+except NameError:
+    _basestring = str
+
+# how many array items to process at once in vectorized operations, to limit the size of temporary arrays
+ARRAY_CHUNK = 1024 * 1024
+
+
+def grep_indices(target, pattern, **kwargs):
+    """
+    Grep a sequence of strings and return the indices of matching items, instead of copies of the items.
+    :param target: List, tuple, or any iterable of strings (every item is a single line), or a 1-D NumPy array of
+                   strings.
+    :param pattern: Grep pattern to search, or a Matcher returned by compile().
+    :param kwargs: See grep() help for info about flags. Only flags that affect matching (like fixed_strings,
+                   ignore_case, invert, words, line, regex_flags and trim) and max_count are used.
+    :return: List of indices, or a NumPy array of indices if target is a NumPy array.
+    """
+    matcher = _grepfunc.compile(pattern, **kwargs)
+    max_count = matcher.flags.get('max_count') or None
+
+    # numpy array: use vectorized mask if possible
+    if _is_array(target):
+        mask = __array_mask(target, matcher)
+        if mask is not None:
+            return _np.flatnonzero(mask)[:max_count]
+        return _np.array(list(islice(_grepfunc._grep_indices(target.tolist(), matcher), max_count)), dtype=int)
+
+    return list(islice(_grepfunc._grep_indices(target, matcher), max_count))
+
+
+def grep_mask(target, pattern, **kwargs):
+    """
+    Grep a sequence of strings and return a boolean mask of matching items.
+    :param target: List, tuple, or any iterable of strings (every item is a single line), or a 1-D NumPy array of
+                   strings.
+    :param pattern: Grep pattern to search, or a Matcher returned by compile().
+    :param kwargs: See grep_indices().
+    :return: List of booleans, or a NumPy array of booleans if target is a NumPy array.
+    """
+    matcher = _grepfunc.compile(pattern, **kwargs)
+    max_count = matcher.flags.get('max_count') or None
+
+    # numpy array: use vectorized mask if possible
+    if _is_array(target):
+        mask = __array_mask(target, matcher)
+        if mask is None:
+            mask = _np.zeros(len(target), dtype=bool)
+            mask[list(islice(_grepfunc._grep_indices(target.tolist(), matcher), max_count))] = True
+        elif max_count and mask.sum() > max_count:
+            mask[_np.flatnonzero(mask)[max_count]:] = False
+        return mask
+
+    # build mask from indices
+    if not hasattr(target, '__len__'):
+        target = list(target)
+    mask = [False] * len(target)
+    for index in islice(_grepfunc._grep_indices(target, matcher), max_count):
+        mask[index] = True
+    return mask
+
+
+def _is_array(target):
+    """
+    Return if target is a numpy array.
+    """
+    return _np is not None and isinstance(target, _np.ndarray)
+
+
+def __array_mask(array, matcher):
+    """
+    Build matches mask for a numpy array with vectorized operations.
+    Only supported for 1-D arrays of strings, when pattern is a fixed string (or a list of fixed strings, or a regex
+    without special characters) and flags don't require ignoring case, checking words or trimming lines.
+    :return: Numpy array of booleans, or None if array or pattern are not supported.
+    """
+    flags = matcher.flags
+    pattern = matcher.pattern
+
+    # check if array is supported
+    if array.ndim != 1 or array.dtype.kind != 'U' or matcher.is_bytes:
+        return None
+
+    # check if pattern and flags are supported (note: lowering a whole array is slower than searching the items as a
+    # list, so ignore_case is not vectorized)
+    if flags.get('words') or flags.get('trim') or flags.get('ignore_case'):
+        return None
+    if flags.get('fixed_strings'):
+        patterns = [pattern] if isinstance(pattern, _basestring) else list(pattern)
+    elif isinstance(pattern, _basestring) and re.escape(pattern) == pattern and not flags.get('regex_flags'):
+        patterns = [pattern]
+    else:
+        return None
+
+    # numpy 2 has the new strings module, older versions only have char
+    strings = getattr(_np, 'strings', None) or _np.char
+
+    # match chunk by chunk
+    mask = _np.zeros(len(array), dtype=bool)
+    for start in range(0, len(array), ARRAY_CHUNK):
+        chunk = array[start:start + ARRAY_CHUNK]
+        chunk_mask = mask[start:start + ARRAY_CHUNK]
+        for p in patterns:
+            if flags.get('line'):
+                chunk_mask |= chunk == p
+            else:
+                chunk_mask |= strings.find(chunk, p) >= 0
+
+    # invert mask if needed
+    if flags.get('invert'):
+        mask = ~mask
+    return mask
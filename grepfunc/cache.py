@@ -0,0 +1,457 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Cache grep results, for repeated identical grep calls on targets that didn't change.
+
+Results are cached by the pattern, the flags (after converting shortcuts) and the target identity: for files its the
+path and the file size, modification time and inode, and for other targets its a key the caller provides. When a file
+only grew since its results were cached (like a log file), the cached results are reused and only the new lines are
+grepped.
+
+Author: Ronen Ness.
+Since: 2017.
+"""
+import hashlib
+import marshal
+import os
+import stat as _stat
+import sys
+import threading
+from collections import OrderedDict
+from itertools import islice
+from . import compressed as _compressed
+from . import files as _files
+from . import grepfunc as _grepfunc
+
+# get python base string for either Python 2.x or 3.x
+try:
+    _basestring = basestring
+except NameError:
+    _basestring = str
+
+# types of values that can be saved to cache files (python 2 also has long and unicode)
+try:
+    _PLAIN_TYPES = (type(None), bool, int, long, float, bytes, unicode)
+except NameError:
+    _PLAIN_TYPES = (type(None), bool, int, float, bytes, str)
+
+# beginning of cache files, and marshal format version of their data
+_FILE_MAGIC = b'GFRCACHE1\n'
+_MARSHAL_VERSION = 2
+
+# flags that don't change results, so they are not part of the cache key
+_IGNORED_FLAGS = frozenset(('cache', 'cache_key', 'index', 'line_index', 'stats', 'workers', 'chunk_size',
+                            'executor'))
+
+# how many bytes before the end of a cached file to compare, to check that the file was only appended to
+_TAIL_CHECK_SIZE = 4096
+
+# how many bytes to read at once when counting lines in a file
+_COUNT_LINES_CHUNK = 1024 * 1024
+
+
+class ResultCache(object):
+    """
+    Bounded LRU cache of grep results.
+    Pass it as the 'cache' flag of grep(), Matcher.grep() or grep_file() to reuse results of identical calls.
+    """
+
+    def __init__(self, max_entries=256, max_size=64 * 1024 * 1024, path=None):
+        """
+        Create the cache.
+        :param max_entries: Max number of cached results.
+        :param max_size: Max estimated memory size, in bytes, of all cached results.
+        :param path: Optional file path to save the cache to (see save()). If file exists, cached results are loaded
+                     from it (if its not a cache file, the cache starts empty and the file is replaced on save()).
+        """
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.path = path
+        self.size = 0
+        self.hits = 0
+        self.tail_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                self.load()
+            except ValueError:
+                pass
+
+    def __getstate__(self):
+        """
+        Don't pickle cached results (the cache is only used in the calling process, but flags are sent to worker
+        processes of grep_paths() and grep_file()).
+        """
+        return {'max_entries': self.max_entries, 'max_size': self.max_size}
+
+    def __setstate__(self, state):
+        """
+        Create an empty cache after unpickling.
+        """
+        self.__init__(state['max_entries'], state['max_size'])
+
+    def stats(self):
+        """
+        Get cache statistics.
+        :return: Dictionary with number of hits, tail hits (results reused for a file that was appended to), misses
+                 and evictions, and the current number of entries and their estimated size.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'tail_hits': self.tail_hits, 'misses': self.misses,
+                    'evictions': self.evictions, 'entries': len(self._entries), 'size': self.size}
+
+    def clear(self):
+        """
+        Remove all cached results (statistics are kept).
+        """
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def save(self, path=None):
+        """
+        Save cached results to file. Results are only reused after loading if their targets didn't change.
+        Only plain data is saved (keys, file identities and result values, with marshal), so results of calls with
+        flags that are objects (like a callback or a backend object) are not saved.
+        :param path: File path to save to (default to the path the cache was created with).
+        """
+        path = path or self.path
+        with self._lock:
+            data = [(key, entry.identity, entry.result, entry.lines, entry.tail_check)
+                    for key, entry in self._entries.items()]
+        data = [item for item in data if _is_plain(item)]
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as outfile:
+            outfile.write(_FILE_MAGIC)
+            outfile.write(marshal.dumps(data, _MARSHAL_VERSION))
+        if hasattr(os, 'replace'):
+            os.replace(temp_path, path)
+        else:
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(temp_path, path)
+
+    def load(self, path=None):
+        """
+        Load cached results from a file created by save(), in addition to the current results.
+        Loading never runs code from the file (it only contains plain data, and anything else is rejected), but cache
+        files should still be trusted: cached results are returned as they are in the file, and marshal data is not
+        checked against malformed input.
+        :param path: File path to load from (default to the path the cache was created with).
+        """
+        path = path or self.path
+        with open(path, 'rb') as infile:
+            data = infile.read()
+        if not data.startswith(_FILE_MAGIC):
+            raise ValueError("'%s' is not a grep results cache file." % path)
+        try:
+            data = marshal.loads(data[len(_FILE_MAGIC):])
+        except (EOFError, TypeError, ValueError):
+            raise ValueError("'%s' is not a valid grep results cache file." % path)
+        if not isinstance(data, list):
+            raise ValueError("'%s' is not a valid grep results cache file." % path)
+        for item in data:
+            if isinstance(item, tuple) and len(item) == 5 and _is_plain(item):
+                key, identity, result, lines, tail_check = item
+                self._store(key, _Entry(identity, result, lines, tail_check))
+
+    def _grep_target(self, target, matcher):
+        """
+        Implement grep() with cache.
+        :param target: Target to grep (if its a callable, its already called).
+        :param matcher: Compiled matcher.
+        :return: See grep().
+        """
+        grep_all = lambda: _grepfunc._grep_matcher(target, matcher, False)
+        cache_key = matcher.flags.get('cache_key')
+
+        # caller provided key
+        if cache_key is not None:
+            return self._lookup(('key', cache_key), matcher, None, None, grep_all, None)
+
+        # opened file, from its beginning
+        stat = _file_object_stat(target)
+        if stat is None:
+            return grep_all()
+        path = os.path.abspath(target.name)
+        name = ('file', path, getattr(target, 'mode', None), getattr(target, 'encoding', None))
+        grep_tail = lambda start, first_line: _grep_file_object_tail(target, matcher, start, first_line)
+        return self._lookup(name, matcher, path, stat, grep_all, grep_tail,
+                            lambda: os.fstat(target.fileno()))
+
+    def _grep_path(self, path, matcher, workers):
+        """
+        Implement grep_file() with cache.
+        :param path: File path to grep.
+        :param matcher: Compiled matcher.
+        :param workers: How many worker processes to use.
+        :return: See grep_file().
+        """
+        grep_all = lambda: _grepfunc._grep_results(_files._grep_path(path, matcher, False, workers), matcher.flags)
+        cache_key = matcher.flags.get('cache_key')
+        if cache_key is not None:
+            return self._lookup(('key', cache_key), matcher, None, None, grep_all, None)
+        path = os.path.abspath(path)
+        grep_tail = lambda start, first_line: _files._grep_path_tail(path, matcher, start, first_line)
+
+        # data appended to compressed files can't be grepped alone
+        with open(path, 'rb') as infile:
+            if _compressed._detect(infile) is not None:
+                grep_tail = None
+        return self._lookup(('path', path), matcher, path, os.stat(path), grep_all, grep_tail,
+                            lambda: os.stat(path))
+
+    def _lookup(self, name, matcher, path, stat, grep_all, grep_tail, get_stat=None):
+        """
+        Get results from cache, or grep and cache them.
+        :param name: Target identity, without the file state.
+        :param matcher: Compiled matcher.
+        :param path: File path, or None if target is not a file.
+        :param stat: File stat result before grepping, or None if target is not a file.
+        :param grep_all: Function to grep the whole target.
+        :param grep_tail: Function to grep a file from a position (a beginning of a line), that gets the position and
+                          the index of the line at that position, and returns an iterator of values. None if target is
+                          not a file.
+        :param get_stat: Function to stat the file again after grepping it.
+        :return: See grep().
+        """
+        key = _cache_key(name, matcher)
+        if key is None:
+            return grep_all()
+        flags = matcher.flags
+
+        # get entry and mark it as recently used
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                del self._entries[key]
+                self._entries[key] = entry
+
+        # same target as cached?
+        if entry is not None and (stat is None or entry.identity == _identity(stat)):
+            with self._lock:
+                self.hits += 1
+            return _copy_result(entry.result)
+
+        # file was only appended to? grep the new lines and add them to cached results
+        if entry is not None and grep_tail is not None and _appended(entry, path, stat, flags):
+            first_line = entry.lines
+            need_lines = flags.get('line_number') and not flags.get('byte_offset')
+            if need_lines and first_line is None:
+                first_line = _count_lines(path, 0, entry.identity[1])
+            result = _add_tail(entry.result, grep_tail(entry.identity[1], first_line or 0), flags)
+            lines = None if first_line is None else first_line + _count_lines(path, entry.identity[1], stat.st_size)
+            with self._lock:
+                self.tail_hits += 1
+
+        # grep whole target
+        else:
+            result = grep_all()
+            lines = None
+            with self._lock:
+                self.misses += 1
+
+        # cache result, unless file changed while we grepped it
+        if stat is None or get_stat is None or _identity(get_stat()) == _identity(stat):
+            tail_check = _tail_check(path, stat.st_size) if stat is not None and _can_add_tail(flags) else None
+            self._store(key, _Entry(_identity(stat) if stat is not None else None, result, lines, tail_check))
+        return _copy_result(result)
+
+    def _store(self, key, entry):
+        """
+        Add entry to cache, and evict least recently used entries if needed.
+        """
+        size = _result_size(entry.result)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old.size
+            if size > self.max_size:
+                return
+            entry.size = size
+            self._entries[key] = entry
+            self.size += size
+            while len(self._entries) > self.max_entries or self.size > self.max_size:
+                _, old = self._entries.popitem(False)
+                self.size -= old.size
+                self.evictions += 1
+
+
+class _Entry(object):
+    """
+    A single cached result.
+    """
+
+    def __init__(self, identity, result, lines, tail_check):
+        """
+        Create the entry.
+        :param identity: File (modification time, size, inode), or None if target is not a file.
+        :param result: Cached grep result.
+        :param lines: Number of lines in file, or None if unknown.
+        :param tail_check: Hash of the last bytes of file, if file ends with end-of-line and results can be reused when
+                           it grows. None otherwise.
+        """
+        self.identity = identity
+        self.result = result
+        self.lines = lines
+        self.tail_check = tail_check
+        self.size = 0
+
+
+def _is_plain(value):
+    """
+    Return if a value is plain data that can be saved to cache files (None, booleans, numbers, strings, and tuples and
+    lists of them).
+    """
+    if isinstance(value, (tuple, list)):
+        return all(_is_plain(v) for v in value)
+    return isinstance(value, _PLAIN_TYPES)
+
+
+def _cache_key(name, matcher):
+    """
+    Build cache key from target identity, pattern and flags.
+    :return: Hashable key, or None if pattern or flags can't be used as a key.
+    """
+    flags = tuple(sorted((k, __freeze(v)) for k, v in matcher.flags.items() if k not in _IGNORED_FLAGS))
+    key = (name, __freeze(matcher.pattern), flags)
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def __freeze(value):
+    """
+    Convert lists (and dictionaries) to tuples, so they can be used in a cache key.
+    """
+    if isinstance(value, (list, tuple)):
+        return tuple(__freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, __freeze(v)) for k, v in value.items()))
+    return value
+
+
+def _identity(stat):
+    """
+    Get file identity from stat result.
+    """
+    return stat.st_mtime, stat.st_size, stat.st_ino
+
+
+def _file_object_stat(target):
+    """
+    Get stat result of an opened regular file, if it can be cached (its position must be at the beginning of file).
+    :return: Stat result, or None.
+    """
+    try:
+        if not isinstance(target.name, _basestring) or target.tell() != 0:
+            return None
+        stat = os.fstat(target.fileno())
+    except (AttributeError, IOError, OSError, ValueError):
+        return None
+    return stat if _stat.S_ISREG(stat.st_mode) else None
+
+
+def _can_add_tail(flags):
+    """
+    Return if results can be reused when lines are added to file (context may include lines from both parts, and new
+    lines may be out of the grepped range of lines).
+    """
+    return not (flags.get('after_context') or flags.get('before_context') or flags.get('merge_context') or
+                flags.get('start_line') or flags.get('end_line') is not None)
+
+
+def _tail_check(path, size):
+    """
+    Get hash of the last bytes of file, or None if file doesn't end with end-of-line.
+    """
+    if not size:
+        return None
+    with open(path, 'rb') as infile:
+        infile.seek(max(0, size - _TAIL_CHECK_SIZE))
+        data = infile.read(min(size, _TAIL_CHECK_SIZE))
+    if not data.endswith(b'\n'):
+        return None
+    return hashlib.sha1(data).hexdigest()
+
+
+def _appended(entry, path, stat, flags):
+    """
+    Check if file was only appended to since entry was cached.
+    """
+    if entry.tail_check is None or not _can_add_tail(flags):
+        return False
+    mtime, size, inode = entry.identity
+    if stat.st_ino != inode or stat.st_size <= size:
+        return False
+    return _tail_check(path, size) == entry.tail_check
+
+
+def _add_tail(result, values, flags):
+    """
+    Add the results of grepping new lines to cached results.
+    """
+    max_count = flags.get('max_count')
+
+    # quiet: already found a match, or any match in new lines
+    if flags.get('quiet'):
+        return result or any(True for _ in values)
+
+    # count
+    if flags.get('count'):
+        if max_count and result >= max_count:
+            return result
+        return result + sum(1 for _ in islice(values, max_count - result if max_count else None))
+
+    # list of matches
+    if max_count and len(result) >= max_count:
+        return result
+    return result + list(islice(values, max_count - len(result) if max_count else None))
+
+
+def _count_lines(path, start, end):
+    """
+    Count end-of-lines in file between positions.
+    """
+    count = 0
+    with open(path, 'rb') as infile:
+        infile.seek(start)
+        while start < end:
+            data = infile.read(min(_COUNT_LINES_CHUNK, end - start))
+            if not data:
+                break
+            count += data.count(b'\n')
+            start += len(data)
+    return count
+
+
+def _grep_file_object_tail(target, matcher, start, first_line):
+    """
+    Grep an opened file from a position (a beginning of a line).
+    :return: Next match.
+    """
+    target.seek(start)
+    fix_value_index = matcher.flags.get('line_number') and not matcher.flags.get('byte_offset')
+    for value in _grepfunc.grep_iter(target, matcher):
+        yield (first_line + value[0], value[1]) if fix_value_index else value
+
+
+def _copy_result(result):
+    """
+    Copy a cached result list, so changing the returned list won't change the cache.
+    """
+    return list(result) if isinstance(result, list) else result
+
+
+def _result_size(result):
+    """
+    Estimate the memory size of a result.
+    """
+    if isinstance(result, (list, tuple)):
+        return sys.getsizeof(result) + sum(_result_size(value) for value in result)
+    return sys.getsizeof(result)
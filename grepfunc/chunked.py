@@ -0,0 +1,339 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Grep targets that produce lines in batches (like message consumers, database cursors with fetchmany(), or socket
+readers), matching a whole batch at once instead of line by line.
+
+Author: Ronen Ness.
+Since: 2017.
+"""
+from itertools import chain
+from operator import itemgetter
+from . import grepfunc as _grepfunc
+
+# if the candidate lines of a batch searched as a block are more than this fraction of its lines, the next batches
+# are matched line by line (see _Density)
+DENSE_CANDIDATES = 0.25
+DENSE_SKIP_BATCHES = 15
+
+# remove the last character of a line
+_strip_last = itemgetter(slice(None, -1))
+
+
+def grep_batches(target, pattern, **kwargs):
+    """
+    Grep a target that produces lines in batches, and return all matches like grep() does.
+    See grep_batches_iter() for how batches are read and grepped.
+    :param target: Iterable of batches, or a function that returns the next batch on every call (see
+                   grep_batches_iter()).
+    :param pattern: Grep pattern to search, or a Matcher returned by compile().
+    :param kwargs: See grep() help for more info. Note: the cache, compact and block_size flags are not supported.
+    :return: See grep().
+    """
+    matcher = _grepfunc.compile(pattern, **kwargs)
+    flags = matcher.flags
+    if flags.get('compact'):
+        raise ValueError("grep_batches() does not support the compact flag.")
+    if flags.get('stats') is not None:
+        return flags['stats']._timed(__grep_batches, target, matcher)
+    return __grep_batches(target, matcher)
+
+
+def __grep_batches(target, matcher):
+    """
+    Implement grep_batches() for an already compiled matcher.
+    :return: See grep().
+    """
+    flags = matcher.flags
+
+    # quiet and count only count matching lines
+    if flags.get('quiet'):
+        return __count_batches(target, matcher, 1) > 0
+    if flags.get('count'):
+        return __count_batches(target, matcher, flags.get('max_count'))
+
+    return _grepfunc._grep_results(chain.from_iterable(grep_batches_iter(target, matcher)), flags)
+
+
+def grep_batches_iter(target, pattern, **kwargs):
+    """
+    Grep a target that produces lines in batches, and return the matches batch by batch.
+    Every batch is a list of lines, or a block of text (or bytes) with multiple lines. Lines of blocks may be split
+    between blocks (the incomplete last line of a block is completed by the next block), and lines of lists may end
+    with end-of-line (it's removed, unless keep_eol is set). End-of-line and whitespace (with the trim flag) are
+    removed from all the lines of a batch at once, and when possible the whole batch is joined and searched as a
+    single block, so only the candidate lines are matched one by one (like block_size mode does).
+    Line numbers and max_count are global, as if all batches were a single stream of lines.
+    Note: this function does not support the 'quiet' or 'count' flags.
+    :param target: Iterable of batches, or a function that returns the next batch on every call, until it returns an
+                   empty batch or None (for example, a cursor's fetchmany).
+    :param pattern: Grep pattern to search, or a Matcher returned by compile().
+    :param kwargs: See grep() help for more info. Note: the cache, compact and block_size flags are not supported.
+    :return: Next list of matches, for every batch that completed any match (matches that wait for trailing context
+             are returned with the batch that completed their context, or with the last list when target ends).
+    """
+    # compile pattern and flags once (if pattern is already compiled this just merges the flags)
+    matcher = _grepfunc.compile(pattern, **kwargs)
+    flags = matcher.flags
+
+    # check if target is binary, if requested (and skip it without reading any further)
+    batches = __read_batches(target)
+    is_binary = False
+    if _grepfunc._checks_binary(flags):
+        is_binary, batches = __check_binary(batches)
+        if is_binary and flags.get('binary_files') == 'without-match':
+            return
+
+    # binary target with a match returns a single message instead of lines
+    values = __grep_batches_values(batches, matcher)
+    if is_binary:
+        for _ in values:
+            yield [_grepfunc.BINARY_FILE_MATCHES]
+            break
+        return
+
+    # decode returned lines of bytes patterns, if requested
+    encoding = _grepfunc._decode_encoding(matcher)
+    errors = flags.get('errors') or 'strict'
+    for batch_values in values:
+        if encoding:
+            batch_values = [_grepfunc._decode_value(value, encoding, errors) for value in batch_values]
+        yield batch_values
+
+
+def __grep_batches_values(batches, matcher):
+    """
+    Implement grep_batches_iter() for an already compiled matcher, after reading batches and checking if binary.
+    :return: Next non-empty list of matches.
+    """
+    flags = matcher.flags
+    f_remap = flags.get('line_number') and not flags.get('byte_offset')
+    state = _grepfunc._LinesState(flags)
+    density = _Density()
+
+    # lines are trimmed once per batch, so the matcher doesn't trim them
+    if flags.get('trim'):
+        matcher = _grepfunc.compile(matcher, trim=False)
+
+    for lines, block in __prepare_batches(batches, matcher, flags, density):
+
+        # without a block, grep every line of batch (line numbers continue from the previous batch)
+        start = state.line_index
+        if block is None:
+            values = list(_grepfunc._grep_lines(lines, matcher, state))
+
+        # with a block, grep only candidate lines (without context, lines are independent, so only line numbers need
+        # to be converted from candidate index to line index)
+        else:
+            candidates = list(_grepfunc._candidate_indices(block, matcher.block_search, matcher.eol))
+            density.update(len(candidates), len(lines))
+            state.line_index = 0
+            values = list(_grepfunc._grep_lines([lines[index] for index in candidates], matcher, state))
+            if f_remap:
+                values = [(start + candidates[index], value) for index, value in values]
+            state.line_index = start + len(lines)
+
+        if values:
+            yield values
+        if state.done:
+            break
+
+    # return matches that still wait for trailing context (or the last group of lines, which is kept in state even
+    # after reaching max_count)
+    values = list(_grepfunc._grep_lines_end(matcher, state))
+    if values:
+        yield values
+
+
+def __count_batches(target, matcher, limit=None):
+    """
+    Count matching lines in batches without building any return value, for the count and quiet flags.
+    :param target: Target to apply grep on. See grep_batches_iter() for info.
+    :param matcher: Compiled matcher.
+    :param limit: Optional number of matches to stop at.
+    :return: Number of matching lines (up to limit).
+    """
+    flags = matcher.flags
+
+    # skip binary targets, if requested (other binary_files modes count normally)
+    batches = __read_batches(target)
+    if flags.get('binary_files') == 'without-match':
+        is_binary, batches = __check_binary(batches)
+        if is_binary:
+            return 0
+
+    # lines are trimmed once per batch, so the matcher doesn't trim them
+    if flags.get('trim'):
+        matcher = _grepfunc.compile(matcher, trim=False)
+    match = matcher.match
+    density = _Density()
+
+    # count candidate lines (or every line) of every batch until reached limit
+    ret = 0
+    for lines, block in __prepare_batches(batches, matcher, flags, density):
+        if block is not None:
+            candidates = list(_grepfunc._candidate_indices(block, matcher.block_search, matcher.eol))
+            density.update(len(candidates), len(lines))
+            lines = [lines[index] for index in candidates]
+        for line in lines:
+            if match(line)[0]:
+                ret += 1
+                if ret == limit:
+                    return ret
+    return ret
+
+
+def __read_batches(target):
+    """
+    Read batches from target, and convert batches that are not lists or strings (like generators) to lists.
+    :param target: Iterable of batches, or a function that returns the next batch on every call.
+    :return: Next batch.
+    """
+    # call function until it returns an empty batch
+    if callable(target):
+        def call_target():
+            while True:
+                batch = target()
+                if not batch:
+                    return
+                yield batch
+        batches = call_target()
+    else:
+        batches = target
+
+    for batch in batches:
+        if not isinstance(batch, (list, tuple) + _grepfunc._string_types):
+            batch = list(batch)
+        yield batch
+
+
+def __check_binary(batches):
+    """
+    Check if batches are binary, by checking the first batch (see _check_binary()).
+    :return: (is binary, batches to grep instead of the original batches).
+    """
+    batches = iter(batches)
+    for first in batches:
+        return _grepfunc._check_binary(first)[0], chain([first], batches)
+    return False, batches
+
+
+def __prepare_batches(batches, matcher, flags, density):
+    """
+    Convert batches to lists of lines ready to match: split text blocks to lines (keeping incomplete last lines for the
+    next batch), remove end-of-line (unless keep_eol is set), and trim lines (if trim is set). Also joins batches to a
+    single block for block search, when the matcher supports it, there are no context flags, and density allows it.
+    :param batches: Iterable of batches (lists of lines or text blocks).
+    :param matcher: Compiled matcher (without trim).
+    :param flags: Flags after converting shortcuts (with trim).
+    :param density: Candidates density (_Density), that decides which batches to search as a block.
+    :return: Next (lines, block), where block is None if batch should not be searched as a block.
+    """
+    eol = matcher.eol
+    f_trim = flags.get('trim')
+    f_keep_eol = flags.get('keep_eol')
+    use_blocks = matcher.block_search is not None and not f_keep_eol and \
+        not (flags.get('after_context') or flags.get('before_context'))
+    stats = flags.get('stats')
+    if stats is not None:
+        batches = stats._wrap_batches(batches)
+
+    # incomplete last line of the previous text block
+    leftover = None
+
+    for batch in batches:
+
+        # text block: split complete lines, and keep the incomplete last line for the next block
+        if isinstance(batch, _grepfunc._string_types):
+            if not batch:
+                continue
+            buff = batch if leftover is None else leftover + batch
+            end = buff.rfind(eol) + 1
+            if end == 0:
+                leftover = buff
+                continue
+            leftover = buff[end:] or None
+            lines = buff[:end - 1].split(eol)
+            block = buff[:end]
+            if f_keep_eol:
+                lines = [line + eol for line in lines]
+
+        # list of lines: remove end-of-line from lines that have it
+        else:
+            if leftover is not None:
+                yield [leftover.strip() if f_trim else leftover], None
+                leftover = None
+            if not batch:
+                continue
+            lines, block = (batch, None) if f_keep_eol else __strip_eol(batch, eol)
+
+        # trim lines, and build block if needed
+        want_block = use_blocks and density.search_block()
+        if f_trim:
+            lines = [line.strip() for line in lines]
+            block = None
+        if want_block and block is None:
+            block = _grepfunc._join_lines(lines, eol)
+        yield lines, block if want_block else None
+
+    # process last line of the last text block (if have one)
+    if leftover is not None:
+        yield [leftover.strip() if f_trim else leftover], None
+
+
+def __strip_eol(lines, eol):
+    """
+    Remove end-of-line from the end of lines that have it (lines that are not strings are kept as they are).
+    When every line ends with a single end-of-line, lines are stripped and verified without a loop in python, and the
+    joined lines are returned as the block.
+    :return: (list of lines, block of lines or None).
+    """
+    # all lines end with end-of-line: removing the last character of every line and joining lines back with
+    # end-of-line gives the same block only if every line ended with end-of-line
+    try:
+        buff = eol[:0].join(lines)
+    except TypeError:
+        return lines, None
+    if buff.count(eol) == len(lines):
+        stripped = list(map(_strip_last, lines))
+        if eol.join(stripped) + eol == buff:
+            return stripped, buff
+
+    # no line has end-of-line: lines can be joined as they are
+    if not buff.count(eol):
+        return lines, None
+
+    # remove end-of-line line by line
+    return [line[:-1] if line[-1:] == eol else line for line in lines], None
+
+
+class _Density(object):
+    """
+    Decides which batches to search as a single block. Block search is faster when candidate lines are rare, but
+    slower than matching every line when most lines are candidates. So after a batch where candidates were dense,
+    the next batches are matched line by line, and block search is tried again every few batches.
+    """
+
+    def __init__(self):
+        """
+        Create initial state (search blocks).
+        """
+        self.skip = 0
+
+    def search_block(self):
+        """
+        Return if next batch should be searched as a block.
+        """
+        if self.skip:
+            self.skip -= 1
+            return False
+        return True
+
+    def update(self, candidates, lines):
+        """
+        Update density after searching a batch as a block.
+        :param candidates: Number of candidate lines in batch.
+        :param lines: Number of lines in batch.
+        """
+        if candidates > lines * DENSE_CANDIDATES:
+            self.skip = DENSE_SKIP_BATCHES
@@ -0,0 +1,209 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Read compressed files (gzip, bz2 and xz) as blocks of decompressed data.
+Files with multiple members (like concatenated gzip files, or bz2 files created by pbzip2) can be decompressed in
+parallel, member by member.
+
+Author: Ronen Ness.
+Since: 2017.
+"""
+import mmap
+import multiprocessing
+import re
+import zlib
+from collections import deque
+
+# bz2 and lzma modules are optional in some python builds (and lzma is not available in python 2)
+try:
+    import bz2
+except ImportError:
+    bz2 = None
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+# file formats by magic bytes
+_MAGIC = ((b'\x1f\x8b', 'gzip'), (b'BZh', 'bz2'), (b'\xfd7zXZ\x00', 'xz'))
+
+# patterns to find possible member beginnings (they may also appear inside compressed data, so they are verified)
+_MEMBER_START = {
+    'gzip': re.compile(b'\x1f\x8b\x08'),
+    'bz2': re.compile(b'BZh[1-9]1AY&SY'),
+    'xz': re.compile(b'\xfd7zXZ\x00'),
+}
+
+# how many compressed bytes to read at once
+READ_SIZE = 256 * 1024
+
+# default size, in compressed bytes, of chunks to decompress in every worker process
+CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def _detect(infile):
+    """
+    Detect compression format of an opened binary file by its magic bytes, without changing file position.
+    :return: 'gzip', 'bz2', 'xz', or None if file is not compressed.
+    """
+    position = infile.tell()
+    head = infile.read(6)
+    infile.seek(position)
+    for magic, name in _MAGIC:
+        if head.startswith(magic):
+            return name
+    return None
+
+
+def _decompressor(fmt):
+    """
+    Create a decompressor object for a single member of a compressed file.
+    """
+    if fmt == 'gzip':
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if fmt == 'bz2' and bz2 is not None:
+        return bz2.BZ2Decompressor()
+    if fmt == 'xz' and lzma is not None:
+        return lzma.LZMADecompressor()
+    raise ValueError("Can't decompress '%s' files, module is not available." % fmt)
+
+
+def _decompress_blocks(infile, fmt, read_size=READ_SIZE):
+    """
+    Decompress a file (with any number of members) from its current position, block by block.
+    :param infile: Opened binary file.
+    :param fmt: Compression format (see _detect()).
+    :param read_size: How many compressed bytes to read at once.
+    :return: Iterator of decompressed data blocks.
+    """
+    decompressor = _decompressor(fmt)
+    started = False
+    while True:
+        data = infile.read(read_size)
+        if not data:
+            break
+        while data:
+
+            # skip zero padding between (or after) members, like the gzip module does
+            if not started:
+                data = data.lstrip(b'\0')
+                if not data:
+                    break
+                started = True
+
+            # decompress, and if member ended continue with the next member
+            block = decompressor.decompress(data)
+            if block:
+                yield block
+            if not __member_ended(decompressor):
+                break
+            data = decompressor.unused_data
+            decompressor = _decompressor(fmt)
+            started = False
+
+    # file ended in the middle of a member (python 2 zlib decompressors can't tell if their member ended, so it's not
+    # checked with them)
+    if started and hasattr(decompressor, 'eof'):
+        raise EOFError("Compressed file ended before the end-of-stream marker was reached.")
+
+
+def _decompress_parallel(path, fmt, workers, chunk_size=None):
+    """
+    Decompress a file with multiple members in a pool of worker processes, by splitting it to chunks of whole members.
+    If the file turns out to have a single member (or member beginnings can't be verified), continue decompressing in
+    current process.
+    :param path: File path.
+    :param fmt: Compression format (see _detect()).
+    :param workers: Number of worker processes.
+    :param chunk_size: Size, in compressed bytes, of chunks to decompress in every worker.
+    :return: Iterator of decompressed data blocks, by file order.
+    """
+    chunks = __member_chunks(path, fmt, chunk_size or CHUNK_SIZE)
+
+    # single chunk, no point in using workers
+    if len(chunks) < 2:
+        with open(path, 'rb') as infile:
+            for block in _decompress_blocks(infile, fmt):
+                yield block
+        return
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        chunks = iter(chunks)
+        pending = deque()
+        while True:
+
+            # send chunks to workers, up to twice the number of workers at once
+            while len(pending) < workers * 2:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                pending.append((chunk[0], pool.apply_async(_decompress_chunk_worker, (path, fmt) + chunk)))
+
+            # no more chunks?
+            if not pending:
+                break
+
+            # wait for the oldest chunk, and if its not made of whole members decompress the rest of file here
+            start, result = pending.popleft()
+            block = result.get()
+            if block is None:
+                with open(path, 'rb') as infile:
+                    infile.seek(start)
+                    for block in _decompress_blocks(infile, fmt):
+                        yield block
+                return
+            yield block
+
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _decompress_chunk_worker(path, fmt, start, end):
+    """
+    Decompress a chunk of file made of whole members, in a worker process.
+    :return: Decompressed data, or None if chunk doesn't start or end at members boundaries.
+    """
+    with open(path, 'rb') as infile:
+        infile.seek(start)
+        data = infile.read(end - start)
+    blocks = []
+    while data:
+        decompressor = _decompressor(fmt)
+        try:
+            blocks.append(decompressor.decompress(data))
+        except (IOError, OSError, EOFError, ValueError, zlib.error):
+            return None
+        if not __member_ended(decompressor):
+            return None
+        data = decompressor.unused_data.lstrip(b'\0')
+    return b''.join(blocks)
+
+
+def __member_ended(decompressor):
+    """
+    Return if decompressor reached the end of its member.
+    """
+    return getattr(decompressor, 'eof', False) or bool(decompressor.unused_data)
+
+
+def __member_chunks(path, fmt, chunk_size):
+    """
+    Split a compressed file to chunks of about chunk_size bytes, at possible members beginnings.
+    :return: List of (start, end) positions.
+    """
+    with open(path, 'rb') as infile:
+        buff = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            size = len(buff)
+            chunks = []
+            start = 0
+            for found in _MEMBER_START[fmt].finditer(buff):
+                if found.start() - start >= chunk_size:
+                    chunks.append((start, found.start()))
+                    start = found.start()
+            chunks.append((start, size))
+            return chunks
+        finally:
+            buff.close()
@@ -0,0 +1,1063 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Grep functions that work directly on files, by path.
+
+Author: Ronen Ness.
+Since: 2017.
+"""
+import fnmatch
+import glob
+import mmap
+import multiprocessing
+import os
+import re
+import sys
+from collections import deque
+from itertools import islice
+from . import compressed as _compressed
+from . import grepfunc as _grepfunc
+from . import lineindex as _lineindex
+
+# python regex parser, used to check if a regex can safely run on encoded bytes
+try:
+    from re import _parser as _sre_parse
+except ImportError:
+    import sre_parse as _sre_parse
+
+# get python base string for either Python 2.x or 3.x
+try:
+    _basestring = basestring
+except NameError:
+    _basestring = str
+
+# python 2 regexes have no ascii flag (text patterns are ascii-only unless re.UNICODE is set), and glob only supports
+# recursive patterns ('**') in python 3.5 or newer
+_RE_ASCII = getattr(re, 'ASCII', 0)
+_GLOB_RECURSIVE = sys.version_info >= (3, 5)
+
+# max bytes to copy at once when counting lines in a memory mapped file
+_COUNT_LINES_CHUNK = 16 * 1024 * 1024
+
+# how many bytes to decode at once when we need to check every line
+_DECODE_CHUNK = 1024 * 1024
+
+# if we get this many candidates with less than this many bytes per candidate, checking every line is faster
+_DENSE_CANDIDATES = 1024
+_DENSE_BYTES_PER_CANDIDATE = 512
+
+# how many files to send to a worker process at once
+_PATHS_CHUNK = 4
+
+# default size of file chunks to send to worker processes
+_FILE_CHUNK = 32 * 1024 * 1024
+
+# non-ascii characters that str.lower() turns into ascii characters (so they may match an ascii fixed string when
+# ignoring case, and need to be searched for when scanning encoded bytes)
+_LOWER_TO_ASCII = {'i': u'İ', 'k': u'K'}
+
+
+def grep_file(path, pattern, **kwargs):
+    """
+    Grep a file by path, by memory-mapping it and searching the encoded bytes directly.
+    This skips decoding and splitting the whole file into lines: only the matching lines (and their context) are
+    decoded. Results are the same as grep() on the opened file, except for the following differences:
+
+        - The merge_context flag is not supported.
+        - Lines are split by '\\n' only (a '\\r' before it is removed, like when reading in text mode).
+        - The byte_offset flag returns the offset of the match in file (in bytes), and not in line. When invert flag is
+          set, its the offset of the line beginning.
+
+    :param path: File path to grep.
+    :param pattern: Grep pattern to search, or a Matcher returned by compile().
+    :param kwargs: See grep() help for info about flags. In addition, accept:
+
+        - encoding:              File encoding, must be ascii-compatible (default to 'utf-8').
+        - errors:                How to handle decoding errors of matching lines (default to 'strict', see str.decode).
+        - workers:               If more than 1, will split large files into chunks (at lines boundaries) and grep
+                                 them in this many worker processes. Results are still returned by file order.
+        - chunk_size:            Size, in bytes, of file chunks to grep in every worker (default to 32MB).
+        - cache:                 Optional ResultCache to cache results in (see grep()). Files are identified by their
+                                 path, size, modification time and inode.
+        - index:                 Optional TrigramIndex (see build_index()). If file is in index and didn't change
+                                 since indexing, will only grep the blocks of file that may contain matches.
+        - start_line:            Index of the first line to grep (default to 0). Lines before it are not grepped,
+                                 but may still be returned as leading context.
+        - end_line:              Index of the line to stop grepping at (not included), or None to grep until the end
+                                 of file. Lines after it may still be returned as trailing context.
+        - line_index:            Optional LineIndex (see build_line_index()), or True to use (and create, if needed)
+                                 the default '.lidx' sidecar index of file. Used to find where start_line and end_line
+                                 are without counting lines from the beginning of file. The index is updated with the
+                                 lines appended to file since it was built.
+
+    Pattern can also be bytes (see grep()), in which case lines are matched as bytes without decoding, and returned
+    as bytes unless the encoding flag is set (then only returned lines are decoded). The binary_files flag checks the
+    first bytes of file (see grep()), so binary files can be skipped without reading them.
+
+    Compressed files (gzip, bz2 and xz) are detected by their magic bytes and decompressed while grepping, block by
+    block, so they are never fully decompressed in memory or on disk. Line numbers and context are the same as when
+    grepping the decompressed file, and byte_offset is the offset in the decompressed data. With workers, files made
+    of multiple members (like concatenated gzip files, or bz2 files created by pbzip2) are decompressed in parallel.
+    Compressed files are always grepped whole (an index is ignored for them). A range of lines (start_line and
+    end_line flags) is grepped in current process, without workers, and in compressed files the lines before it are
+    still decompressed (but not grepped).
+
+    :return: A list with matching lines, unless flags state otherwise. See grep() for more info.
+    """
+    matcher = _grepfunc.compile(pattern, **kwargs)
+
+    # get results from cache (the cache greps file if needed)
+    cache = matcher.flags.get('cache')
+    if cache is not None:
+        return cache._grep_path(path, matcher, matcher.flags.get('workers') or 1)
+
+    return _grepfunc._grep_results(grep_file_iter(path, matcher), matcher.flags)
+
+
+def grep_file_iter(path, pattern, **kwargs):
+    """
+    Grep a file by path, as a memory efficient iterator.
+    Note: this function does not support the 'quiet' or 'count' flags.
+    :param path: File path to grep.
+    :param pattern: Grep pattern to search, or a Matcher returned by compile().
+    :param kwargs: See grep_file() help for more info.
+    :return: Next match.
+    """
+    # compile pattern and flags once
+    matcher = _grepfunc.compile(pattern, **kwargs)
+    return _grep_path(path, matcher, False, matcher.flags.get('workers') or 1)
+
+
+def _grep_path(path, matcher, with_index, workers=1):
+    """
+    Implement grep_file_iter() for an already compiled matcher.
+    :param path: File path to grep.
+    :param matcher: Compiled matcher.
+    :param with_index: If true, will return (line index, value) instead of just values.
+    :param workers: How many worker processes to use.
+    :return: Next match.
+    """
+    flags = matcher.flags
+    encoding, errors = _buffer_encoding(matcher)
+
+    # make sure encoding is ascii-compatible, since we break lines and search patterns on encoded bytes
+    if encoding is not None and u'\na'.encode(encoding) != b'\na':
+        raise ValueError("grep_file() only support ascii-compatible encodings, got '%s'." % encoding)
+
+    # merging contexts into groups and returning all the matches in lines are only supported by grep()
+    if _grepfunc._merge_context(flags):
+        raise ValueError("grep_file() does not support the merge_context flag.")
+    if flags.get('all_matches'):
+        raise ValueError("grep_file() does not support the all_matches flag.")
+
+    # how to handle binary files (count and quiet only skip them, see binary_files flag)
+    binary_files = flags.get('binary_files')
+    if binary_files == 'binary' and (flags.get('count') or flags.get('quiet')):
+        binary_files = None
+    check_binary = binary_files in ('binary', 'without-match')
+
+    # range of lines to grep, if requested
+    start_line = flags.get('start_line') or 0
+    end_line = flags.get('end_line')
+    line_range = bool(start_line) or end_line is not None
+
+    # map file and grep it
+    with open(path, 'rb') as infile:
+
+        # empty files can't be mapped (and don't have any line)
+        stat = os.fstat(infile.fileno())
+        if not stat.st_size:
+            return
+
+        # compressed files are decompressed and grepped block by block (in parallel, if they have multiple members)
+        fmt = _compressed._detect(infile)
+        if fmt is not None:
+            if workers > 1:
+                blocks = _compressed._decompress_parallel(path, fmt, workers, flags.get('chunk_size'))
+            else:
+                blocks = _compressed._decompress_blocks(infile, fmt)
+            is_binary = False
+            if check_binary:
+                is_binary, blocks = _grepfunc._check_binary(blocks)
+            if line_range:
+                values = __lines_range_values(__grep_data_blocks(blocks, matcher, encoding, errors, True),
+                                              start_line, end_line, with_index)
+            else:
+                values = __grep_data_blocks(blocks, matcher, encoding, errors, with_index)
+            values = islice(values, flags.get('max_count') or None)
+            for value in __path_values(values, matcher, binary_files if is_binary else None, with_index):
+                yield value
+            return
+
+        # if we have an index, get the parts of file that may contain matches
+        index = flags.get('index')
+        ranges = index.candidate_blocks(path, matcher, stat) if index is not None else None
+        if ranges is not None and not ranges:
+            return
+
+        buff = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            chunk_size = flags.get('chunk_size') or _FILE_CHUNK
+            is_binary = check_binary and buff.find(b'\0', 0, _grepfunc.BINARY_CHECK_SIZE) != -1
+
+            # only grep the parts of file in range of lines
+            if line_range:
+                start, end = __lines_range_positions(path, buff, stat, flags.get('line_index'), start_line, end_line)
+                ranges = __clip_ranges(ranges, start, end, start_line)
+
+            # only grep the candidate parts of file
+            if ranges is not None:
+                values = __grep_ranges(buff, matcher, encoding, errors, with_index, ranges)
+                values = islice(values, flags.get('max_count') or None)
+
+            # split large files to chunks and grep them in parallel
+            elif workers > 1 and len(buff) > chunk_size:
+                values = __grep_chunks(path, buff, matcher, with_index, workers, chunk_size)
+
+            # grep file in current process (and stop right after max_count matches)
+            else:
+                values = _grep_buffer(buff, matcher, encoding, errors, with_index)
+                values = islice(values, flags.get('max_count') or None)
+
+            for value in __path_values(values, matcher, binary_files if is_binary else None, with_index):
+                yield value
+        finally:
+            buff.close()
+
+
+def _buffer_encoding(matcher):
+    """
+    Get the encoding to decode lines of files with, and how to handle decoding errors.
+    :return: (encoding, errors), where encoding is None for bytes patterns (lines are matched without decoding).
+    """
+    errors = matcher.flags.get('errors') or 'strict'
+    if matcher.is_bytes:
+        return None, errors
+    return matcher.flags.get('encoding') or 'utf-8', errors
+
+
+def __path_values(values, matcher, binary_files, with_index):
+    """
+    Finish the matches of a file: skip or replace them if file is binary (see binary_files flag), and decode the lines
+    of bytes patterns if requested (see encoding flag).
+    :param binary_files: The binary_files flag if file is binary, or None.
+    :return: Next match.
+    """
+    # binary file: return nothing, or a single message for the first match
+    if binary_files == 'without-match':
+        return
+    if binary_files == 'binary':
+        for value in values:
+            yield (value[0], _grepfunc.BINARY_FILE_MATCHES) if with_index else _grepfunc.BINARY_FILE_MATCHES
+            return
+        return
+
+    # decode lines of bytes patterns
+    encoding = _grepfunc._decode_encoding(matcher)
+    if encoding:
+        values = _grepfunc._decode_values(values, encoding, matcher.flags.get('errors') or 'strict')
+    for value in values:
+        yield value
+
+
+def __lines_range_positions(path, buff, stat, line_index, start_line, end_line):
+    """
+    Get the positions of a range of lines in a mapped file (see start_line and end_line flags).
+    :param line_index: LineIndex of file, True to use the default sidecar index, or None to count lines.
+    :return: (start, end) positions.
+    """
+    # no index: count lines from the beginning of file (and to end_line, from start_line)
+    if line_index is None:
+        start = _lineindex._line_position(buff, start_line)
+        if end_line is None:
+            return start, len(buff)
+        return start, _lineindex._line_position(buff, end_line, start, start_line) if end_line > start_line else start
+
+    # find range with index (after indexing the lines appended to file, if any)
+    if line_index is True:
+        line_index = _lineindex.LineIndex(path)
+    elif line_index.path != os.path.abspath(path):
+        raise ValueError("Line index of '%s' can't be used to grep '%s'." % (line_index.path, path))
+    line_index._sync(buff, stat)
+    return line_index._range(buff, start_line, end_line)
+
+
+def __clip_ranges(ranges, start, end, start_line):
+    """
+    Clip the ranges of file to grep (or the whole file, if ranges is None) to a range of lines.
+    :param ranges: List of (start, end, index of first line) ranges, at lines boundaries, or None for the whole file.
+    :param start: Position of the first line in range.
+    :param end: Position of the line range ends at.
+    :param start_line: Index of the first line in range.
+    :return: List of (start, end, index of first line) ranges.
+    """
+    if ranges is None:
+        return [(start, end, start_line)] if start < end else []
+    ret = []
+    for range_start, range_end, first_line in ranges:
+        if range_start < start:
+            range_start, first_line = start, start_line
+        range_end = min(range_end, end)
+        if range_start < range_end:
+            ret.append((range_start, range_end, first_line))
+    return ret
+
+
+def __lines_range_values(values, start_line, end_line, with_index):
+    """
+    Filter (line index, value) matches to a range of lines, and stop after the last line in range.
+    :return: Next match, or (line index, value) if with_index is set.
+    """
+    for line_index, value in values:
+        if end_line is not None and line_index >= end_line:
+            return
+        if line_index >= start_line:
+            yield (line_index, value) if with_index else value
+
+
+def _grep_path_tail(path, matcher, start, first_line):
+    """
+    Grep a file from a position, like the lines appended to a file since it was last grepped.
+    :param path: File path to grep.
+    :param matcher: Compiled matcher.
+    :param start: Position to start from (must be a beginning of a line).
+    :param first_line: Index of the line at start position.
+    :return: Next match.
+    """
+    encoding, errors = _buffer_encoding(matcher)
+    with open(path, 'rb') as infile:
+        buff = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            values = __grep_ranges(buff, matcher, encoding, errors, False, [(start, len(buff), first_line)])
+            for value in __path_values(values, matcher, None, False):
+                yield value
+        finally:
+            buff.close()
+
+
+def __grep_ranges(buff, matcher, encoding, errors, with_index, ranges):
+    """
+    Grep only some ranges of a buffer (the candidate blocks from an index).
+    :param ranges: List of (start, end, index of first line) ranges, at lines boundaries.
+    :return: Next match, or (line index, value) if with_index is set.
+    """
+    flags = matcher.flags
+    fix_value_index = flags.get('line_number') and not flags.get('byte_offset')
+    for start, end, first_line in ranges:
+        for line_index, value in _grep_buffer(buff, matcher, encoding, errors, True, start, end):
+            if fix_value_index:
+                value = (first_line + value[0], value[1])
+            yield (first_line + line_index, value) if with_index else value
+
+
+def __grep_data_blocks(blocks, matcher, encoding, errors, with_index):
+    """
+    Grep a stream of encoded data blocks (like decompressed data), that may split lines anywhere.
+    Data is kept until all lines it contains are grepped and no longer needed as context, so line indices, byte offsets
+    and context are the same as when grepping all data at once.
+    :param blocks: Iterable of bytes.
+    :return: Next match, or (line index, value) if with_index is set.
+    """
+    flags = matcher.flags
+    fix_value_index = flags.get('line_number') and not flags.get('byte_offset')
+    fix_value_offset = flags.get('byte_offset')
+    after_context = flags.get('after_context') or 0
+    before_context = flags.get('before_context') or 0
+
+    # buffer, its position in data, where the lines not grepped yet begin, and the index of the first of them
+    buff = b''
+    base_offset = 0
+    region_start = 0
+    line_index = 0
+
+    blocks = iter(blocks)
+    eof = False
+    while not eof:
+        block = next(blocks, None)
+        if block is None:
+            eof = True
+        else:
+            buff += block
+
+        # grep everything at end of data, or only the complete lines that have all their trailing context in buffer
+        if eof:
+            region_end = len(buff)
+        else:
+            region_end = buff.rfind(b'\n') + 1
+            for _ in range(after_context):
+                if region_end <= region_start:
+                    break
+                region_end = buff.rfind(b'\n', 0, region_end - 1) + 1
+        if region_end <= region_start:
+            continue
+
+        for index, value in _grep_buffer(buff, matcher, encoding, errors, True, region_start, region_end):
+            if fix_value_index:
+                value = (line_index + value[0], value[1])
+            elif fix_value_offset:
+                value = (base_offset + value[0], value[1])
+            yield (line_index + index, value) if with_index else value
+        line_index += buff.count(b'\n', region_start, region_end)
+
+        # drop data we no longer need, except the lines leading context may need
+        keep = region_end
+        for _ in range(before_context):
+            if keep <= 0:
+                break
+            keep = buff.rfind(b'\n', 0, keep - 1) + 1
+        buff = buff[keep:]
+        base_offset += keep
+        region_start = region_end - keep
+
+
+def __grep_chunks(path, buff, matcher, with_index, workers, chunk_size):
+    """
+    Grep a file by splitting it into chunks at lines boundaries, and grepping chunks in a pool of worker processes.
+    Results are returned by file order, as soon as all previous chunks are done, while keeping a limited number of
+    chunks in process at once (so memory stays bounded if results are consumed slowly).
+    :return: Next match, or (line index, value) if with_index is set.
+    """
+    flags = matcher.flags
+    limit = 1 if flags.get('quiet') else flags.get('max_count')
+
+    # line indices in workers are counted from chunk start, so if we need them workers also count lines in chunk
+    count_lines = with_index or (flags.get('line_number') and not flags.get('byte_offset'))
+    fix_value_index = flags.get('line_number') and not flags.get('byte_offset')
+
+    pool = multiprocessing.Pool(workers, _init_worker, (matcher.pattern, matcher.kwargs, limit))
+    try:
+        chunks = _split_lines(buff, chunk_size)
+        pending = deque()
+        count = 0
+        line_offset = 0
+        while True:
+
+            # send chunks to workers, up to twice the number of workers at once
+            while len(pending) < workers * 2:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                pending.append(pool.apply_async(_grep_chunk_worker, (path, chunk[0], chunk[1], count_lines)))
+
+            # no more chunks?
+            if not pending:
+                break
+
+            # wait for the oldest chunk and return its results
+            hits, lines_count = pending.popleft().get()
+            for line_index, value in hits:
+                if fix_value_index:
+                    value = (line_offset + value[0], value[1])
+                yield (line_offset + line_index, value) if with_index else value
+                count += 1
+                if limit and count >= limit:
+                    return
+            line_offset += lines_count
+
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _split_lines(buff, chunk_size):
+    """
+    Split buffer to ranges of about chunk_size bytes, at lines boundaries.
+    :return: Iterator of (start, end) positions.
+    """
+    size = len(buff)
+    start = 0
+    while start < size:
+        end = buff.find(b'\n', min(size, start + chunk_size) - 1) + 1 or size
+        yield start, end
+        start = end
+
+
+def grep_paths(paths, pattern, **kwargs):
+    """
+    Grep multiple files, directories or glob patterns, using multiple processes.
+    :param paths: A path, a glob pattern, or a list of paths / glob patterns to grep. Directories are searched for
+                  files.
+    :param pattern: Grep pattern to search, or a Matcher returned by compile().
+    :param kwargs: See grep_file() help for info about flags. In addition, accept:
+
+        - recursive:             If true (default) will search directories recursively. If false, will only grep the
+                                 files directly under directories.
+        - include:               Optional list of glob patterns (like '*.log'). If set, will only grep files with name
+                                 or path matching any of them.
+        - exclude:               Optional list of glob patterns. Will skip files with name or path matching any of them.
+        - workers:               Number of worker processes (default to number of CPUs). If 1, will grep in current
+                                 process, one file at a time.
+
+        Note: max_count and quiet apply to all files together, and stop all workers once reached.
+
+    :return: A list of (path, line index, value) for every match, where value is the same as grep_file() would return.
+             Results of different files are returned as soon as each file is done, and not necessarily by paths order.
+             If count or quiet flags are set, return number of matches or True / False instead.
+    """
+    matcher = _grepfunc.compile(pattern, **kwargs)
+    return _grepfunc._grep_results(grep_paths_iter(paths, matcher), matcher.flags)
+
+
+def grep_paths_iter(paths, pattern, **kwargs):
+    """
+    Grep multiple files, directories or glob patterns using multiple processes, as an iterator.
+    Note: this function does not support the 'count' flag.
+    :param paths: A path, a glob pattern, or a list of paths / glob patterns to grep.
+    :param pattern: Grep pattern to search, or a Matcher returned by compile().
+    :param kwargs: See grep_paths() help for more info.
+    :return: Next (path, line index, value).
+    """
+    # compile pattern and flags once
+    matcher = _grepfunc.compile(pattern, **kwargs)
+    flags = matcher.flags
+
+    # get files to grep (if we have an index, skip files it knows have no matches)
+    files = _iter_files(paths, flags.get('recursive', True), flags.get('include'), flags.get('exclude'))
+    index = flags.get('index')
+    if index is not None:
+        files = (path for path in files if index.candidate_blocks(path, matcher) != [])
+
+    # total matches limit
+    limit = 1 if flags.get('quiet') else flags.get('max_count')
+
+    # grep in current process or start a pool of workers (every worker compiles the pattern once)
+    workers = flags.get('workers') or multiprocessing.cpu_count()
+    if workers <= 1:
+        pool = None
+        results = ((path, _grep_path(path, matcher, True)) for path in files)
+    else:
+        pool = multiprocessing.Pool(workers, _init_worker, (matcher.pattern, matcher.kwargs, limit))
+        results = pool.imap_unordered(_grep_paths_worker, files, _PATHS_CHUNK)
+
+    # return results as they arrive, and stop everything once reached limit
+    try:
+        count = 0
+        for path, hits in results:
+            for line_index, value in hits:
+                yield path, line_index, value
+                count += 1
+                if limit and count >= limit:
+                    return
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+
+def _iter_files(paths, recursive, include, exclude):
+    """
+    Iterate all files to grep from a list of paths, directories and glob patterns.
+    :return: Next file path.
+    """
+    if isinstance(paths, _basestring):
+        paths = [paths]
+
+    for path in paths:
+
+        # expand glob patterns
+        if glob.has_magic(path):
+            expanded = sorted(glob.glob(path, recursive=recursive) if _GLOB_RECURSIVE else glob.glob(path))
+        else:
+            expanded = [path]
+
+        for path in expanded:
+
+            # list files in directories
+            if os.path.isdir(path):
+                if recursive:
+                    for root, dirs, names in os.walk(path):
+                        dirs.sort()
+                        for name in sorted(names):
+                            filename = os.path.join(root, name)
+                            if __accept_file(filename, include, exclude):
+                                yield filename
+                else:
+                    for name in sorted(os.listdir(path)):
+                        filename = os.path.join(path, name)
+                        if os.path.isfile(filename) and __accept_file(filename, include, exclude):
+                            yield filename
+
+            # regular file (if doesn't exist, will raise error when trying to grep it)
+            elif __accept_file(path, include, exclude):
+                yield path
+
+
+def __accept_file(path, include, exclude):
+    """
+    Check if file path match the include and exclude glob patterns.
+    """
+    name = os.path.basename(path)
+    if include and not any(fnmatch.fnmatch(name, p) or fnmatch.fnmatch(path, p) for p in include):
+        return False
+    if exclude and any(fnmatch.fnmatch(name, p) or fnmatch.fnmatch(path, p) for p in exclude):
+        return False
+    return True
+
+
+# compiled matcher and matches limit of current worker process, used by grep_paths() and grep_file()
+_worker_matcher = None
+_worker_limit = None
+
+
+def _init_worker(pattern, kwargs, limit):
+    """
+    Init a worker process of grep_paths() or grep_file().
+    """
+    global _worker_matcher, _worker_limit
+    _worker_matcher = _grepfunc.compile(pattern, **kwargs)
+    _worker_limit = limit
+
+
+def _grep_paths_worker(path):
+    """
+    Grep a single file in a worker process of grep_paths().
+    :return: (path, list of (line index, value)).
+    """
+    return path, list(islice(_grep_path(path, _worker_matcher, True), _worker_limit))
+
+
+def _grep_chunk_worker(path, start, end, count_lines):
+    """
+    Grep a chunk of file in a worker process of grep_file().
+    :return: (list of (line index in chunk, value), number of lines in chunk or 0 if count_lines is not set).
+    """
+    encoding, errors = _buffer_encoding(_worker_matcher)
+    with open(path, 'rb') as infile:
+        buff = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            hits = _grep_buffer(buff, _worker_matcher, encoding, errors, True, start, end)
+            hits = list(islice(hits, _worker_limit))
+            return hits, __count_lines(buff, start, end) if count_lines else 0
+        finally:
+            buff.close()
+
+
+def _grep_buffer(buff, matcher, encoding, errors, with_index=False, range_start=0, range_end=None):
+    """
+    Grep a buffer of encoded lines (bytes, mmap, or anything else that support find(), rfind() and slicing).
+    :param buff: Buffer to grep.
+    :param matcher: Compiled matcher.
+    :param encoding: Buffer encoding (must be ascii-compatible).
+    :param errors: How to handle decoding errors.
+    :param with_index: If true, will return (line index, value) instead of just values.
+    :param range_start: Optional position to start grepping from (must be a beginning of a line). Line indices are
+                        counted from this position, but leading context may still come from before it.
+    :param range_end: Optional position to stop grepping at (must be a beginning of a line). Trailing context may still
+                        come from after it.
+    :return: Next match.
+    """
+    flags = matcher.flags
+    match = matcher.match
+    f_offset = flags.get('byte_offset')
+    f_line_number = flags.get('line_number')
+    f_only_matching = flags.get('only_matching')
+    f_after_context = flags.get('after_context') or 0
+    f_before_context = flags.get('before_context') or 0
+    f_trim = flags.get('trim')
+    f_keep_eol = flags.get('keep_eol')
+
+    # decode a single line between positions (lines of bytes patterns are not decoded)
+    def get_line(start, end):
+        line = buff[start:end]
+        if encoding is not None:
+            line = line.decode(encoding, errors)
+        return __process_line(line, end < size, f_trim, f_keep_eol)
+
+    # buffer size and range to grep
+    size = len(buff)
+    if range_end is None:
+        range_end = size
+
+    # check every line in range, starting from a given position and line index
+    def every_line(start, line_index):
+        return __every_line_hits(buff, start, range_end, line_index, match, encoding, errors, f_trim, f_keep_eol)
+
+    # find matching lines, either by searching candidates or (if can't search the bytes directly) by checking every line
+    find = __bytes_finder(matcher.pattern, flags, encoding)
+    if find is None:
+        hits = every_line(range_start, 0)
+    else:
+        count_lines = with_index or (f_line_number and not f_offset)
+        hits = __candidate_hits(buff, range_start, range_end, find, match, get_line, count_lines, every_line)
+
+    # build results
+    for line_index, line_start, line, offset, endpos in hits:
+
+        # the textual part we return in response
+        ret_str = line[offset:endpos] if f_only_matching else line
+
+        # add leading context
+        if f_before_context:
+            before = []
+            end = line_start - 1
+            while len(before) < f_before_context and end >= 0:
+                start = buff.rfind(b'\n', 0, end) + 1
+                before.append(get_line(start, end))
+                end = start - 1
+            before.reverse()
+            ret_str = before + [ret_str]
+
+        # add trailing context
+        if f_after_context:
+            if not f_before_context:
+                ret_str = [ret_str]
+            start = buff.find(b'\n', line_start) + 1 or size
+            for _ in range(f_after_context):
+                if start >= size:
+                    break
+                end = buff.find(b'\n', start)
+                if end == -1:
+                    end = size
+                ret_str.append(get_line(start, end))
+                start = end + 1
+
+        # build return value
+        if f_offset:
+            value = (line_start + __bytes_offset(buff, line_start, offset, encoding, errors, f_trim), ret_str)
+        elif f_line_number:
+            value = (line_index, ret_str)
+        else:
+            value = ret_str
+        yield (line_index, value) if with_index else value
+
+
+def __process_line(line, has_eol, trim, keep_eol):
+    """
+    Process a single decoded line (or bytes line), the same way lines are processed when reading a file in text mode.
+    """
+    cr, eol = (b'\r', b'\n') if isinstance(line, bytes) else (u'\r', u'\n')
+    if line.endswith(cr):
+        line = line[:-1]
+    if trim:
+        return line.strip()
+    if keep_eol and has_eol:
+        return line + eol
+    return line
+
+
+def __candidate_hits(buff, pos, end, find, match, get_line, count_lines, every_line):
+    """
+    Find matching lines in range by searching candidates and verifying the lines that contain them.
+    If candidates turn out to be too dense, switch to checking every line, which is faster in that case.
+    :return: Iterator of (line index, line start position, line, match offset, match end offset). Line index is only
+            calculated if 'count_lines' is set.
+    """
+    last_eol = buff[end - 1:end] == b'\n'
+    counted_pos = pos
+    line_index = 0
+    candidates = 0
+    window_start = pos
+    while pos < end:
+
+        # find next candidate
+        found = find(buff, pos, end)
+        if found == -1 or found > end or (found == end and last_eol):
+            break
+
+        # get the start of line containing the candidate, and calc its index
+        line_start = buff.rfind(b'\n', pos, found) + 1 or pos
+        if count_lines:
+            line_index += __count_lines(buff, counted_pos, line_start)
+            counted_pos = line_start
+
+        # if candidates are too dense, check every line from here
+        candidates += 1
+        if candidates == _DENSE_CANDIDATES:
+            if line_start - window_start < _DENSE_CANDIDATES * _DENSE_BYTES_PER_CANDIDATE:
+                for hit in every_line(line_start, line_index):
+                    yield hit
+                return
+            candidates = 0
+            window_start = line_start
+
+        # get candidate line
+        line_end = buff.find(b'\n', found, end)
+        if line_end == -1:
+            line_end = end
+        pos = line_end + 1
+
+        # verify match
+        line = get_line(line_start, line_end)
+        matched, offset, endpos = match(line)
+        if matched:
+            yield line_index, line_start, line, offset, endpos
+
+
+def __every_line_hits(buff, chunk_start, end, line_index, match, encoding, errors, trim, keep_eol):
+    """
+    Find matching lines in range by checking every line. Buffer is decoded in large chunks to reduce overhead (unless
+    encoding is None, in which case lines are bytes).
+    :return: Iterator of (line index, line start position, line, match offset, match end offset).
+    """
+    cr, eol = (u'\r', u'\n') if encoding is not None else (b'\r', b'\n')
+    while chunk_start < end:
+
+        # get next chunk of whole lines
+        chunk_end = buff.rfind(b'\n', chunk_start, min(end, chunk_start + _DECODE_CHUNK)) + 1
+        if chunk_end <= chunk_start:
+            chunk_end = buff.find(b'\n', chunk_start + _DECODE_CHUNK, end) + 1 or end
+        chunk = buff[chunk_start:chunk_end]
+        text = chunk.decode(encoding, errors) if encoding is not None else chunk
+        is_ascii = len(text) == len(chunk)
+
+        # split to lines (the last one is empty if chunk ends with end-of-line)
+        lines = text.split(eol)
+        last = len(lines) - 1
+        if not lines[last]:
+            lines.pop()
+
+        # check every line
+        char_pos = 0
+        for index, raw_line in enumerate(lines):
+            line = __process_line(raw_line, index < last, trim, keep_eol) \
+                if trim or keep_eol or raw_line.endswith(cr) else raw_line
+            matched, offset, endpos = match(line)
+            if matched:
+                if is_ascii:
+                    line_start = chunk_start + char_pos
+                else:
+                    line_start = chunk_start + len(text[:char_pos].encode(encoding, errors))
+                yield line_index, line_start, line, offset, endpos
+            char_pos += len(raw_line) + 1
+            line_index += 1
+
+        chunk_start = chunk_end
+
+
+def __count_lines(buff, start, end):
+    """
+    Count end-of-lines in buffer between positions, without copying too much of it at once.
+    """
+    if end - start <= _COUNT_LINES_CHUNK:
+        return buff[start:end].count(b'\n')
+    count = 0
+    while start < end:
+        chunk_end = min(end, start + _COUNT_LINES_CHUNK)
+        count += buff[start:chunk_end].count(b'\n')
+        start = chunk_end
+    return count
+
+
+def __bytes_offset(buff, line_start, offset, encoding, errors, trimmed):
+    """
+    Convert offset of match in decoded line to offset in encoded line.
+    """
+    # no match position (invert) - return line start
+    if offset < 0:
+        return 0
+
+    # decode line again and convert position
+    line_end = buff.find(b'\n', line_start)
+    raw = buff[line_start:line_end if line_end != -1 else len(buff)]
+    line = raw.decode(encoding, errors) if encoding is not None else raw
+    if trimmed:
+        offset += len(line) - len(line.lstrip())
+    if len(line) == len(raw):
+        return offset
+    return len(line[:offset].encode(encoding, errors))
+
+
+def __bytes_finder(pattern, flags, encoding):
+    """
+    Build a function to find the next candidate in encoded bytes, for the given pattern and flags.
+    The returned function gets (buffer, position, end position) and returns the position of the next possible match,
+    or -1. Every matching line must contain a candidate, but candidates are not necessarily a match (so they are
+    verified later).
+    :param encoding: Buffer encoding, or None if pattern is bytes (and is searched as is).
+    :return: Find function, or None if we can't search pattern on the encoded bytes and every line is a candidate.
+    """
+    # invert returns (almost) every line, no point in searching
+    if flags.get('invert'):
+        return None
+
+    # fixed strings
+    if flags.get('fixed_strings'):
+        patterns = [pattern] if isinstance(pattern, _grepfunc._string_types) else list(pattern)
+
+        # large lists are matched with the automaton line by line anyway
+        if len(patterns) >= _grepfunc.AHO_CORASICK_MIN_PATTERNS:
+            return None
+
+        # bytes strings (ignoring case of bytes only folds ascii letters, like the bytes regex flag does)
+        if encoding is None:
+            if len(patterns) == 1 and not flags.get('ignore_case'):
+                literal = patterns[0]
+                return lambda buff, pos, end: buff.find(literal, pos, end)
+            regex = b'|'.join(re.escape(p) for p in patterns)
+            return __regex_find(re.compile(regex, re.IGNORECASE if flags.get('ignore_case') else 0))
+
+        # build a bytes regex to find any of the strings
+        try:
+            if flags.get('ignore_case'):
+                if any(ord(c) > 127 for p in patterns for c in p):
+                    return None
+                regex = re.compile(b'|'.join(__ignore_case_literal(p, encoding) for p in patterns), re.IGNORECASE)
+            else:
+                encoded = [p.encode(encoding) for p in patterns]
+                if len(encoded) == 1:
+                    literal = encoded[0]
+                    return lambda buff, pos, end: buff.find(literal, pos, end)
+                regex = re.compile(b'|'.join(re.escape(p) for p in encoded))
+        except UnicodeEncodeError:
+            return None
+        return __regex_find(regex)
+
+    # regex - only string patterns
+    if not isinstance(pattern, _grepfunc._string_types):
+        return None
+    re_flags = (flags.get('regex_flags') or 0) & ~re.UNICODE
+    re_flags |= re.IGNORECASE if flags.get('ignore_case') else 0
+    if flags.get('words'):
+        pattern = _grepfunc._words_pattern(pattern)
+
+    # if regex requires literals, candidates are the places where the literals appear (this works for any regex)
+    required = _grepfunc._pattern_literals(pattern, re_flags)
+    if required is not None:
+        literals, ignore_case = required
+        try:
+            encoded = [l.encode(encoding) for l in literals] if encoding is not None else literals
+        except UnicodeEncodeError:
+            return None
+        if len(encoded) == 1 and not ignore_case:
+            literal = encoded[0]
+            return lambda buff, pos, end: buff.find(literal, pos, end)
+        return __regex_find(re.compile(b'|'.join(re.escape(l) for l in encoded), re.IGNORECASE if ignore_case else 0))
+
+    # if not, only patterns that behave the same on encoded bytes and on decoded lines
+    if flags.get('trim') or not _grepfunc._can_search_regex_blocks(flags):
+        return None
+
+    # bytes patterns behave the same, as long as they don't depend on where the searched string begins and ends
+    if encoding is None:
+        if _grepfunc._BLOCK_UNSAFE_REGEX.search(pattern.decode('latin-1')):
+            return None
+        return __regex_find(re.compile(pattern, re_flags | re.MULTILINE))
+    try:
+        parsed = _sre_parse.parse(pattern, re_flags)
+        parsed_flags = (getattr(parsed, 'state', None) or parsed.pattern).flags
+        ascii_only = bool(parsed_flags & _RE_ASCII)
+        if (parsed_flags & re.IGNORECASE and not ascii_only) or not __bytes_safe(parsed, ascii_only, False):
+            return None
+        regex = re.compile(pattern.encode(encoding), re_flags | re.MULTILINE)
+    except (re.error, UnicodeEncodeError):
+        return None
+    return __regex_find(regex)
+
+
+def __regex_find(regex):
+    """
+    Create a find function from a compiled bytes regex.
+    """
+    regex_search = regex.search
+
+    def find(buff, pos, end):
+        result = regex_search(buff, pos, end)
+        return -1 if result is None else result.start()
+    return find
+
+
+def __ignore_case_literal(literal, encoding):
+    """
+    Build a bytes regex source to find an ascii string in encoded bytes while ignoring case (when compiled with
+    IGNORECASE flag), the same way str.lower() does.
+    """
+    ret = []
+    for c in literal.lower():
+        encoded = re.escape(c.encode(encoding))
+        if c in _LOWER_TO_ASCII:
+            try:
+                encoded = b'(?:' + encoded + b'|' + re.escape(_LOWER_TO_ASCII[c].encode(encoding)) + b')'
+            except UnicodeEncodeError:
+                pass
+        ret.append(encoded)
+    return b''.join(ret)
+
+
+# regex nodes that match exactly the same in encoded bytes and in decoded string
+_BYTES_SAFE_AT = (_sre_parse.AT_BEGINNING, _sre_parse.AT_BEGINNING_LINE, _sre_parse.AT_END, _sre_parse.AT_END_LINE)
+_BYTES_WORD_AT = (_sre_parse.AT_BOUNDARY, _sre_parse.AT_NON_BOUNDARY)
+_BYTES_SAFE_REPEAT = (_sre_parse.MAX_REPEAT, _sre_parse.MIN_REPEAT)
+
+
+def __bytes_safe(items, ascii_only, unbounded_repeat):
+    """
+    Check if a parsed regex finds every match it would find in a decoded string when running on the encoded bytes
+    instead. Non-ascii characters are multiple bytes, so for example a single '.' can't match them, and \\w won't see
+    them as part of a word. Note: its ok to find more matches, since they are verified later.
+    :param items: Parsed regex items.
+    :param ascii_only: Is the regex ASCII flag set.
+    :param unbounded_repeat: Are items a single item repeated with no upper limit (eg '.*' or '[^x]+').
+    :return: True if regex is safe to run on encoded bytes.
+    """
+    items = list(items)
+    for index, (op, av) in enumerate(items):
+
+        # ascii literals and non-ascii literals outside of sets are encoded to the same sequence of bytes
+        if op == _sre_parse.LITERAL:
+            continue
+
+        # any character or negated literal match a single byte, so only safe if repeated with no upper limit
+        if op == _sre_parse.ANY or op == _sre_parse.NOT_LITERAL:
+            if not unbounded_repeat or (op == _sre_parse.NOT_LITERAL and av > 127):
+                return False
+
+        # sets of characters are safe if they only contain ascii, or if negated and repeated with no upper limit
+        elif op == _sre_parse.IN:
+            for set_op, set_av in av:
+                if set_op == _sre_parse.NEGATE:
+                    if not unbounded_repeat:
+                        return False
+                elif set_op == _sre_parse.LITERAL:
+                    if set_av > 127:
+                        return False
+                elif set_op == _sre_parse.RANGE:
+                    if set_av[1] > 127:
+                        return False
+                elif set_op != _sre_parse.CATEGORY or not ascii_only:
+                    return False
+
+        # categories (like \w or \d) are unicode aware in strings but not in bytes
+        elif op == _sre_parse.CATEGORY:
+            if not ascii_only:
+                return False
+
+        # positions (beginning and end of string are not safe, since we search multiple lines at once)
+        elif op == _sre_parse.AT:
+            if av in _BYTES_SAFE_AT:
+                continue
+            if av not in _BYTES_WORD_AT or (av != _sre_parse.AT_BOUNDARY and not ascii_only):
+                return False
+
+            # word boundary next to an ascii word character is safe, since non-ascii characters can only add boundaries
+            if not ascii_only:
+                neighbours = items[index - 1:index] + items[index + 1:index + 2]
+                if not any(n_op == _sre_parse.LITERAL and n_av < 128 and (chr(n_av).isalnum() or n_av == ord('_'))
+                           for n_op, n_av in neighbours):
+                    return False
+
+        # groups and alternation
+        elif op == _sre_parse.SUBPATTERN:
+            if av[1] & re.IGNORECASE and not ascii_only:
+                return False
+            if not __bytes_safe(av[-1], ascii_only, False):
+                return False
+        elif op == _sre_parse.BRANCH:
+            for branch in av[1]:
+                if not __bytes_safe(branch, ascii_only, False):
+                    return False
+
+        # repeat
+        elif op in _BYTES_SAFE_REPEAT:
+            unbounded = av[1] == _sre_parse.MAXREPEAT and len(av[2]) == 1
+            if not __bytes_safe(av[2], ascii_only, unbounded):
+                return False
+
+        # back-references match the same text in both
+        elif op == _sre_parse.GROUPREF:
+            continue
+
+        # anything else (lookarounds, conditions, atomic groups..) is not safe
+        else:
+            return False
+
+    return True
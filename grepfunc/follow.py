@@ -0,0 +1,436 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Follow a growing file (like 'tail -f | grep'), and return matches as lines are appended to it.
+The position in file is kept in a checkpoint, which can be saved and used to resume later (even in another process),
+so every run only greps the bytes appended since the previous run.
+
+Author: Ronen Ness.
+Since: 2017.
+"""
+import json
+import os
+import time
+from collections import deque
+from . import files as _files
+from . import grepfunc as _grepfunc
+
+# how many bytes to read from file at once
+READ_SIZE = 1024 * 1024
+
+# default time, in seconds, to wait between checks for new lines
+POLL_INTERVAL = 1.0
+
+
+class FollowCheckpoint(object):
+    """
+    Position of grep_follow() in a followed file. Pass it as the 'checkpoint' flag of grep_follow() to resume from it,
+    and it is updated as lines are grepped. Use save() and load() (or as_dict() and from_dict()) to keep it between
+    runs.
+    """
+
+    def __init__(self, inode=None, offset=0, line=0, partial=b'', context=()):
+        """
+        Create checkpoint. The default values are the beginning of file.
+        :param inode: Inode of the followed file, to detect if it was replaced (rotated) since the checkpoint.
+        :param offset: Position in file (in bytes) to continue reading from.
+        :param line: Index of the next line.
+        :param partial: Bytes of the last line that were already read, but didn't end yet (they are before offset).
+        :param context: Last lines (as bytes, without end-of-line) before the next line, used as leading context.
+        """
+        self.inode = inode
+        self.offset = offset
+        self.line = line
+        self.partial = partial
+        self.context = list(context)
+
+    def reset(self, inode=None):
+        """
+        Reset checkpoint to the beginning of a file.
+        :param inode: Inode of the new file.
+        """
+        self.__init__(inode)
+
+    def as_dict(self):
+        """
+        Get checkpoint as a json serializable dictionary (bytes are stored as latin-1 strings).
+        """
+        return {
+            'inode': self.inode,
+            'offset': self.offset,
+            'line': self.line,
+            'partial': self.partial.decode('latin-1'),
+            'context': [line.decode('latin-1') for line in self.context],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Create checkpoint from a dictionary returned by as_dict().
+        """
+        return cls(data['inode'], data['offset'], data['line'], data['partial'].encode('latin-1'),
+                   [line.encode('latin-1') for line in data['context']])
+
+    def save(self, path):
+        """
+        Save checkpoint to a json file (the file is replaced at once, so a crash never leaves a broken checkpoint).
+        :param path: File path to save to.
+        """
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as outfile:
+            json.dump(self.as_dict(), outfile)
+        if hasattr(os, 'replace'):
+            os.replace(temp_path, path)
+        else:
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load checkpoint from a file created by save().
+        :param path: File path to load from.
+        :return: Checkpoint instance.
+        """
+        with open(path, 'r') as infile:
+            return cls.from_dict(json.load(infile))
+
+    def __repr__(self):
+        """
+        Return a short summary of the checkpoint.
+        """
+        return "FollowCheckpoint(inode=%s, offset=%d, line=%d, partial=%d bytes, context=%d lines)" % (
+            self.inode, self.offset, self.line, len(self.partial), len(self.context))
+
+
+def grep_follow(path, pattern, **kwargs):
+    """
+    Follow a file by path and return matches as lines are appended to it, like 'tail -f | grep'.
+    Starts from the beginning of file (or from the checkpoint flag), and after reaching the end of file waits for new
+    lines. If file is replaced (rotated, detected by a different inode) the rest of the old file is grepped and then
+    the new file is followed from its beginning, and if file is truncated (detected by a size smaller than the
+    position read) it is followed from its beginning. Line numbers restart with every new file.
+    Results are the same as grep_iter() on the lines of file (lines are split by '\\n', and a '\\r' before it is
+    removed), except that the last line is only grepped once it ends (or file is rotated).
+    :param path: File path to follow.
+    :param pattern: Grep pattern to search, or a Matcher returned by compile().
+    :param kwargs: See grep() help for info about flags (quiet, count and merge_context are not supported). In
+                   addition, accept:
+
+        - checkpoint:            Optional FollowCheckpoint to start from. Its updated after returning all matches of
+                                 every block read, so saving it at any time and resuming from it never skips matches
+                                 (matches that were returned after it was updated may be returned again). Matches that
+                                 still wait for trailing context are kept in checkpoint as the position of their line,
+                                 and the last line of file is kept in checkpoint until it ends, so resuming runs
+                                 return the same matches as a single run.
+        - follow:                If false, stop at the end of file instead of waiting for new lines (for batch jobs
+                                 that resume from a checkpoint). Default to True.
+        - poll_interval:         Time, in seconds, to wait between checks for new lines (default to 1 second).
+        - idle_timeout:          If set, stop following after this many seconds without new lines.
+        - encoding:              File encoding, must be ascii-compatible (default to 'utf-8'). For bytes patterns,
+                                 decode returned lines with this encoding (see grep()).
+        - errors:                How to handle decoding errors (default to 'strict', see str.decode).
+
+    When stopping (at the end of file if follow is false, or after idle_timeout) without a checkpoint flag, the last
+    line is grepped even if it didn't end, and matches that still wait for trailing context are returned with the
+    context lines available, like grep_iter() does at the end of file.
+    :return: Next match.
+    """
+    matcher = _grepfunc.compile(pattern, **kwargs)
+    flags = matcher.flags
+    if _grepfunc._merge_context(flags):
+        raise ValueError("grep_follow() does not support the merge_context flag.")
+
+    # get flags that are relevant to this function
+    checkpoint = flags.get('checkpoint')
+    if checkpoint is None:
+        checkpoint = FollowCheckpoint()
+    follow = flags.get('follow', True)
+    poll_interval = flags.get('poll_interval') or POLL_INTERVAL
+    idle_timeout = flags.get('idle_timeout')
+
+    # decode returned lines of bytes patterns, if requested
+    keep_pending = flags.get('checkpoint') is not None
+    values = __follow(path, matcher, checkpoint, follow, poll_interval, idle_timeout, keep_pending)
+    encoding = _grepfunc._decode_encoding(matcher)
+    if encoding:
+        values = _grepfunc._decode_values(values, encoding, flags.get('errors') or 'strict')
+    for value in values:
+        yield value
+
+
+def __follow(path, matcher, checkpoint, follow, poll_interval, idle_timeout, keep_pending):
+    """
+    Implement grep_follow() for an already compiled matcher.
+    :param keep_pending: If true, when stopping keep the last line (if it didn't end) and matches that wait for
+                         trailing context in checkpoint, instead of returning them.
+    :return: Next match.
+    """
+    encoding, errors = _files._buffer_encoding(matcher)
+    if encoding is not None and u'\na'.encode(encoding) != b'\na':
+        raise ValueError("grep_follow() only support ascii-compatible encodings, got '%s'." % encoding)
+
+    reader = _FileLines(matcher, checkpoint, encoding, errors)
+    last_read = time.time()
+    try:
+        while True:
+
+            # open file (or wait for it to exist)
+            if reader.infile is None and not reader.open(path):
+                if not follow or __idle(last_read, idle_timeout):
+                    return
+                time.sleep(poll_interval)
+                continue
+
+            # grep all new lines
+            got_data = False
+            for values in reader.read():
+                got_data = True
+                for value in values:
+                    yield value
+                reader.update_checkpoint()
+                if reader.state.done:
+                    return
+            if got_data:
+                last_read = time.time()
+
+            # check if file was rotated or truncated
+            changed = reader.changed(path)
+            if changed:
+                for value in reader.restart(changed == 'rotated'):
+                    yield value
+                if reader.state.done:
+                    return
+                continue
+
+            # stop, or wait for new lines
+            if not follow or __idle(last_read, idle_timeout):
+                break
+            time.sleep(poll_interval)
+
+        # without a checkpoint to resume from, this is the end of file: grep last line (even if it didn't end) and
+        # return matches that wait for trailing context
+        if not keep_pending:
+            for value in reader.end(True):
+                yield value
+
+    finally:
+        reader.close()
+
+
+def __idle(last_read, idle_timeout):
+    """
+    Return if followed file was idle for too long.
+    """
+    return idle_timeout is not None and time.time() - last_read >= idle_timeout
+
+
+class _FileLines(object):
+    """
+    Read and grep the lines of a followed file, and keep its checkpoint.
+    """
+
+    def __init__(self, matcher, checkpoint, encoding, errors):
+        """
+        Create file reader (the file is opened by open()).
+        :param matcher: Compiled matcher.
+        :param checkpoint: FollowCheckpoint to start from, and to update.
+        :param encoding: File encoding, or None for bytes patterns.
+        :param errors: How to handle decoding errors.
+        """
+        flags = matcher.flags
+        self.matcher = matcher
+        self.checkpoint = checkpoint
+        self.encoding = encoding
+        self.errors = errors
+        self.keep_eol = flags.get('keep_eol')
+        self.before_context = flags.get('before_context') or 0
+        self.after_context = flags.get('after_context') or 0
+        self.infile = None
+        self.inode = None
+
+        # position after the last complete line read, and the beginning of the next line (that wasn't read entirely)
+        self.offset = 0
+        self.partial = b''
+
+        # last lines read, as (position, bytes), when context is needed (to save leading context in checkpoint, or to
+        # rewind checkpoint to matches that wait for trailing context)
+        self.recent = deque(maxlen=self.before_context + self.after_context + 1)
+
+        # grep state (line index, leading context and matches waiting for trailing context)
+        self.state = _grepfunc._LinesState(flags)
+
+    def open(self, path):
+        """
+        Open file and start from checkpoint (or from the beginning, if file was replaced or truncated since the
+        checkpoint was saved).
+        :return: False if file doesn't exist, True otherwise.
+        """
+        try:
+            self.infile = open(path, 'rb')
+        except (IOError, OSError):
+            if os.path.exists(path):
+                raise
+            return False
+        stat = os.fstat(self.infile.fileno())
+        self.inode = stat.st_ino
+        checkpoint = self.checkpoint
+        if checkpoint.inode != self.inode or stat.st_size < checkpoint.offset:
+            checkpoint.reset(self.inode)
+
+        # continue from checkpoint
+        self.infile.seek(checkpoint.offset)
+        self.partial = checkpoint.partial
+        self.offset = checkpoint.offset - len(checkpoint.partial)
+        self.state.line_index = checkpoint.line
+        if self.recent.maxlen > 1:
+            position = self.offset
+            for raw in reversed(checkpoint.context):
+                position -= len(raw) + 1
+                self.recent.appendleft((position, raw))
+        if self.before_context:
+            context = self.__lines(checkpoint.context[-self.before_context:])
+            if self.matcher.flags.get('trim'):
+                context = [line.strip() for line in context]
+            self.state.prev_lines.extend(context)
+        return True
+
+    def close(self):
+        """
+        Close file.
+        """
+        if self.infile is not None:
+            self.infile.close()
+            self.infile = None
+
+    def read(self):
+        """
+        Read and grep file until its current end.
+        :return: Iterator of lists of matches, one list for every block read.
+        """
+        while True:
+            data = self.infile.read(READ_SIZE)
+            if not data:
+                return
+
+            # break data into complete lines and the beginning of next line
+            data = self.partial + data
+            last_eol = data.rfind(b'\n')
+            if last_eol == -1:
+                self.partial = data
+                continue
+            self.partial = data[last_eol + 1:]
+            yield self.__grep(data[:last_eol + 1])
+
+    def __grep(self, data):
+        """
+        Grep a block of complete lines.
+        :param data: Bytes of lines, ending with end-of-line.
+        :return: List of matches.
+        """
+        # keep last lines for checkpoint, if we need context
+        raw_lines = data.split(b'\n')
+        raw_lines.pop()
+        if self.recent.maxlen > 1:
+            last_lines = raw_lines[-self.recent.maxlen:]
+            position = self.offset + len(data) - sum(len(raw) + 1 for raw in last_lines)
+            for raw in last_lines:
+                self.recent.append((position, raw))
+                position += len(raw) + 1
+        self.offset += len(data)
+        return list(_grepfunc._grep_lines(self.__lines(raw_lines), self.matcher, self.state))
+
+    def __lines(self, raw_lines, has_eol=True):
+        """
+        Convert bytes lines (without end-of-line) to the lines we grep: decoded, without '\\r' at their end, and with
+        end-of-line if keep_eol flag is set.
+        :param has_eol: If false, lines didn't end with end-of-line in file (so it is not kept).
+        """
+        lines = raw_lines
+        if self.encoding is not None:
+            lines = [line.decode(self.encoding, self.errors) for line in raw_lines]
+        cr = b'\r' if self.encoding is None else u'\r'
+        lines = [line[:-1] if line.endswith(cr) else line for line in lines]
+        if self.keep_eol and has_eol:
+            eol = self.matcher.eol
+            lines = [line + eol for line in lines]
+        return lines
+
+    def update_checkpoint(self):
+        """
+        Update checkpoint to the current position. If there are matches that still wait for trailing context, the
+        checkpoint is set to the line of the first one instead (so they are returned after resuming).
+        """
+        checkpoint = self.checkpoint
+        checkpoint.inode = self.inode
+        pending = self.state.pending
+        recent = self.recent
+
+        # no matches waiting: checkpoint is the current position
+        if not pending:
+            checkpoint.offset = self.offset + len(self.partial)
+            checkpoint.line = self.state.line_index
+            checkpoint.partial = self.partial
+            checkpoint.context = [raw for _, raw in list(recent)[-self.before_context:]] \
+                if self.before_context else []
+            return
+
+        # rewind to the first match that waits for context (lines since it are in recent lines)
+        back = self.after_context - pending[0][2] + 1
+        lines = list(recent)
+        checkpoint.offset = lines[-back][0]
+        checkpoint.line = self.state.line_index - back
+        checkpoint.partial = b''
+        checkpoint.context = [raw for _, raw in lines[:-back][-self.before_context:]] if self.before_context else []
+
+    def changed(self, path):
+        """
+        Check if file was replaced or truncated, after reading until its end.
+        :return: 'rotated', 'truncated', or None if file didn't change.
+        """
+        try:
+            stat = os.stat(path)
+        except (IOError, OSError):
+            return None
+        if stat.st_ino != self.inode:
+            return 'rotated'
+        if os.fstat(self.infile.fileno()).st_size < self.offset + len(self.partial):
+            return 'truncated'
+        return None
+
+    def restart(self, rotated):
+        """
+        Finish grepping current file and start from the beginning of file (the next time open() is called).
+        :param rotated: If true, file was replaced and the last line of current file is grepped, even if it didn't end.
+        :return: Matches of the end of current file.
+        """
+        ret = self.end(rotated)
+        self.close()
+
+        # start a new file with the same max_count
+        matches_left = self.state.matches_left
+        self.state = _grepfunc._LinesState(self.matcher.flags)
+        self.state.matches_left = matches_left
+        self.state.done = not matches_left
+        self.recent.clear()
+        self.partial = b''
+        self.offset = 0
+        self.checkpoint.reset()
+        return ret
+
+    def end(self, last_line):
+        """
+        Finish grepping current file: return matches that wait for trailing context, and update checkpoint after them.
+        :param last_line: If true, grep the last line of file even if it didn't end.
+        :return: List of matches.
+        """
+        ret = []
+        if last_line and self.partial:
+            self.offset += len(self.partial)
+            lines = self.__lines([self.partial], False)
+            self.partial = b''
+            ret.extend(_grepfunc._grep_lines(lines, self.matcher, self.state))
+        ret.extend(_grepfunc._grep_lines_end(self.matcher, self.state))
+        self.update_checkpoint()
+        return ret
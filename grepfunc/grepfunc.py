@@ -6,7 +6,15 @@ Provide a unix-like grep function for Python.
 Author: Ronen Ness.
 Since: 2017.
 """
+import io
 import re
+from collections import deque
+from itertools import chain, islice
+from .ahocorasick import AhoCorasick
+from .literals import required_literals
+from .results import GrepResults
+from . import backends as _backends
+from . import limits as _limits
 
 # get python base string for either Python 2.x or 3.x
 try:
@@ -14,6 +22,25 @@ try:
 except NameError:
     _basestring = str
 
+# text and bytes string types (in Python 2.x bytes is str, so this is just basestring)
+_string_types = (_basestring, bytes)
+
+
+# when a list of fixed strings is at least this long, match it with an Aho-Corasick automaton instead of str.find()
+AHO_CORASICK_MIN_PATTERNS = 32
+
+# block size to read files in when counting matches, if block_size flag is not set
+COUNT_BLOCK_SIZE = 1024 * 1024
+
+# how many items of a list to join and search at once, when grepping lists by indices
+INDICES_CHUNK = 64 * 1024
+
+# how many characters (or bytes) from the beginning of target to check for NUL, when binary_files flag is set
+BINARY_CHECK_SIZE = 32 * 1024
+
+# value returned instead of the matches of binary targets, when binary_files flag is 'binary'
+BINARY_FILE_MATCHES = 'Binary file matches'
+
 
 def __fix_args(kwargs):
     """
@@ -38,19 +65,23 @@ def __fix_args(kwargs):
     kwargs.setdefault('keep_eol', kwargs.get('k'))
     kwargs.setdefault('trim', kwargs.get('t'))
 
+    # literal backends match fixed strings
+    if kwargs.get('backend') in _backends.LITERAL_BACKENDS:
+        kwargs['fixed_strings'] = True
+
 
 def _is_part_of_word(c):
     """
     return if a given character is a part of a word, eg not a word breaker character
     """
-    return c.isalpha() or c == '_'
+    return c.isalpha() or c == '_' or c == b'_'
 
 
 def grep(target, pattern, **kwargs):
     """
     Main grep function.
     :param target: Target to apply grep on. Can be a single string, an iterable, a function, or an opened file handler.
-    :param pattern: Grep pattern to search.
+    :param pattern: Grep pattern to search, or a Matcher returned by compile().
     :param kwargs: Optional flags (note: the docs below talk about matching 'lines', but this function also accept lists
                     and other iterables - in those cases, a 'line' means a single value from the iterable).
 
@@ -65,8 +96,8 @@ def grep(target, pattern, **kwargs):
         - c, count:              Instead of the normal output, print a count of matching lines.
         - m NUM, max_count:      Stop reading after NUM matching values.
         - A NUM, after_context:  Return NUM lines of trailing context after matching lines. This will replace the string
-                                 part of the reply to a list of strings. Note that in some input types this might skip
-                                 following matches. For example, if the input is a file or a custom iterator.
+                                 part of the reply to a list of strings. Lines in trailing context are still checked
+                                 for matches, so following matches are never skipped (every match gets its own list).
         - B NUM, before_context: Return NUM lines of leading context before matching lines. This will replace the string
                                  part of the reply to a list of strings.
         - q, quiet:              Instead of returning string / list of strings return just a single True / False if
@@ -80,92 +111,785 @@ def grep(target, pattern, **kwargs):
         - k, keep_eol            When iterating file, if this option is set will keep the end-of-line at the end of every
                                  line. If not (default) will trim the end of line character.
         - t, trim                Trim all whitespace characters from every line processed.
+        - merge_context:         When used with after_context / before_context, instead of returning a list for every
+                                 match, merge matches with overlapping or adjacent context into a single group of
+                                 lines (like unix grep). Return a list of lines for every group, where line_number is
+                                 the index of the group's first line, and byte_offset is the offset of its first match.
+                                 In this mode max_count stops after NUM matching lines, but still completes the
+                                 trailing context of the last match.
+        - group_separator:       When merge_context is set, return this value between groups (for example '--').
+        - cache:                 Optional ResultCache to cache results in. Results are reused if called again with the
+                                 same pattern, flags and target. Only opened files (from their beginning) are cached by
+                                 their identity (path, size, modification time and inode), and if a file was only
+                                 appended to, only the new lines are grepped. Other targets are only cached if the
+                                 cache_key flag is set.
+        - cache_key:             When cache is set, a hashable key that identifies the target (for example a name and
+                                 a version). Results are reused for the same key, without checking target.
+        - stats:                 Optional GrepStats to collect counters and timings in (lines and characters read,
+                                 match calls, matches and lines rejected by the regex prefilter, time spent reading
+                                 input and matching), and to get progress and slow match callbacks. When not set,
+                                 nothing is collected.
+        - block_size:            When target is a file or a string, read and scan it in blocks of this many characters
+                                 instead of line by line, and only break into lines the parts that contain matches.
+                                 Much faster when matches are sparse. In this mode a string target is treated as
+                                 multiple lines (split by end-of-line). Ignored (but still splits strings to lines)
+                                 when combined with flags that require checking every line, like invert, trim or
+                                 keep_eol.
+        - binary_files:          How to handle binary targets, eg targets with a NUL character in their first
+                                 BINARY_CHECK_SIZE characters (or bytes). If 'text' or not set, grep them like any
+                                 other target. If 'without-match', skip them (return no matches, without reading
+                                 further). If 'binary', stop at the first match and return the single value
+                                 'Binary file matches' instead of matching lines (count and quiet are not affected).
+                                 Only strings, lists, iterators and seekable files are checked.
+        - encoding:              When pattern is bytes, decode returned lines (and context) with this encoding. Lines
+                                 are still matched as bytes, so only the returned lines are decoded.
+        - errors:                How to handle decoding errors when encoding is set (default to 'strict').
+        - all_matches:           When only_matching is set, return every non-overlapping match in a line as a
+                                 separate value (like unix grep -o), instead of only the first one. Empty matches are
+                                 skipped, and max_count still counts lines. Can't be combined with context flags.
+        - compact:               Instead of a list, return a compact GrepResults object that keeps matches as arrays
+                                 of line numbers, spans and line offsets, and only slices lines from target when they
+                                 are accessed (lists and strings in block mode are kept as the source, and for other
+                                 targets only the matching lines are kept). Takes much less memory with many matches.
+                                 Every match is a span (every match in line if all_matches is set), so flags that
+                                 change returned values (like only_matching, line_number and byte_offset) are not
+                                 needed and ignored. Context flags are not supported, and results are not cached.
+        - backend:               Which backend to match lines with: 're' (python regex, the default), 'literal' or
+                                 'multi_literal' (match pattern as fixed strings, with str.find() or an Aho-Corasick
+                                 automaton), 're2' (linear-time regex, if the re2 module is installed), 'auto' (re2 if
+                                 installed and it supports pattern, python regex otherwise), the name of an engine
+                                 added with register_backend(), or a regex engine object (see backends module).
+        - max_line_length:       Skip lines longer than this many characters (or bytes) without scanning them.
+        - line_timeout:          Skip lines that take more than this many seconds to match (like lines that make a
+                                 regex backtrack catastrophically). On the main thread (where signals are available),
+                                 matching is interrupted once the line runs out of time. Elsewhere, lines are only
+                                 checked after matching.
+        - timeout:               Time budget, in seconds, of the whole call (from the first matched line). Once out of
+                                 time, raise GrepTimeout (with the line that was matched in its 'line' attribute).
+                                 With grep_iter(), matches returned until then are kept.
+        - on_skipped_line:       Optional function to call with (line, reason, seconds) for every skipped line, where
+                                 reason is 'too_long' (see max_line_length) or 'timeout' (see line_timeout).
+                                 Skipped lines don't match, even with the invert flag.
+
+        Pattern and target can also be bytes (a bytes regex or fixed string, or a list of bytes fixed strings, with
+        targets of bytes lines, like files opened in binary mode). In this mode nothing is decoded, and ignore_case only
+        folds ascii letters.
 
     :return: A list with matching lines (even if provided target is a single string), unless flags state otherwise.
     """
-    # unify flags (convert shortcuts to full name)
-    __fix_args(kwargs)
+    # compile pattern and flags once (if pattern is already compiled this just merges the flags)
+    matcher = compile(pattern, **kwargs)
 
-    # parse the params that are relevant to this function
-    f_count = kwargs.get('count')
-    f_max_count = kwargs.get('max_count')
-    f_quiet = kwargs.get('quiet')
+    # use the compiled matcher to do the actual work
+    return _grep_matcher(target, matcher)
 
-    # use the grep_iter to build the return list
-    ret = []
-    for value in grep_iter(target, pattern, **kwargs):
 
-        # if quiet mode no need to continue, just return True because we got a value
-        if f_quiet:
-            return True
+def _grep_matcher(target, matcher, use_cache=True):
+    """
+    Implement grep() for an already compiled matcher.
+    :param target: Target to apply grep on.
+    :param matcher: A compiled Matcher instance.
+    :param use_cache: If false, will ignore the cache flag.
+    :return: See grep().
+    """
+    flags = matcher.flags
 
-        # add current value to return list
-        ret.append(value)
+    # if target is a callable function, call it first to get value
+    if callable(target):
+        target = target()
 
-        # if have max limit and exceeded that limit, break:
-        if f_max_count and len(ret) >= f_max_count:
-            break
+    # compact results are built directly from target (and are not cached)
+    if flags.get('compact') and not flags.get('count') and not flags.get('quiet'):
+        if flags.get('stats') is not None:
+            return flags['stats']._timed(__grep_compact, target, matcher)
+        return __grep_compact(target, matcher)
+
+    # get results from cache (the cache greps target if needed)
+    cache = flags.get('cache')
+    if cache is not None and use_cache:
+        return cache._grep_target(target, matcher)
 
-    # if quiet mode and got here it means we didn't find a match
+    # if collecting stats, measure total time
+    if flags.get('stats') is not None:
+        return flags['stats']._timed(__grep_target, target, matcher)
+    return __grep_target(target, matcher)
+
+
+def __grep_target(target, matcher):
+    """
+    Implement grep() for an already compiled matcher, after calling target (if callable) and checking cache.
+    :return: See grep().
+    """
+    flags = matcher.flags
+
+    # quiet and count don't need the matches themselves, so use the counting fast path
+    if flags.get('quiet'):
+        return _count_matches(target, matcher, 1) > 0
+    if flags.get('count'):
+        return _count_matches(target, matcher, flags.get('max_count'))
+
+    # lists are grepped by indices (which searches many items at once), unless flags change the returned items
+    if isinstance(target, (list, tuple)) and not (flags.get('after_context') or flags.get('before_context') or
+                                                  flags.get('only_matching') or flags.get('byte_offset') or
+                                                  flags.get('trim') or _checks_binary(flags) or
+                                                  _decode_encoding(matcher)):
+        indices = islice(_grep_indices(target, matcher), flags.get('max_count') or None)
+        if flags.get('line_number'):
+            return [(index, target[index]) for index in indices]
+        return [target[index] for index in indices]
+
+    return _grep_results(grep_iter(target, matcher), flags)
+
+
+def _grep_results(values, flags):
+    """
+    Build grep() return value from an iterator of matches, as returned by grep_iter() or other grep iterators.
+    :param values: Iterator of matches.
+    :param flags: Flags after converting shortcuts.
+    :return: See grep().
+    """
+    # parse the params that are relevant to this function
+    f_count = flags.get('count')
+    f_max_count = flags.get('max_count')
+    f_quiet = flags.get('quiet')
+    merge_context = _merge_context(flags)
+
+    # if quiet mode no need to continue after the first value, just return True because we got one
     if f_quiet:
+        for _ in values:
+            return True
         return False
 
-    # if requested count return results count
+    # if requested count, just count values without keeping them
     if f_count:
-        return len(ret)
+        ret = 0
+        for _ in values:
+            ret += 1
+            if ret == f_max_count:
+                break
+        return ret
+
+    # use the values iterator to build the return list
+    ret = []
+    for value in values:
+
+        # add current value to return list
+        ret.append(value)
+
+        # if have max limit and exceeded that limit, break (when merging contexts or returning all the matches in
+        # lines, the iterator handles it since max_count counts lines)
+        if f_max_count and len(ret) >= f_max_count and not merge_context and not flags.get('all_matches'):
+            break
 
     # return results list
     return ret
 
 
+def __grep_compact(target, matcher):
+    """
+    Implement grep() with the compact flag, for an already compiled matcher (after calling target, if callable).
+    :return: GrepResults instance.
+    """
+    flags = matcher.flags
+    match = matcher.match
+    spans = matcher.spans
+    f_trim = flags.get('trim')
+    f_keep_eol = flags.get('keep_eol')
+    limit = flags.get('max_count') or None
+    encoding = _decode_encoding(matcher)
+    errors = flags.get('errors') or 'strict'
+    eol = matcher.eol
+    if flags.get('after_context') or flags.get('before_context'):
+        raise ValueError("The compact flag does not support context flags.")
+
+    # check if target is binary, if requested (binary targets with matches return a single message, like grep())
+    if _checks_binary(flags):
+        is_binary, target = _check_binary(target)
+        if is_binary:
+            if flags.get('binary_files') == 'without-match':
+                return GrepResults([], 'items')
+            return _grep_results(grep_iter(target, matcher), flags)
+
+    # strings are a single line, unless block mode is set (then they are searched as a block of lines when possible)
+    if isinstance(target, _string_types):
+        if not flags.get('block_size'):
+            target = [target]
+        elif matcher.block_search and not f_trim and not f_keep_eol:
+            return __grep_compact_text(target, matcher, limit, encoding, errors)
+        else:
+            target = _lines_stream(target)
+
+    # lists are grepped by indices, and kept as the source of lines
+    if isinstance(target, (list, tuple)):
+        ret = GrepResults(target, 'items', f_trim, encoding, errors)
+        line_numbers, starts, ends = ret.line_numbers, ret.starts, ret.ends
+        for index in islice(_grep_indices(target, matcher), limit):
+            line = target[index]
+            if f_trim:
+                line = line.strip()
+            for position, end_pos in spans(line) if spans else (match(line)[1:],):
+                line_numbers.append(index)
+                starts.append(position)
+                ends.append(end_pos)
+        return ret
+
+    # other targets can't be read again, so matching lines are kept
+    lines = []
+    ret = GrepResults(lines, 'lines', encoding=encoding, errors=errors)
+    line_numbers, starts, ends, offsets, refs = ret.line_numbers, ret.starts, ret.ends, ret.offsets, ret._refs
+    strip_eol = eol if not f_keep_eol and hasattr(target, 'readline') else None
+    if flags.get('stats') is not None:
+        target = flags['stats']._wrap_lines(target)
+    offset = 0
+    matches_left = limit or -1
+    for index, line in enumerate(target):
+        line_offset = offset
+        offset += len(line)
+        line = __process_line(line, strip_eol, f_trim)
+        matched, position, end_pos = match(line)
+        if not matched:
+            continue
+        for position, end_pos in spans(line) if spans else ((position, end_pos),):
+            line_numbers.append(index)
+            starts.append(position)
+            ends.append(end_pos)
+            offsets.append(line_offset)
+            refs.append(len(lines))
+        lines.append(line)
+        matches_left -= 1
+        if not matches_left:
+            break
+    return ret
+
+
+def __grep_compact_text(text, matcher, limit, encoding, errors):
+    """
+    Implement grep() with the compact flag for a string in block mode, by searching it as a single block and keeping
+    only the offsets of matching lines.
+    :return: GrepResults instance.
+    """
+    match = matcher.match
+    spans = matcher.spans
+    find = matcher.block_search(text)
+    eol = matcher.eol
+    ret = GrepResults(text, 'text', encoding=encoding, errors=errors)
+    line_numbers, starts, ends, offsets = ret.line_numbers, ret.starts, ret.ends, ret.offsets
+    matches_left = limit or -1
+    end = len(text)
+    pos = counted_pos = line_index = 0
+    while pos < end:
+
+        # find next candidate, and get its line
+        found = find(pos, end)
+        if found == -1 or found >= end:
+            break
+        line_start = text.rfind(eol, pos, found) + 1 or pos
+        line_end = text.find(eol, found)
+        if line_end == -1:
+            line_end = end
+        line = text[line_start:line_end]
+        pos = line_end + 1
+
+        # verify match
+        matched, position, end_pos = match(line)
+        if not matched:
+            continue
+        line_index += text.count(eol, counted_pos, line_start)
+        counted_pos = line_start
+        for position, end_pos in spans(line) if spans else ((position, end_pos),):
+            line_numbers.append(line_index)
+            starts.append(position)
+            ends.append(end_pos)
+            offsets.append(line_start)
+        matches_left -= 1
+        if not matches_left:
+            break
+    return ret
+
+
+def _count_matches(target, matcher, limit=None):
+    """
+    Count matching lines in target without building any return value, for the count and quiet flags.
+    Files (and strings in block mode) are counted by searching large blocks of text, like block_size mode does.
+    :param target: Target to apply grep on. See grep() for info.
+    :param matcher: Compiled matcher.
+    :param limit: Optional number of matches to stop at.
+    :return: Number of matching lines (up to limit).
+    """
+    flags = matcher.flags
+    match = matcher.match
+    f_trim = flags.get('trim')
+    f_keep_eol = flags.get('keep_eol')
+    f_block_size = flags.get('block_size')
+
+    # if target is a callable function, call it first to get value
+    if callable(target):
+        target = target()
+
+    # skip binary targets, if requested (other binary_files modes count normally)
+    if flags.get('binary_files') == 'without-match':
+        is_binary, target = _check_binary(target)
+        if is_binary:
+            return 0
+
+    # check if we can count by blocks
+    use_blocks = matcher.block_search and not f_trim and not f_keep_eol
+    stats = flags.get('stats')
+    eol = matcher.eol
+
+    # strings are a single line, unless block mode is set
+    if isinstance(target, _string_types):
+        if not f_block_size:
+            target = [target]
+        elif use_blocks:
+            return __count_blocks(stats._wrap_blocks([target]) if stats else [target], matcher, limit)
+        else:
+            target = _lines_stream(target)
+
+    # lists are counted by indices, which searches many items at once
+    elif isinstance(target, (list, tuple)):
+        return sum(1 for _ in islice(_grep_indices(target, matcher), limit))
+
+    # files are counted by blocks even if block mode is not set, since we don't need the lines
+    elif use_blocks and hasattr(target, 'read') and (f_block_size or hasattr(target, 'readline')):
+        blocks = __read_blocks(target, f_block_size or COUNT_BLOCK_SIZE)
+        return __count_blocks(stats._wrap_blocks(blocks) if stats else blocks, matcher, limit)
+
+    # count line by line
+    need_to_trim_eol = eol if not f_keep_eol and hasattr(target, 'readline') else None
+    if stats is not None:
+        target = stats._wrap_lines(target)
+    ret = 0
+    for line in target:
+        if match(__process_line(line, need_to_trim_eol, f_trim))[0]:
+            ret += 1
+            if ret == limit:
+                break
+    return ret
+
+
+def __count_blocks(blocks, matcher, limit):
+    """
+    Count matching lines in blocks of text, by only verifying the candidate lines found by the block search.
+    :param blocks: Iterable of text blocks. Lines may be split between blocks.
+    :param matcher: Compiled matcher (must support block search).
+    :param limit: Optional number of matches to stop at.
+    :return: Number of matching lines (up to limit).
+    """
+    match = matcher.match
+    block_search = matcher.block_search
+    eol = matcher.eol
+    ret = 0
+    for buff, end in __split_blocks(blocks, eol):
+        find = block_search(buff)
+        pos = 0
+        while pos < end:
+
+            # find next candidate
+            found = find(pos, end)
+            if found == -1 or found >= end:
+                break
+
+            # verify the line containing the candidate, and skip to next line
+            line_start = buff.rfind(eol, pos, found) + 1 or pos
+            line_end = buff.find(eol, found)
+            pos = line_end + 1
+            if match(buff[line_start:line_end])[0]:
+                ret += 1
+                if ret == limit:
+                    return ret
+    return ret
+
+
+def _grep_indices(items, matcher):
+    """
+    Grep an iterable of strings (every item is a single line) and return the indices of matching items.
+    When flags allow it, items are joined in chunks and searched like blocks (see block_size flag), so only candidate
+    items are checked one by one.
+    :param items: Iterable of strings.
+    :param matcher: Compiled matcher.
+    :return: Next matching item index.
+    """
+    match = matcher.match
+    block_search = matcher.block_search
+    eol = matcher.eol
+    f_trim = matcher.flags.get('trim')
+    items = iter(items) if matcher.flags.get('stats') is None else matcher.flags['stats']._wrap_lines(items)
+    start = 0
+    while True:
+
+        # get next chunk of items
+        chunk = list(islice(items, INDICES_CHUNK))
+        if not chunk:
+            break
+
+        # join chunk to a single block (unless items are not strings, or have end-of-line in them)
+        buff = None
+        if block_search and not f_trim:
+            buff = _join_lines(chunk, eol)
+
+        # search block and verify candidate items
+        if buff is not None:
+            for index in _candidate_indices(buff, block_search, eol):
+                if match(chunk[index])[0]:
+                    yield start + index
+
+        # check items one by one
+        else:
+            for index, item in enumerate(chunk, start):
+                if f_trim:
+                    item = item.strip()
+                if match(item)[0]:
+                    yield index
+
+        start += len(chunk)
+
+
+def _join_lines(lines, eol):
+    """
+    Join lines to a single block that can be searched with a block search function (see __build_block_search).
+    :param lines: List of lines, without end-of-line.
+    :param eol: End-of-line to join lines with (text or bytes, like the lines).
+    :return: Block of lines, each followed by end-of-line, or None if lines are not strings or have end-of-line in them.
+    """
+    try:
+        buff = eol.join(lines) + eol
+    except TypeError:
+        return None
+    if buff.count(eol) != len(lines):
+        return None
+    return buff
+
+
+def _candidate_indices(buff, block_search, eol):
+    """
+    Search a block of joined lines (see _join_lines()) and return the indices of candidate lines. Candidates still need
+    to be verified with the per-line match function.
+    :param buff: Block of lines, each followed by end-of-line.
+    :param block_search: Block search function of a compiled matcher.
+    :param eol: End-of-line the lines are joined with.
+    :return: Next candidate line index.
+    """
+    find = block_search(buff)
+    end = len(buff)
+    pos = counted_pos = index = 0
+    while pos < end:
+        found = find(pos, end)
+        if found == -1 or found >= end:
+            break
+        line_start = buff.rfind(eol, pos, found) + 1 or pos
+        index += buff.count(eol, counted_pos, line_start)
+        counted_pos = line_start
+        pos = buff.find(eol, found) + 1
+        yield index
+
+
 def grep_iter(target, pattern, **kwargs):
     """
     Main grep function, as a memory efficient iterator.
-    Note: this function does not support the 'quiet' or 'count' flags.
+    Note: this function does not support the 'quiet' or 'count' flags. If max_count is set, it stops reading target
+    right after the last match (and its trailing context).
     :param target: Target to apply grep on. Can be a single string, an iterable, a function, or an opened file handler.
-    :param pattern: Grep pattern to search.
+    :param pattern: Grep pattern to search, or a Matcher returned by compile().
     :param kwargs: See grep() help for more info.
     :return: Next match.
     """
-    # unify flags (convert shortcuts to full name)
-    __fix_args(kwargs)
-
-    # parse the params that are relevant to this function
-    f_offset = kwargs.get('byte_offset')
-    f_line_number = kwargs.get('line_number')
-    f_trim = kwargs.get('trim')
-    f_after_context = kwargs.get('after_context')
-    f_before_context = kwargs.get('before_context')
-    f_only_matching = kwargs.get('only_matching')
+    # compile pattern and flags once (if pattern is already compiled this just merges the flags)
+    matcher = compile(pattern, **kwargs)
+    kwargs = matcher.flags
 
     # if target is a callable function, call it first to get value
     if callable(target):
         target = target()
 
+    # check if target is binary, if requested (and skip it without reading any further)
+    is_binary = False
+    if _checks_binary(kwargs):
+        is_binary, target = _check_binary(target)
+        if is_binary and kwargs.get('binary_files') == 'without-match':
+            return
+
+    values = __grep_iter_values(target, matcher)
+
+    # binary target with a match returns a single message instead of lines
+    if is_binary:
+        for _ in values:
+            yield BINARY_FILE_MATCHES
+            break
+        return
+
+    # decode returned lines of bytes patterns, if requested
+    encoding = _decode_encoding(matcher)
+    if encoding:
+        values = _decode_values(values, encoding, kwargs.get('errors') or 'strict')
+
+    for value in values:
+        yield value
+
+
+def __grep_iter_values(target, matcher):
+    """
+    Implement grep_iter() for an already compiled matcher, after calling target (if callable).
+    :return: Next match.
+    """
+    kwargs = matcher.flags
+
+    # parse the params that are relevant to this function
+    f_trim = kwargs.get('trim')
+
+    # if block mode is set, treat strings as multiple lines and use blocks scan when possible
+    f_block_size = kwargs.get('block_size')
+    if f_block_size and (isinstance(target, _string_types) or hasattr(target, 'read')):
+        if matcher.block_search and not f_trim and not kwargs.get('keep_eol') and not _merge_context(kwargs):
+            if isinstance(target, _string_types):
+                blocks = [target]
+            else:
+                blocks = __read_blocks(target, f_block_size)
+            if kwargs.get('stats') is not None:
+                blocks = kwargs['stats']._wrap_blocks(blocks)
+            return __grep_blocks(blocks, matcher)
+        if isinstance(target, _string_types):
+            target = _lines_stream(target)
+
     # if we got a single string convert it to a list
-    if isinstance(target, _basestring):
+    if isinstance(target, _string_types):
         target = [target]
 
     # calculate if need to trim end of lines
     need_to_trim_eol = not kwargs.get('keep_eol') and hasattr(target, 'readline')
 
-    # list of previous lines, used only when f_before_context is set
-    prev_lines = []
+    # count lines read, if collecting stats
+    if kwargs.get('stats') is not None:
+        target = kwargs['stats']._wrap_lines(target)
 
-    # iterate target and grep
-    for line_index, line in enumerate(target):
+    # grep all lines as a single batch
+    state = _LinesState(kwargs)
+    return chain(_grep_lines(target, matcher, state, need_to_trim_eol), _grep_lines_end(matcher, state))
+
+
+def _checks_binary(flags):
+    """
+    Return if need to check if targets are binary, based on flags.
+    """
+    return flags.get('binary_files') in ('binary', 'without-match')
+
+
+def _check_binary(target):
+    """
+    Check if a target is binary data, eg has a NUL character in its first BINARY_CHECK_SIZE characters (or bytes).
+    Iterators are read as needed and returned chained back together, and seekable files are read and seeked back.
+    :param target: Target to check (after calling it, if callable).
+    :return: (is binary, target to grep instead of the original target).
+    """
+    # strings and lists are checked directly
+    if isinstance(target, _string_types):
+        return _has_nul(target, BINARY_CHECK_SIZE), target
+
+    # files are checked by reading their beginning (unless we can't seek back)
+    if hasattr(target, 'read'):
+        try:
+            if not target.seekable():
+                return False, target
+            position = target.tell()
+            head = target.read(BINARY_CHECK_SIZE)
+            target.seek(position)
+        except (AttributeError, IOError, OSError, ValueError):
+            return False, target
+        return _has_nul(head, BINARY_CHECK_SIZE), target
+
+    # other iterables - check first lines
+    is_list = isinstance(target, (list, tuple))
+    items = iter(target)
+    head = []
+    size = 0
+    is_binary = False
+    for item in items:
+        head.append(item)
+        if isinstance(item, _string_types):
+            if _has_nul(item, BINARY_CHECK_SIZE - size):
+                is_binary = True
+                break
+            size += len(item)
+        if size >= BINARY_CHECK_SIZE:
+            break
+    return is_binary, target if is_list else chain(head, items)
 
-        # fix current line
-        line = __process_line(line, need_to_trim_eol, f_trim)
 
-        # do grap
-        match, offset, endpos = __do_grep(line, pattern, **kwargs)
+def _has_nul(data, size):
+    """
+    Return if text (or bytes) have a NUL character in their first 'size' characters.
+    """
+    return data.find(b'\0' if isinstance(data, bytes) else u'\0', 0, size) != -1
 
-        # nullify return value
-        value = None
+
+def _decode_encoding(matcher):
+    """
+    Get the encoding to decode returned lines with, or None if they should be returned as is (see encoding flag).
+    """
+    return matcher.flags.get('encoding') if matcher.is_bytes else None
+
+
+def _decode_values(values, encoding, errors):
+    """
+    Decode the lines in returned values of bytes patterns.
+    :param values: Iterable of returned values (lines, lists of lines, or (index, lines) tuples).
+    :return: Next value.
+    """
+    for value in values:
+        yield _decode_value(value, encoding, errors)
+
+
+def _decode_value(value, encoding, errors):
+    """
+    Decode the lines in a single returned value.
+    """
+    if isinstance(value, bytes):
+        return value.decode(encoding, errors)
+    if isinstance(value, list):
+        return [_decode_value(v, encoding, errors) for v in value]
+    if isinstance(value, tuple):
+        return value[0], _decode_value(value[1], encoding, errors)
+    return value
+
+
+def __read_blocks(infile, block_size):
+    """
+    Read a file (text or binary) block by block.
+    :return: Iterator of blocks.
+    """
+    while True:
+        block = infile.read(block_size)
+        if not block:
+            return
+        yield block
+
+
+def _lines_stream(text):
+    """
+    Wrap a string (text or bytes) with a stream of its lines.
+    """
+    if isinstance(text, bytes):
+        return io.BytesIO(text)
+    return io.StringIO(text)
+
+
+def _merge_context(flags):
+    """
+    Return if need to merge overlapping contexts into groups, based on flags.
+    """
+    return flags.get('merge_context') and (flags.get('after_context') or flags.get('before_context')) and \
+        not flags.get('count') and not flags.get('quiet')
+
+
+class _LinesState(object):
+    """
+    State of grepping a stream of lines, kept between batches of lines (see _grep_lines()).
+    """
+
+    def __init__(self, flags):
+        """
+        Create initial state.
+        :param flags: Flags after converting shortcuts.
+        """
+        # index of the next line, and if reached max_count and don't need any more lines
+        self.line_index = 0
+        self.done = False
+
+        # previous lines, used only when before_context is set
+        self.prev_lines = deque(maxlen=flags.get('before_context') or 0)
+
+        # matches that still wait for lines of trailing context: [value, context list, missing lines count]
+        self.pending = deque()
+
+        # how many more matches to return (negative means no limit)
+        self.matches_left = flags.get('max_count') or -1
+
+        # when merging contexts: current group lines (or None), index of its first line, offset of its first match,
+        # index of its last line, how many trailing context lines it still needs, and if returned any group yet
+        self.group = None
+        self.group_index = self.group_offset = self.group_last = 0
+        self.missing = 0
+        self.returned = False
+
+
+def _grep_lines(lines, matcher, state, strip_eol=False):
+    """
+    Grep a batch of lines from a stream of lines. Can be called multiple times with the same state to grep a stream
+    batch by batch, and must be followed by _grep_lines_end() when the stream ends.
+    Stops in the middle of the batch if reached max_count (and state.done is set).
+    :param lines: Iterable of lines.
+    :param matcher: Compiled matcher.
+    :param state: Stream state (_LinesState).
+    :param strip_eol: If true, will remove end-of-line from the end of lines.
+    :return: Next match.
+    """
+    if state.done:
+        return
+
+    # end-of-line to remove (bytes lines end with bytes end-of-line)
+    strip_eol = matcher.eol if strip_eol else None
+
+    # if need to merge overlapping contexts into groups, use the groups iterator
+    if _merge_context(matcher.flags):
+        for value in __grep_groups(lines, matcher, state, strip_eol):
+            yield value
+        return
+
+    # parse the params that are relevant to this function
+    flags = matcher.flags
+    match = matcher.match
+    f_offset = flags.get('byte_offset')
+    f_line_number = flags.get('line_number')
+    f_trim = flags.get('trim')
+    f_after_context = flags.get('after_context')
+    f_before_context = flags.get('before_context')
+    f_only_matching = flags.get('only_matching')
+    spans = matcher.spans if f_only_matching else None
+
+    # get stream state
+    prev_lines = state.prev_lines
+    pending = state.pending
+    matches_left = state.matches_left
+    line_index = state.line_index - 1
+
+    # iterate lines and grep
+    for line_index, line in enumerate(lines, state.line_index):
+
+        # fix current line
+        line = __process_line(line, strip_eol, f_trim)
+
+        # add line to the trailing context of previous matches, and return the matches that got all their context
+        if pending:
+            for p in pending:
+                p[1].append(line)
+                p[2] -= 1
+            while pending and not pending[0][2]:
+                yield pending.popleft()[0]
+
+            # if reached max count, stop as soon as the last matches got their trailing context
+            if not matches_left:
+                if pending:
+                    continue
+                state.done = True
+                return
+
+        # do grep
+        matched, offset, endpos = match(line)
 
         # if matched
-        if match:
+        if matched:
+
+            # return every match in line as a separate value, if requested (see all_matches flag)
+            if spans is not None:
+                for offset, endpos in spans(line):
+                    ret_str = line[offset:endpos]
+                    yield (offset, ret_str) if f_offset else (line_index, ret_str) if f_line_number else ret_str
+                matches_left -= 1
+                state.matches_left = matches_left
+                if not matches_left:
+                    state.done = True
+                    return
+                continue
 
             # the textual part we return in response
             ret_str = line
@@ -178,36 +902,13 @@ def grep_iter(target, pattern, **kwargs):
             if f_before_context:
 
                 # make ret_str be a list with previous lines
-                ret_str = prev_lines + [ret_str]
-
-            # if need to return X lines after trailing context
-            if f_after_context:
-
-                # convert return string to list (unless f_before_context is set, in which case its already a list)
-                if not f_before_context:
-                    ret_str = [ret_str]
+                ret_str = list(prev_lines)
+                ret_str.append(line[offset:endpos] if f_only_matching else line)
 
-                # iterate X lines to read after
-                for i in range(f_after_context):
-
-                    # if target got next or readline, use next()
-                    # note: unfortunately due to python files next() implementation we can't use tell and seek to
-                    # restore position and not skip next matches.
-                    if hasattr(target, '__next__') or hasattr(target, 'readline'):
-                        try:
-                            val = next(target)
-                        except StopIteration:
-                            break
-
-                    # if not, try to access next item based on index (for lists)
-                    else:
-                        try:
-                            val = target[line_index+i+1]
-                        except IndexError:
-                            break
-
-                    # add value to return string
-                    ret_str.append(__process_line(val, need_to_trim_eol, f_trim))
+            # if need to return X lines after trailing context, convert return string to list (unless
+            # f_before_context is set, in which case its already a list)
+            elif f_after_context:
+                ret_str = [ret_str]
 
             # if requested offset, add offset + line to return list
             if f_offset:
@@ -221,107 +922,952 @@ def grep_iter(target, pattern, **kwargs):
             else:
                 value = ret_str
 
-        # maintain a list of previous lines, if the before-context option is provided
+            # if need trailing context, wait for the next lines before returning value (following lines are still
+            # checked for matches, so trailing context never skips matches)
+            matches_left -= 1
+            state.matches_left = matches_left
+            if f_after_context:
+                pending.append([value, ret_str, f_after_context])
+            else:
+                yield value
+
+                # if reached max count, stop reading lines
+                if not matches_left:
+                    state.done = True
+                    return
+
+        # maintain previous lines, if the before-context option is provided
         if f_before_context:
             prev_lines.append(line)
-            if len(prev_lines) > f_before_context:
-                prev_lines.pop(0)
 
-        # if we had a match return current value
-        if value is not None:
-            yield value
+    # update stream state
+    state.line_index = line_index + 1
+
+
+def _grep_lines_end(matcher, state):
+    """
+    Finish grepping a stream of lines, after the last call to _grep_lines().
+    :param matcher: Compiled matcher.
+    :param state: Stream state (_LinesState).
+    :return: Next match.
+    """
+    flags = matcher.flags
+
+    # return last group, if merging contexts
+    if state.group is not None:
+        if state.returned and flags.get('group_separator') is not None:
+            yield flags.get('group_separator')
+        yield __group_value(state, flags)
+        state.group = None
+
+    # return matches that didn't get all their trailing context because stream ended
+    while state.pending:
+        yield state.pending.popleft()[0]
+
+
+def __grep_groups(lines, matcher, state, strip_eol):
+    """
+    Grep a batch of lines and merge matches with overlapping (or adjacent) context into groups of lines, like unix grep
+    does. See 'merge_context' and 'group_separator' flags in grep() docs, and _grep_lines() for params.
+    :return: Next group or separator.
+    """
+    flags = matcher.flags
+    match = matcher.match
+    f_trim = flags.get('trim')
+    f_only_matching = flags.get('only_matching')
+    f_after_context = flags.get('after_context') or 0
+    f_before_context = flags.get('before_context') or 0
+    f_separator = flags.get('group_separator')
+
+    # previous lines that are not part of current group
+    prev_lines = state.prev_lines
+
+    line_index = state.line_index - 1
+    for line_index, line in enumerate(lines, state.line_index):
+        line = __process_line(line, strip_eol, f_trim)
+
+        # do grep (unless reached max count, in which case we only complete the trailing context)
+        if not state.matches_left:
+            if not state.missing:
+                state.done = True
+                return
+            matched = False
+        else:
+            matched, offset, endpos = match(line)
+
+        # if matched
+        if matched:
+            state.matches_left -= 1
+            ret_str = line[offset:endpos] if f_only_matching else line
+
+            # if current group is close enough, add leading context and line to it
+            if state.group is not None and line_index - state.group_last - 1 <= f_before_context:
+                state.group.extend(prev_lines)
+                state.group.append(ret_str)
+
+            # if not, start a new group (and return the previous one)
+            else:
+                if state.group is not None:
+                    if state.returned and f_separator is not None:
+                        yield f_separator
+                    state.returned = True
+                    yield __group_value(state, flags)
+                state.group = list(prev_lines)
+                state.group.append(ret_str)
+                state.group_index = line_index - len(prev_lines)
+                state.group_offset = offset
+
+            prev_lines.clear()
+            state.group_last = line_index
+            state.missing = f_after_context
+            continue
+
+        # add line to trailing context of current group
+        if state.missing:
+            state.group.append(line)
+            state.group_last = line_index
+            state.missing -= 1
+            continue
+
+        # keep line for leading context
+        if f_before_context:
+            prev_lines.append(line)
+
+        # if current group is too far to merge with next matches, return it
+        if state.group is not None and line_index - state.group_last > f_before_context:
+            if state.returned and f_separator is not None:
+                yield f_separator
+            state.returned = True
+            yield __group_value(state, flags)
+            state.group = None
+
+    # update stream state
+    state.line_index = line_index + 1
+
+
+def __group_value(state, flags):
+    """
+    Build return value for current group of lines.
+    """
+    if flags.get('byte_offset'):
+        return state.group_offset, state.group
+    if flags.get('line_number'):
+        return state.group_index, state.group
+    return state.group
 
 
 def __process_line(line, strip_eol, strip):
     """
     process a single line value.
+    :param strip_eol: End-of-line to remove from the end of line, or None.
     """
     if strip:
         line = line.strip()
-    elif strip_eol and line.endswith('\n'):
+    elif strip_eol and line.endswith(strip_eol):
         line = line[:-1]
     return line
 
 
-def __do_grep(curr_line, pattern, **kwargs):
+def __grep_blocks(blocks, matcher):
     """
-    Do grep on a single string.
-    See 'grep' docs for info about kwargs.
-    :param curr_line: a single line to test.
-    :param pattern: pattern to search.
-    :return: (matched, position, end_position).
+    Implement grep_iter() by searching large blocks of text at once, only breaking into lines the parts of the block
+    that contain a possible match (every candidate line is then verified with the regular per-line match function, so
+    results are the same as scanning line by line).
+    :param blocks: Iterable of text blocks. Lines may be split between blocks.
+    :param matcher: Compiled matcher (must support block search).
+    :return: Next match.
     """
-    # currently found position
-    position = -1
-    end_pos = -1
+    flags = matcher.flags
+    match = matcher.match
+    block_search = matcher.block_search
+    f_offset = flags.get('byte_offset')
+    f_line_number = flags.get('line_number')
+    f_only_matching = flags.get('only_matching')
+    f_after_context = flags.get('after_context') or 0
+    f_before_context = flags.get('before_context') or 0
+    eol = matcher.eol
+
+    # last lines of previous blocks, used only when f_before_context is set
+    prev_lines = deque(maxlen=f_before_context)
+
+    # matches that still wait for lines of trailing context: [value, context list, missing lines count]
+    pending = deque()
+
+    # index of the first line in current block
+    line_index = 0
+
+    # lines are only counted if we need to return line numbers
+    count_lines = f_line_number and not f_offset
+
+    # function to find all matches in line, if need to return all of them
+    spans = matcher.spans if f_only_matching else None
+
+    # how many more matches to return before we stop reading blocks (negative means no limit)
+    matches_left = flags.get('max_count') or -1
+
+    for buff, end in __split_blocks(blocks, eol):
+
+        # complete trailing context of previous matches from the first lines of this block
+        if pending:
+            lines = __lines_after(buff, 0, end, max(p[2] for p in pending), eol)
+            for p in pending:
+                p[1].extend(lines[:p[2]])
+                p[2] -= min(p[2], len(lines))
+            while pending and not pending[0][2]:
+                yield pending.popleft()[0]
+
+            # if reached max count, stop as soon as the last matches got their trailing context
+            if not matches_left:
+                if pending:
+                    continue
+                return
+
+        # get candidates finder for this block
+        find = block_search(buff)
+
+        # search and verify candidates
+        pos = 0
+        counted_pos = 0
+        counted_index = line_index
+        while pos < end:
+
+            # find next candidate
+            found = find(pos, end)
+            if found == -1 or found >= end:
+                break
+
+            # get the line containing the candidate
+            line_start = buff.rfind(eol, pos, found) + 1 or pos
+            line_end = buff.find(eol, found)
+            line = buff[line_start:line_end]
+            pos = line_end + 1
+
+            # verify match
+            matched, offset, endpos = match(line)
+            if not matched:
+                continue
+
+            # calc line index
+            if count_lines:
+                counted_index += buff.count(eol, counted_pos, line_start)
+                counted_pos = line_start
+
+            # return every match in line as a separate value, if requested (see all_matches flag)
+            if spans is not None:
+                for offset, endpos in spans(line):
+                    ret_str = line[offset:endpos]
+                    yield (offset, ret_str) if f_offset else (counted_index, ret_str) if f_line_number else ret_str
+                matches_left -= 1
+                if not matches_left:
+                    break
+                continue
 
-    # check if fixed strings mode
-    if kwargs.get('fixed_strings'):
+            # the textual part we return in response
+            ret_str = line[offset:endpos] if f_only_matching else line
 
-        # if case insensitive fix case
-        if kwargs.get('ignore_case'):
-            pattern = pattern.lower()
-            curr_line = curr_line.lower()
+            # add leading context
+            if f_before_context:
+                before = __lines_before(buff, line_start, f_before_context, eol)
+                missing = min(f_before_context - len(before), len(prev_lines))
+                if missing:
+                    before = list(prev_lines)[-missing:] + before
+                ret_str = before + [ret_str]
+
+            # add trailing context
+            missing = 0
+            if f_after_context:
+                if not f_before_context:
+                    ret_str = [ret_str]
+                after = __lines_after(buff, pos, end, f_after_context, eol)
+                ret_str.extend(after)
+                missing = f_after_context - len(after)
 
-        # if pattern is a single string, match it:
-        pattern_len = 0
-        if isinstance(pattern, _basestring):
-            position = curr_line.find(pattern)
-            pattern_len = len(pattern)
+            # build return value
+            if f_offset:
+                value = (offset, ret_str)
+            elif f_line_number:
+                value = (counted_index, ret_str)
+            else:
+                value = ret_str
 
-        # if not, treat it as a list of strings and match any
-        else:
-            for p in pattern:
-                position = curr_line.find(p)
-                pattern_len = len(p)
-                if position != -1:
-                    break
+            # return value, or wait for the rest of trailing context if needed
+            matches_left -= 1
+            if missing or pending:
+                pending.append([value, ret_str, missing])
+            else:
+                yield value
 
-        # calc end position
-        end_pos = position + pattern_len
+            # if reached max count, don't look for more matches
+            if not matches_left:
+                break
+
+        # release matches that got their trailing context completed
+        while pending and not pending[0][2]:
+            yield pending.popleft()[0]
+
+        # if reached max count and all matches got their trailing context, stop reading blocks
+        if not matches_left and not pending:
+            return
+
+        # keep last lines for leading context and advance line index
+        if f_before_context:
+            prev_lines.extend(__lines_before(buff, end, f_before_context, eol))
+        if count_lines:
+            line_index = counted_index + buff.count(eol, counted_pos, end)
+
+    # return matches that didn't get all their trailing context because target ended
+    for p in pending:
+        yield p[0]
+
+
+def __split_blocks(blocks, eol):
+    """
+    Join blocks of text so that every block ends at the end of a line.
+    :param blocks: Iterable of text blocks. Lines may be split between blocks.
+    :param eol: End-of-line ('\\n', or b'\\n' for bytes blocks).
+    :return: Next (buffer, end), where 'end' is the position right after the last end-of-line in buffer.
+    """
+    leftover = eol[:0]
+    for data in blocks:
+
+        # skip empty blocks
+        if not data:
+            continue
+
+        # keep incomplete last line for next block
+        buff = leftover + data
+        end = buff.rfind(eol) + 1
+        if end == 0:
+            leftover = buff
+            continue
+        leftover = buff[end:]
+        yield buff, end
+
+    # process last line (if have one)
+    if leftover:
+        yield leftover + eol, len(leftover) + 1
+
+
+def __lines_before(buff, start, count, eol):
+    """
+    Get up to 'count' lines that end right before a given position in buffer.
+    """
+    lines = []
+    end = start - 1
+    while count and end >= 0:
+        line_start = buff.rfind(eol, 0, end) + 1
+        lines.append(buff[line_start:end])
+        end = line_start - 1
+        count -= 1
+    lines.reverse()
+    return lines
+
+
+def __lines_after(buff, start, end, count, eol):
+    """
+    Get up to 'count' lines starting at a given position in buffer, without passing 'end'.
+    """
+    lines = []
+    while count and start < end:
+        line_end = buff.find(eol, start)
+        lines.append(buff[start:line_end])
+        start = line_end + 1
+        count -= 1
+    return lines
 
-        # check if need to match whole words
-        if kwargs.get('words') and position != -1:
 
-            foundpart = (' ' + curr_line + ' ')[position:position+len(pattern)+2]
-            if _is_part_of_word(foundpart[0]):
-                position = -1
-            elif _is_part_of_word(foundpart[-1]):
-                position = -1
+def compile(pattern, **kwargs):
+    """
+    Compile a pattern and a set of flags into a reusable Matcher object.
+    All flags shortcuts are resolved once and a per-line match function is picked for the given flags combination, so
+    grepping many lines (or many targets) with the same pattern won't re-parse the flags for every line.
+    :param pattern: Grep pattern to search (see grep() for info), or an existing Matcher to extend with new flags.
+    :param kwargs: Optional flags, see grep() help for more info.
+    :return: Matcher instance.
+    """
+    # if got an already compiled matcher, reuse it if no new flags were given (with a new time budget, if it has one),
+    # or merge flags and recompile
+    if isinstance(pattern, Matcher):
+        if not kwargs:
+            return pattern._per_call()
+        kwargs = dict(pattern.kwargs, **kwargs)
+        pattern = pattern.pattern
+
+    # unify flags (convert shortcuts to full name), without changing the caller's kwargs
+    flags = dict(kwargs)
+    __fix_args(flags)
+
+    # fixed strings list must be iterable more than once
+    if flags.get('fixed_strings') and not isinstance(pattern, _string_types):
+        pattern = tuple(pattern)
+
+    # returning every match in a line can't be combined with context
+    if flags.get('all_matches') and (flags.get('after_context') or flags.get('before_context')):
+        raise ValueError("The all_matches flag does not support context flags.")
+
+    # pick backend
+    backend, engine = _backends._resolve(pattern, flags, AHO_CORASICK_MIN_PATTERNS)
+
+    # build match functions (wrapped to collect statistics, if requested)
+    match = __build_match_func(pattern, flags, backend, engine)
+    block_search = __build_block_search(pattern, flags)
+    stats = flags.get('stats')
+    if stats is not None:
+        match = stats._wrap_match(match)
+        if block_search is not None:
+            block_search = stats._wrap_block_search(block_search)
+
+    # build matcher
+    return Matcher(pattern, kwargs, flags, match, block_search, __build_spans_func(pattern, flags, engine), backend,
+                   not _backends._is_linear(engine))
+
+
+class Matcher(object):
+    """
+    A compiled grep pattern with its flags, as returned by compile().
+    """
+
+    def __init__(self, pattern, kwargs, flags, match, block_search=None, spans=None, backend='re',
+                 interruptible=False):
+        """
+        Create the matcher. Don't call this directly, use compile() instead.
+        :param pattern: Original pattern.
+        :param kwargs: Original flags, as provided by user.
+        :param flags: Flags after converting shortcuts to full names.
+        :param match: Match function to test a single line. Returns (matched, position, end_position).
+        :param block_search: Optional function to search candidate lines in a block of multiple lines (see
+                            __build_block_search), or None if pattern and flags don't support block search.
+        :param spans: Optional function to find all the matches in a matching line, for the all_matches flag. Returns
+                      a list of (position, end_position).
+        :param backend: Name of the backend that matches lines (see backend flag).
+        :param interruptible: If true, matching a line may take very long (regex engines that backtrack), so the
+                              line_timeout flag interrupts it.
+        """
+        self.pattern = pattern
+        self.kwargs = kwargs
+        self.flags = flags
+        self.match = match
+        self.block_search = block_search
+        self.spans = spans
+        self.backend = backend
+        self._interruptible = interruptible
+
+        # apply safety limits (see max_line_length and timeout flags), keeping the functions without them for new calls
+        self._unlimited = None
+        if _limits._has_limits(flags):
+            self._unlimited = (match, spans)
+            self.match, self.spans = _limits._limit_funcs(match, spans, flags, interruptible)
+
+        # bytes patterns match bytes lines, which end with a bytes end-of-line
+        self.is_bytes = _is_bytes_pattern(pattern)
+        self.eol = b'\n' if self.is_bytes else '\n'
+
+    def _per_call(self):
+        """
+        Get the matcher to use for a new grep call: this matcher, or a copy with a new time budget if it has one.
+        """
+        if self._unlimited is None or not self.flags.get('timeout'):
+            return self
+        match, spans = self._unlimited
+        return Matcher(self.pattern, self.kwargs, self.flags, match, self.block_search, spans, self.backend,
+                       self._interruptible)
+
+    def grep(self, target):
+        """
+        Grep target with this pattern.
+        :param target: Target to apply grep on. See grep() for info.
+        :return: See grep().
+        """
+        return _grep_matcher(target, self._per_call())
+
+    def grep_iter(self, target):
+        """
+        Grep target with this pattern, as a memory efficient iterator.
+        :param target: Target to apply grep on. See grep() for info.
+        :return: Next match.
+        """
+        return grep_iter(target, self._per_call())
+
+    def count(self, target):
+        """
+        Count matching lines in target (respects the max_count flag).
+        :param target: Target to apply grep on. See grep() for info.
+        :return: Number of matching lines.
+        """
+        return _count_matches(target, self._per_call(), self.flags.get('max_count'))
+
+    def quiet(self, target):
+        """
+        Check if target got any matching line.
+        :param target: Target to apply grep on. See grep() for info.
+        :return: True if found a match, False otherwise.
+        """
+        return _count_matches(target, self._per_call(), 1) > 0
+
+
+# return value of a match function for a line that didn't match
+_NO_MATCH = (False, -1, -1)
+
+
+def _is_bytes_pattern(pattern):
+    """
+    Return if a pattern (or a list of fixed strings) is bytes, and should match bytes lines.
+    In Python 2.x bytes is str, so this is always false (and str lines work with str patterns anyway).
+    """
+    if not isinstance(pattern, _string_types):
+        pattern = next(iter(pattern), '')
+    return isinstance(pattern, bytes) and not isinstance(pattern, _basestring)
+
+
+def _words_pattern(pattern):
+    """
+    Wrap a regex pattern (text or bytes) to only match whole words.
+    """
+    if isinstance(pattern, _basestring):
+        return r'\b' + pattern + r'\b'
+    return br'\b' + pattern + br'\b'
+
+
+def _pattern_literals(pattern, re_flags):
+    """
+    Find the literals that every match of a regex requires (see required_literals()), as bytes for bytes patterns.
+    """
+    required = required_literals(pattern, re_flags)
+    if required is not None and not isinstance(pattern, _basestring):
+        literals, ignore_case = required
+        required = tuple(l.encode('latin-1') for l in literals), ignore_case
+    return required
+
+
+def __any_of_regex(strings):
+    """
+    Compile a regex to find any of the given strings (text or bytes).
+    """
+    separator = '|' if isinstance(strings[0], _basestring) else b'|'
+    return re.compile(separator.join(re.escape(s) for s in strings))
+
+
+def __build_match_func(pattern, flags, backend, engine):
+    """
+    Build the function to match a single line, specialized for the given flags.
+    See 'grep' docs for info about flags.
+    :param pattern: pattern to search.
+    :param flags: flags after converting shortcuts.
+    :param backend: name of the backend to match with (see backend flag).
+    :param engine: regex engine to compile regex patterns with.
+    :return: function that gets a single line and return (matched, position, end_position).
+    """
+    # build the search function, which returns (position, end_position) or (-1, -1)
+    if flags.get('fixed_strings'):
+
+        # simple and most common cases get a dedicated match function with no extra wrapping
+        if not flags.get('words') and not flags.get('line') and not flags.get('invert') and \
+                isinstance(pattern, _string_types):
+            return __literal_match_func(pattern, flags.get('ignore_case'))
+
+        search = __literal_search_func(pattern, flags.get('ignore_case'), backend == 'multi_literal')
+
+        # check if need to match whole words
+        if flags.get('words'):
+            search = __words_search_func(search)
 
     # if not fixed string, it means its a regex
     else:
 
         # set regex flags
-        flags = kwargs.get('regex_flags') or 0
-        flags |= re.IGNORECASE if kwargs.get('ignore_case') else 0
+        re_flags = flags.get('regex_flags') or 0
+        re_flags |= re.IGNORECASE if flags.get('ignore_case') else 0
 
         # add whole-words option
-        if kwargs.get('words'):
-            pattern = r'\b' + pattern + r'\b'
+        if flags.get('words'):
+            pattern = _words_pattern(pattern)
+
+        # compile regex
+        regex = engine.compile(pattern, re_flags)
+
+        # lines without the literals that every match requires are rejected before running the regex
+        contains = None
+        if isinstance(pattern, _string_types):
+            contains = __contains_func(_pattern_literals(pattern, re_flags))
+            if contains is not None and flags.get('stats') is not None:
+                contains = flags['stats']._wrap_prefilter(contains)
 
-        # do search
-        result = re.search(pattern, curr_line, flags)
+        # simple and most common case get a dedicated match function
+        if not flags.get('line') and not flags.get('invert'):
+            return __regex_match_func(regex, contains)
 
-        # if found, set position
-        if result:
-            position = result.start()
-            end_pos = result.end()
+        search = __regex_search_func(regex, contains)
 
     # check if need to match whole line
-    if kwargs.get('line') and (position != 0 or end_pos != len(curr_line)):
-        position = -1
+    if flags.get('line'):
+        search = __line_search_func(search)
+
+    # convert search function to match function, with optional invert
+    if flags.get('invert'):
+        def match(line):
+            position, end_pos = search(line)
+            if position == -1:
+                return True, -1, -1
+            return False, position, -1
+    else:
+        def match(line):
+            position, end_pos = search(line)
+            if position == -1:
+                return _NO_MATCH
+            return True, position, end_pos
+    return match
 
-    # parse return value
-    matched = position != -1
 
-    # if invert flag is on, invert value
-    if kwargs.get('invert'):
-        matched = not matched
+def __build_spans_func(pattern, flags, engine):
+    """
+    Build the function to find all the non-overlapping matches in a matching line, used by the all_matches flag.
+    Empty matches are skipped (like unix grep -o does).
+    :param pattern: pattern to search.
+    :param flags: flags after converting shortcuts.
+    :param engine: regex engine to compile regex patterns with.
+    :return: function that gets a line and returns a list of (position, end_position), or None if all_matches flag is
+             not set (or if invert is set, in which case lines have no matches to return).
+    """
+    if not flags.get('all_matches') or flags.get('invert'):
+        return None
+
+    # whole line is the only possible match
+    if flags.get('line'):
+        return lambda line: [(0, len(line))]
+
+    # fixed strings: find the next match of any string (the leftmost, and the longest of the strings at the same
+    # position), and continue after it
+    if flags.get('fixed_strings'):
+        ignore_case = flags.get('ignore_case')
+        words = flags.get('words')
+        strings = (pattern,) if isinstance(pattern, _string_types) else pattern
+        strings = tuple(s.lower() if ignore_case else s for s in strings if s)
+
+        def spans(line):
+            if ignore_case:
+                line = line.lower()
+            ret = []
+            pos = 0
+            while True:
+                position = end_pos = -1
+                for string in strings:
+                    found = line.find(string, pos)
+                    if found != -1 and (position == -1 or found < position or
+                                        (found == position and found + len(string) > end_pos)):
+                        position, end_pos = found, found + len(string)
+                if position == -1:
+                    return ret
+                if words and ((position > 0 and _is_part_of_word(line[position - 1:position])) or
+                              (end_pos < len(line) and _is_part_of_word(line[end_pos:end_pos + 1]))):
+                    pos = position + 1
+                    continue
+                ret.append((position, end_pos))
+                pos = end_pos
+
+        return spans
+
+    # regex: all non-empty matches
+    re_flags = flags.get('regex_flags') or 0
+    re_flags |= re.IGNORECASE if flags.get('ignore_case') else 0
+    if flags.get('words'):
+        pattern = _words_pattern(pattern)
+    finditer = engine.compile(pattern, re_flags).finditer
+    return lambda line: [found.span() for found in finditer(line) if found.end() > found.start()]
+
+
+# regex tokens that may behave differently when the regex runs on a block of lines instead of a single line
+_BLOCK_UNSAFE_REGEX = re.compile(r'\\[AZz]|\(\?[=!<>]|[*+?}]\+')
+
+
+def __build_block_search(pattern, flags):
+    """
+    Build the function to find candidate lines in a block of multiple lines, used by the block_size mode.
+    The returned function gets a block and returns a find function for it; find(start, end) returns the position of
+    the next possible match in block, or -1. A candidate is not necessarily a match, but every matching line must
+    contain a candidate (so candidate lines are later verified with the per-line match function).
+    :param pattern: pattern to search.
+    :param flags: flags after converting shortcuts.
+    :return: block search function, or None if block search is not possible with the given pattern and flags.
+    """
+    # invert returns (almost) every line, no point in block search
+    if flags.get('invert'):
+        return None
+
+    # fixed strings
+    if flags.get('fixed_strings'):
+        ignore_case = flags.get('ignore_case')
+
+        # single string
+        if isinstance(pattern, _string_types):
+            if ignore_case:
+                pattern = pattern.lower()
+
+            def block_search(buff):
+                if ignore_case:
+                    buff = __lower_block(buff)
+                    if buff is None:
+                        return __every_line_finder
+                return lambda start, end: buff.find(pattern, start, end)
+            return block_search
+
+        # empty lists never match, and large lists are matched with the automaton line by line anyway
+        if not pattern or len(pattern) >= AHO_CORASICK_MIN_PATTERNS:
+            return None
+
+        # small list of strings - search any of them with a regex
+        if ignore_case:
+            pattern = [p.lower() for p in pattern]
+        regex = __any_of_regex(pattern)
+
+        def block_search(buff):
+            if ignore_case:
+                buff = __lower_block(buff)
+                if buff is None:
+                    return __every_line_finder
+            return __regex_finder(regex, buff)
+        return block_search
+
+    # regex - only string patterns
+    if not isinstance(pattern, _string_types):
+        return None
+    re_flags = flags.get('regex_flags') or 0
+    re_flags |= re.IGNORECASE if flags.get('ignore_case') else 0
+    if flags.get('words'):
+        pattern = _words_pattern(pattern)
+
+    # if regex requires literals, candidates are the places where the literals appear (this works for any regex)
+    required = _pattern_literals(pattern, re_flags)
+    if required is not None:
+        literals, ignore_case = required
+        if len(literals) == 1:
+            literal = literals[0]
+            finder = lambda buff: lambda start, end: buff.find(literal, start, end)
+        else:
+            literals_regex = __any_of_regex(literals)
+            finder = lambda buff: __regex_finder(literals_regex, buff)
+
+        def block_search(buff):
+            if ignore_case:
+                buff = __lower_block(buff)
+                if buff is None:
+                    return __every_line_finder
+            return finder(buff)
+        return block_search
+
+    # if not, only patterns that don't depend on where the searched string begins and ends can run on multiple lines
+    if not _can_search_regex_blocks(flags) or \
+            _BLOCK_UNSAFE_REGEX.search(pattern if isinstance(pattern, _basestring) else pattern.decode('latin-1')):
+        return None
+    regex = re.compile(pattern, re_flags | re.MULTILINE)
+    return lambda buff: __regex_finder(regex, buff)
+
+
+def _can_search_regex_blocks(flags):
+    """
+    Return if a regex can run on blocks of multiple lines to find candidates: only the python regex backend matches
+    exactly like the regex that finds candidates, and safety limits only apply to single lines.
+    """
+    return flags.get('backend') in (None, 're') and not _limits._has_limits(flags)
 
-    # if position is -1 reset end pos as well
-    if not matched:
-        end_pos = -1
 
-    # return result
-    return matched, position, end_pos
+def __lower_block(buff):
+    """
+    Lower case a block for case insensitive fixed strings search, or return None if lower case changed its length
+    (which happens with some unicode characters), in which case positions in lowered block are useless.
+    """
+    lowered = buff.lower()
+    return lowered if len(lowered) == len(buff) else None
+
+
+def __every_line_finder(start, end):
+    """
+    Block finder that returns every line as a candidate.
+    """
+    return start if start < end else -1
+
+
+def __regex_finder(regex, buff):
+    """
+    Create a block finder from a compiled regex.
+    """
+    regex_search = regex.search
+
+    def find(start, end):
+        result = regex_search(buff, start, end)
+        return -1 if result is None else result.start()
+    return find
+
+
+def __literal_match_func(pattern, ignore_case):
+    """
+    Build a match function for a single fixed string, with no additional flags.
+    """
+    pattern_len = len(pattern)
+    if ignore_case:
+        pattern = pattern.lower()
+
+        def match(line):
+            position = line.lower().find(pattern)
+            if position == -1:
+                return _NO_MATCH
+            return True, position, position + pattern_len
+    else:
+        def match(line):
+            position = line.find(pattern)
+            if position == -1:
+                return _NO_MATCH
+            return True, position, position + pattern_len
+    return match
+
+
+def __literal_search_func(pattern, ignore_case, automaton=False):
+    """
+    Build a search function for a fixed string or a list of fixed strings.
+    When pattern is a list, the first string in list order that appears in line is used. Large lists (or any list, if
+    'automaton' is set) are matched with an Aho-Corasick automaton, which scans every line only once.
+    """
+    # single string
+    if isinstance(pattern, _string_types):
+        pattern_len = len(pattern)
+        if ignore_case:
+            pattern = pattern.lower()
+
+        def search(line):
+            if ignore_case:
+                line = line.lower()
+            position = line.find(pattern)
+            if position == -1:
+                return -1, -1
+            return position, position + pattern_len
+        return search
+
+    # list of strings
+    if ignore_case:
+        pattern = tuple(p.lower() for p in pattern)
+
+    # large list of strings - use a single automaton instead of searching every string
+    if automaton or len(pattern) >= AHO_CORASICK_MIN_PATTERNS:
+        automaton_search = AhoCorasick(pattern).search
+        lengths = tuple(len(p) for p in pattern)
+
+        def search(line):
+            if ignore_case:
+                line = line.lower()
+            index, position = automaton_search(line)
+            if index == -1:
+                return -1, -1
+            return position, position + lengths[index]
+        return search
+
+    def search(line):
+        if ignore_case:
+            line = line.lower()
+        for p in pattern:
+            position = line.find(p)
+            if position != -1:
+                return position, position + len(p)
+        return -1, -1
+    return search
+
+
+def __words_search_func(search):
+    """
+    Wrap a fixed strings search function to only accept matches that form a whole word.
+    """
+    def words_search(line):
+        position, end_pos = search(line)
+        if position == -1:
+            return -1, -1
+        if position > 0 and _is_part_of_word(line[position - 1:position]):
+            return -1, -1
+        if end_pos < len(line) and _is_part_of_word(line[end_pos:end_pos + 1]):
+            return -1, -1
+        return position, end_pos
+    return words_search
+
+
+def __regex_match_func(regex, contains=None):
+    """
+    Build a match function for a compiled regex, with no additional flags.
+    If 'contains' is provided, lines it rejects are not searched (see __contains_func()).
+    """
+    regex_search = regex.search
+
+    if contains is None:
+        def match(line):
+            result = regex_search(line)
+            if result is None:
+                return _NO_MATCH
+            position, end_pos = result.span()
+            return True, position, end_pos
+    else:
+        def match(line):
+            if not contains(line):
+                return _NO_MATCH
+            result = regex_search(line)
+            if result is None:
+                return _NO_MATCH
+            position, end_pos = result.span()
+            return True, position, end_pos
+    return match
+
+
+def __regex_search_func(regex, contains=None):
+    """
+    Build a search function for a compiled regex.
+    If 'contains' is provided, lines it rejects are not searched (see __contains_func()).
+    """
+    regex_search = regex.search
+
+    def search(line):
+        if contains is not None and not contains(line):
+            return -1, -1
+        result = regex_search(line)
+        if result is None:
+            return -1, -1
+        return result.span()
+    return search
+
+
+def __contains_func(required):
+    """
+    Build a function to check if a line contains any of the literals a regex requires.
+    :param required: Required literals, as returned by required_literals().
+    :return: Function that gets a line and returns False if regex can't match it, or None if there are no literals.
+    """
+    if required is None:
+        return None
+    literals, ignore_case = required
+
+    # single literal (the 'in' operator is slow for bytes, since it goes through the buffer protocol, so use find())
+    if len(literals) == 1:
+        literal = literals[0]
+        if not isinstance(literal, _basestring):
+            if ignore_case:
+                return lambda line: line.lower().find(literal) != -1
+            return lambda line: line.find(literal) != -1
+        if ignore_case:
+            return lambda line: literal in line.lower()
+        return lambda line: literal in line
+
+    # set of literals
+    def contains(line):
+        if ignore_case:
+            line = line.lower()
+        for literal in literals:
+            if literal in line:
+                return True
+        return False
+    return contains
+
+
+def __line_search_func(search):
+    """
+    Wrap a search function to only accept matches of the whole line.
+    """
+    def line_search(line):
+        position, end_pos = search(line)
+        if position != 0 or end_pos != len(line):
+            return -1, -1
+        return position, end_pos
+    return line_search
@@ -0,0 +1,522 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Persistent trigram index, to grep a stable set of files many times without scanning every byte of them.
+
+The index splits every file to blocks (at lines boundaries) and keeps, for every 3 bytes sequence (trigram), the list
+of blocks that contain it. When grepping with an index, the literals that every match must contain are turned into
+trigrams, and only the blocks that contain all trigrams of a literal are grepped (files that changed since indexing
+are grepped entirely, so results are always the same as without the index).
+
+Index file format (all numbers are big-endian):
+
+    - Header: magic (8 bytes), then meta offset, meta length, table offset and trigrams count (4 unsigned 64 bit).
+    - Postings: for every trigram, the sorted block ids that contain it, delta encoded as varints.
+    - Table: sorted trigrams, every entry is the trigram (3 bytes), postings offset (64 bit) and length (32 bit).
+    - Meta: json with the indexed paths, index options, and the files with their blocks.
+
+Author: Ronen Ness.
+Since: 2017.
+"""
+import hashlib
+import json
+import mmap
+import multiprocessing
+import os
+import re
+import struct
+from . import compressed as _compressed
+from . import files as _files
+from . import grepfunc as _grepfunc
+
+# get python base string for either Python 2.x or 3.x
+try:
+    _basestring = basestring
+except NameError:
+    _basestring = str
+
+# index file header
+_MAGIC = b'GFTRIDX1'
+_HEADER = struct.Struct('>8sQQQQ')
+
+# trigrams table entry: trigram, postings offset, postings length
+_TABLE_ENTRY = struct.Struct('>3sQI')
+
+# default size of indexed blocks
+BLOCK_SIZE = 64 * 1024
+
+# characters that str.lower() turns into ascii characters from other characters, so they can't be used to search
+# lower cased bytes when ignoring case
+_IGNORE_CASE_UNSAFE = re.compile(u'[^\\x00-\\x7f]|[iIkK]')
+
+
+def build_index(index_path, paths, **kwargs):
+    """
+    Build a trigram index for files, and save it to disk.
+    :param index_path: Path of index file to create.
+    :param paths: A path, a glob pattern, or a list of paths / glob patterns to index. Directories are searched for
+                  files.
+    :param kwargs: Optional flags:
+
+        - recursive:             If true (default) will search directories recursively.
+        - include:               Optional list of glob patterns. If set, will only index files matching any of them.
+        - exclude:               Optional list of glob patterns. Will skip files matching any of them.
+        - block_size:            Size, in bytes, of indexed blocks (default to 64KB). Smaller blocks mean fewer bytes
+                                 to grep for every match, but a bigger index.
+        - workers:               Number of worker processes to index files with (default to number of CPUs).
+
+    :return: TrigramIndex instance.
+    """
+    index = TrigramIndex(index_path)
+    index.build(paths, **kwargs)
+    return index
+
+
+class TrigramIndex(object):
+    """
+    A persistent trigram index of files.
+    Pass it as the 'index' flag of grep_file() or grep_paths() (or use its grep() method) to only grep the parts of
+    the files that may contain matches.
+    """
+
+    def __init__(self, path):
+        """
+        Open an index file (if index file doesn't exist yet, the index is empty until build() is called).
+        :param path: Index file path.
+        """
+        self.path = path
+        self.options = {}
+        self.files = {}
+        self._buff = None
+        self._table_offset = 0
+        self._trigrams_count = 0
+        self._last_query = (None, None)
+        if os.path.exists(path):
+            self._load()
+
+    def __getstate__(self):
+        """
+        Only pickle the index path (the index is reopened in worker processes).
+        """
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        """
+        Reopen index after unpickling.
+        """
+        self.__init__(state['path'])
+
+    def build(self, paths, recursive=True, include=None, exclude=None, block_size=None, workers=None):
+        """
+        Set the paths to index, and index them (files that didn't change since last time are not indexed again).
+        See build_index() for params.
+        """
+        self.options = {
+            'paths': [paths] if isinstance(paths, _basestring) else list(paths),
+            'recursive': recursive,
+            'include': include,
+            'exclude': exclude,
+            'block_size': block_size or BLOCK_SIZE,
+        }
+        self.refresh(workers)
+
+    def refresh(self, workers=None):
+        """
+        Update index: index new files and files that changed (by size and modification time, and then by content
+        hash), and remove files that no longer exist.
+        :param workers: Number of worker processes to index files with (default to number of CPUs).
+        """
+        options = self.options
+        if not options:
+            raise ValueError("Index '%s' was not built yet, call build() first." % self.path)
+        block_size = options['block_size']
+        paths = _files._iter_files(options['paths'], options['recursive'], options['include'], options['exclude'])
+
+        # check which files need to be indexed
+        kept = {}
+        to_index = []
+        for path in paths:
+            path = os.path.abspath(path)
+            if path in kept:
+                continue
+            entry = self.files.get(path)
+            stat = os.stat(path)
+            if entry is not None and entry['size'] == stat.st_size:
+                if entry['mtime'] == stat.st_mtime or entry['hash'] == _file_hash(path):
+                    entry['mtime'] = stat.st_mtime
+                    kept[path] = entry
+                    continue
+            kept[path] = None
+            to_index.append(path)
+
+        # give new block ids to the files we keep, and copy their postings from current index
+        files = {}
+        new_ids = {}
+        next_block = 0
+        for path, entry in sorted(kept.items()):
+            if entry is None:
+                continue
+            for offset in range(len(entry['blocks'])):
+                new_ids[entry['first_block'] + offset] = next_block + offset
+            entry['first_block'] = next_block
+            next_block += len(entry['blocks'])
+            files[path] = entry
+        postings = self._remapped_postings(new_ids) if new_ids else {}
+
+        # index new and changed files
+        workers = workers or multiprocessing.cpu_count()
+        if workers > 1 and len(to_index) > 1:
+            pool = multiprocessing.Pool(workers)
+            results = pool.imap(_index_file_worker, [(path, block_size) for path in to_index])
+        else:
+            pool = None
+            results = (_index_file(path, block_size) for path in to_index)
+        try:
+            for path, entry, blocks_trigrams in results:
+                entry['first_block'] = next_block
+                for block_id, trigrams in enumerate(blocks_trigrams, next_block):
+                    for trigram in trigrams:
+                        postings.setdefault(trigram, []).append(block_id)
+                next_block += len(entry['blocks'])
+                files[path] = entry
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+        # write new index and reopen it
+        for block_ids in postings.values():
+            block_ids.sort()
+        self.close()
+        _write_index(self.path, self.options, files, postings)
+        self._load()
+
+    def close(self):
+        """
+        Close index file.
+        """
+        if self._buff is not None:
+            self._buff.close()
+            self._buff = None
+        self._last_query = (None, None)
+
+    def candidate_blocks(self, path, matcher, stat=None):
+        """
+        Get the parts of an indexed file that may contain matches.
+        :param path: File path.
+        :param matcher: Compiled matcher.
+        :param stat: Optional file stat result (if not provided, will stat the file).
+        :return: List of (start, end, index of first line) ranges in file, or None if file is not in index, changed
+                 since indexing, is compressed, or pattern can't be searched by trigrams (in which case the whole file
+                 should be grepped).
+        """
+        entry = self.files.get(os.path.abspath(path))
+        if entry is None or entry.get('compressed'):
+            return None
+        stat = stat or os.stat(path)
+        if entry['size'] != stat.st_size or entry['mtime'] != stat.st_mtime:
+            return None
+
+        # get candidate blocks of this file
+        block_ids = self._query(matcher)
+        if block_ids is None:
+            return None
+        first_block = entry['first_block']
+        ranges = []
+        for offset, (start, end, first_line) in enumerate(entry['blocks']):
+            if first_block + offset in block_ids:
+
+                # merge adjacent blocks
+                if ranges and ranges[-1][1] == start:
+                    ranges[-1] = (ranges[-1][0], end, ranges[-1][2])
+                else:
+                    ranges.append((start, end, first_line))
+        return ranges
+
+    def candidate_files(self, pattern, **kwargs):
+        """
+        Get the indexed files that may contain matches.
+        :param pattern: Grep pattern to search, or a Matcher returned by compile().
+        :param kwargs: See grep() help for info about flags.
+        :return: List of file paths.
+        """
+        matcher = _grepfunc.compile(pattern, **kwargs)
+        block_ids = self._query(matcher)
+        ret = []
+        for path, entry in sorted(self.files.items()):
+            first_block = entry['first_block']
+            if block_ids is None or entry.get('compressed') or \
+                    any(first_block + i in block_ids for i in range(len(entry['blocks']))):
+                ret.append(path)
+        return ret
+
+    def grep(self, pattern, **kwargs):
+        """
+        Grep all indexed files with this index. Index is not refreshed, but files that changed since indexing are
+        still grepped correctly (only slower).
+        :param pattern: Grep pattern to search, or a Matcher returned by compile().
+        :param kwargs: See grep_paths() help for info about flags.
+        :return: See grep_paths().
+        """
+        kwargs['index'] = self
+        matcher = _grepfunc.compile(pattern, **kwargs)
+        return _files.grep_paths(self.candidate_files(matcher), matcher)
+
+    def _load(self):
+        """
+        Load index file.
+        """
+        with open(self.path, 'rb') as infile:
+            buff = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, meta_offset, meta_length, table_offset, trigrams_count = _HEADER.unpack(buff[:_HEADER.size])
+        if magic != _MAGIC:
+            buff.close()
+            raise ValueError("'%s' is not a grepfunc index file." % self.path)
+        meta = json.loads(buff[meta_offset:meta_offset + meta_length].decode('utf-8'))
+        self.options = meta['options']
+        self.files = meta['files']
+        self._buff = buff
+        self._table_offset = table_offset
+        self._trigrams_count = trigrams_count
+        self._last_query = (None, None)
+
+    def _postings(self, trigram):
+        """
+        Get the sorted block ids that contain a trigram.
+        """
+        # binary search trigram in table
+        buff = self._buff
+        low, high = 0, self._trigrams_count
+        while low < high:
+            middle = (low + high) // 2
+            position = self._table_offset + middle * _TABLE_ENTRY.size
+            current = buff[position:position + 3]
+            if current < trigram:
+                low = middle + 1
+            elif current > trigram:
+                high = middle
+            else:
+                _, offset, length = _TABLE_ENTRY.unpack(buff[position:position + _TABLE_ENTRY.size])
+                return _decode_postings(buff[offset:offset + length])
+        return []
+
+    def _remapped_postings(self, new_ids):
+        """
+        Get all postings of current index, with new block ids.
+        :param new_ids: Dictionary of old block id to new block id. Blocks that are not in it are dropped.
+        :return: Dictionary of trigram to list of new block ids.
+        """
+        ret = {}
+        buff = self._buff
+        for index in range(self._trigrams_count):
+            position = self._table_offset + index * _TABLE_ENTRY.size
+            trigram, offset, length = _TABLE_ENTRY.unpack(buff[position:position + _TABLE_ENTRY.size])
+            block_ids = [new_ids[b] for b in _decode_postings(buff[offset:offset + length]) if b in new_ids]
+            if block_ids:
+                ret[trigram] = block_ids
+        return ret
+
+    def _query(self, matcher):
+        """
+        Get the ids of blocks that may contain matches.
+        :return: Set of block ids, or None if pattern can't be searched by trigrams.
+        """
+        # same matcher as last query?
+        if self._last_query[0] is matcher:
+            return self._last_query[1]
+
+        literals = _query_literals(matcher)
+        block_ids = None
+        if literals is not None and self._buff is not None:
+            block_ids = set()
+            for literal in literals:
+
+                # every trigram of literal must appear in block (start from the rarest trigrams)
+                postings = sorted((self._postings(t) for t in set(literal[i:i + 3] for i in range(len(literal) - 2))),
+                                  key=len)
+                literal_ids = set(postings[0])
+                for block_list in postings[1:]:
+                    if not literal_ids:
+                        break
+                    literal_ids.intersection_update(block_list)
+                block_ids.update(literal_ids)
+
+        self._last_query = (matcher, block_ids)
+        return block_ids
+
+
+def _query_literals(matcher):
+    """
+    Get the lower cased encoded literals that every match must contain one of.
+    :return: List of bytes, or None if pattern can't be searched by trigrams.
+    """
+    flags = matcher.flags
+    pattern = matcher.pattern
+
+    # invert returns lines that don't match
+    if flags.get('invert'):
+        return None
+
+    # fixed strings (when ignoring case, use the longest part of every string that lowers the same in bytes)
+    if flags.get('fixed_strings'):
+        literals = [pattern] if isinstance(pattern, _grepfunc._string_types) else list(pattern)
+        if flags.get('ignore_case') and not matcher.is_bytes:
+            literals = [max(_IGNORE_CASE_UNSAFE.split(l), key=len) for l in literals]
+
+    # regex
+    elif isinstance(pattern, _grepfunc._string_types):
+        re_flags = flags.get('regex_flags') or 0
+        re_flags |= re.IGNORECASE if flags.get('ignore_case') else 0
+        if flags.get('words'):
+            pattern = _grepfunc._words_pattern(pattern)
+        required = _grepfunc._pattern_literals(pattern, re_flags)
+        if required is None:
+            return None
+        literals = required[0]
+
+    else:
+        return None
+
+    # encode literals (end-of-line characters may differ between lines and file, so only use the part before them)
+    try:
+        if not matcher.is_bytes:
+            literals = [l.encode(flags.get('encoding') or 'utf-8') for l in literals]
+        literals = [l.lower() for l in literals]
+    except UnicodeEncodeError:
+        return None
+    literals = [re.split(b'[\r\n]', l)[0] for l in literals]
+    if not literals or min(len(l) for l in literals) < 3:
+        return None
+    return literals
+
+
+def _index_file(path, block_size):
+    """
+    Index a single file.
+    :return: (path, file entry, list of trigrams set for every block).
+    """
+    stat = os.stat(path)
+    blocks = []
+    blocks_trigrams = []
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as infile:
+
+        # compressed files are only hashed, without blocks (they are always grepped whole)
+        if _compressed._detect(infile) is not None:
+            return path, {'size': stat.st_size, 'mtime': stat.st_mtime, 'hash': _file_hash(path), 'blocks': [],
+                          'compressed': True}, []
+
+        if stat.st_size:
+            buff = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                first_line = 0
+                for start, end in _files._split_lines(buff, block_size):
+                    block = buff[start:end]
+                    sha1.update(block)
+                    blocks.append((start, end, first_line))
+                    blocks_trigrams.append(_block_trigrams(block.lower()))
+                    first_line += block.count(b'\n')
+            finally:
+                buff.close()
+    entry = {'size': stat.st_size, 'mtime': stat.st_mtime, 'hash': sha1.hexdigest(), 'blocks': blocks}
+    return path, entry, blocks_trigrams
+
+
+def _index_file_worker(args):
+    """
+    Index a single file in a worker process.
+    """
+    return _index_file(*args)
+
+
+def _block_trigrams(block):
+    """
+    Get all the trigrams in a block of bytes.
+    :return: Set of 3 bytes strings.
+    """
+    return set(bytes(bytearray(t)) for t in set(zip(bytearray(block), bytearray(block[1:]), bytearray(block[2:]))))
+
+
+def _file_hash(path):
+    """
+    Calculate file content hash.
+    """
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as infile:
+        for data in iter(lambda: infile.read(1024 * 1024), b''):
+            sha1.update(data)
+    return sha1.hexdigest()
+
+
+def _encode_postings(block_ids):
+    """
+    Encode sorted block ids as deltas, in varint format.
+    """
+    ret = bytearray()
+    last = 0
+    for block_id in block_ids:
+        value = block_id - last
+        last = block_id
+        while value >= 0x80:
+            ret.append((value & 0x7f) | 0x80)
+            value >>= 7
+        ret.append(value)
+    return bytes(ret)
+
+
+def _decode_postings(data):
+    """
+    Decode postings encoded by _encode_postings().
+    :return: List of block ids.
+    """
+    ret = []
+    last = 0
+    value = 0
+    shift = 0
+    for byte in bytearray(data):
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        last += value
+        ret.append(last)
+        value = 0
+        shift = 0
+    return ret
+
+
+def _write_index(path, options, files, postings):
+    """
+    Write index file (to a temporary file first, then replace the old index).
+    """
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as outfile:
+        outfile.write(b'\0' * _HEADER.size)
+
+        # write postings
+        table = []
+        offset = _HEADER.size
+        for trigram in sorted(postings):
+            data = _encode_postings(postings[trigram])
+            outfile.write(data)
+            table.append(_TABLE_ENTRY.pack(trigram, offset, len(data)))
+            offset += len(data)
+
+        # write table and meta
+        table_offset = offset
+        outfile.write(b''.join(table))
+        meta_offset = table_offset + len(table) * _TABLE_ENTRY.size
+        meta = json.dumps({'options': options, 'files': files}).encode('utf-8')
+        outfile.write(meta)
+
+        # write header
+        outfile.seek(0)
+        outfile.write(_HEADER.pack(_MAGIC, meta_offset, len(meta), table_offset, len(table)))
+
+    # replace old index (python 2 doesn't have os.replace)
+    if hasattr(os, 'replace'):
+        os.replace(temp_path, path)
+    else:
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(temp_path, path)
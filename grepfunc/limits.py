@@ -0,0 +1,203 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Safety limits for grepping with untrusted patterns or input: a maximum line length to scan, a time budget for every
+line, and a time budget for the whole call (see the max_line_length, line_timeout and timeout flags).
+
+Matching a line with a regex engine that backtracks (like python 're') can't be stopped from the outside, except by a
+signal. So on the main thread of platforms that support it, a timer (SIGALRM) is set before matching every line, and
+its handler interrupts the regex once the line runs out of time. The timer and SIGALRM handler of the application are
+restored after every line (and if the application's timer would fire before the line runs out of time, no timer is
+set). Elsewhere, lines that took too long are only detected after they are matched.
+
+Author: Ronen Ness.
+Since: 2017.
+"""
+import os
+import signal
+import threading
+import time
+
+# best timer available (python 2 doesn't have perf_counter)
+_timer = getattr(time, 'perf_counter', time.time)
+
+# return values of match and spans functions for lines that were skipped
+_SKIPPED_MATCH = (False, -1, -1)
+_SKIPPED_SPANS = ()
+
+# can we interrupt matching with a timer signal
+_CAN_INTERRUPT = hasattr(signal, 'setitimer') and hasattr(signal, 'SIGALRM')
+
+
+class GrepTimeout(Exception):
+    """
+    Raised when a grep call runs out of its time budget (see timeout flag).
+    """
+
+    def __init__(self, message, line=None):
+        """
+        Create the exception.
+        :param message: Error message.
+        :param line: The line that was matched when time ran out.
+        """
+        Exception.__init__(self, message)
+        self.line = line
+
+
+class _Interrupted(Exception):
+    """
+    Raised by the timer signal handler to interrupt matching a line.
+    """
+    pass
+
+
+def _has_limits(flags):
+    """
+    Return if any safety limit flag is set.
+    """
+    return bool(flags.get('max_line_length') or flags.get('line_timeout') or flags.get('timeout'))
+
+
+def _limit_funcs(match, spans, flags, interruptible):
+    """
+    Wrap the match and spans functions of a matcher with the safety limits of flags. Lines that are too long or took
+    too long are skipped (they don't match, even with the invert flag) and reported to the on_skipped_line callback,
+    and running out of the call budget raises GrepTimeout. Every call to this function starts a new call budget.
+    :param match: Match function.
+    :param spans: Spans function, or None.
+    :param flags: Flags after converting shortcuts.
+    :param interruptible: If true, matching a line is interrupted once it runs out of time (for regex engines that may
+                          backtrack).
+    :return: (match, spans) functions.
+    """
+    max_length = flags.get('max_line_length')
+    line_timeout = flags.get('line_timeout')
+    timeout = flags.get('timeout')
+    on_skipped_line = flags.get('on_skipped_line')
+    timer = _timer
+    interrupt = _CAN_INTERRUPT and interruptible and bool(line_timeout or timeout)
+
+    # deadline of the call budget, set when the first line is matched
+    deadline = [None]
+
+    def skip(line, reason, seconds, skipped):
+        if on_skipped_line is not None:
+            on_skipped_line(line, reason, seconds)
+        return skipped
+
+    def limited(func, line, skipped):
+
+        # lines that are too long are not scanned at all
+        if max_length and len(line) > max_length:
+            return skip(line, 'too_long', 0.0, skipped)
+
+        # only max length
+        if not line_timeout and not timeout:
+            return func(line)
+
+        # get time left for this line
+        start = timer()
+        if timeout and deadline[0] is None:
+            deadline[0] = start + timeout
+        budget = line_timeout
+        if deadline[0] is not None:
+            call_left = deadline[0] - start
+            if call_left <= 0:
+                raise GrepTimeout("Grep ran out of its time budget (%s seconds)." % timeout, line)
+            if not budget or call_left < budget:
+                budget = call_left
+
+        # match line (interrupted once out of time, if possible)
+        try:
+            if interrupt and __is_main_thread():
+                ret = __interruptible_call(func, line, budget)
+            else:
+                ret = func(line)
+        except _Interrupted:
+            ret = None
+        elapsed = timer() - start
+
+        # out of time
+        if deadline[0] is not None and ret is None and start + elapsed >= deadline[0]:
+            raise GrepTimeout("Grep ran out of its time budget (%s seconds)." % timeout, line)
+        if ret is None or (line_timeout and elapsed > line_timeout):
+            return skip(line, 'timeout', elapsed, skipped)
+        return ret
+
+    limited_match = lambda line: limited(match, line, _SKIPPED_MATCH)
+    limited_spans = None if spans is None else lambda line: limited(spans, line, _SKIPPED_SPANS)
+    return limited_match, limited_spans
+
+
+def __is_main_thread():
+    """
+    Return if running in the main thread (only the main thread gets signals).
+    """
+    return _get_ident() == _main_ident
+
+
+# current and main thread identifiers (python 2 doesn't have main_thread() and get_ident())
+if hasattr(threading, 'main_thread'):
+    _get_ident = threading.get_ident
+    _main_ident = threading.main_thread().ident
+else:
+    import thread as _thread
+    _get_ident = _thread.get_ident
+    _main_ident = next(t.ident for t in threading.enumerate() if isinstance(t, threading._MainThread))
+
+
+# is a timer set to interrupt current line, and the SIGALRM handler that was set before ours
+_armed = [False]
+_previous_handler = [None]
+
+# minimal delay to restore a timer of the application with, if it should have already fired
+_MIN_DELAY = 1e-6
+
+
+def __interruptible_call(func, line, seconds):
+    """
+    Call a match function with a timer that interrupts it (by raising _Interrupted) after a number of seconds.
+    The timer and SIGALRM handler that were set before are restored after the call (the time that passed is subtracted
+    from the timer), and if that timer would fire first, the function is called without a timer of our own.
+    """
+    # application timer that fires before our budget ends: don't replace it (line is only checked after matching)
+    delay, interval = signal.getitimer(signal.ITIMER_REAL)
+    if delay and delay <= seconds:
+        return func(line)
+
+    # set our handler and timer
+    previous = signal.signal(signal.SIGALRM, _alarm_handler)
+    _previous_handler[0] = previous
+    start = _timer()
+    try:
+        _armed[0] = True
+        signal.setitimer(signal.ITIMER_REAL, seconds)
+        try:
+            return func(line)
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            _armed[0] = False
+
+    # restore previous timer (minus the time that passed) and handler (this is a separate block, so it runs even if
+    # our timer fired right before it was cleared)
+    finally:
+        _armed[0] = False
+        if delay:
+            signal.setitimer(signal.ITIMER_REAL, max(delay - (_timer() - start), _MIN_DELAY), interval)
+        if previous is not None:
+            signal.signal(signal.SIGALRM, previous)
+
+
+def _alarm_handler(signum, frame):
+    """
+    SIGALRM handler: interrupt current line if a timer is set, or pass the signal to the previous handler.
+    """
+    if _armed[0]:
+        _armed[0] = False
+        raise _Interrupted()
+    previous = _previous_handler[0]
+    if callable(previous):
+        previous(signum, frame)
+    elif previous == signal.SIG_DFL:
+        signal.signal(signal.SIGALRM, signal.SIG_DFL)
+        os.kill(os.getpid(), signal.SIGALRM)
@@ -0,0 +1,370 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Sidecar line-offset index, to jump to any line of a big file (to grep a range of lines, or read the lines around a
+match) without counting lines from the beginning of file.
+
+The index keeps the offset of every Nth line of file, so finding a line only scans the lines between it and the
+sampled line before it. Its saved next to the file (as '<path>.lidx' by default), and when lines are appended to the
+file only the new part is indexed.
+
+Index file format (all numbers are big-endian):
+
+    - Header: magic (8 bytes), then step, indexed size, lines count, inode (4 unsigned 64 bit), modification time
+      (double), and sha1 of the last indexed bytes (20 bytes).
+    - Offsets: offset of every sampled line (signed 64 bit each), starting with line 0.
+
+Author: Ronen Ness.
+Since: 2017.
+"""
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+from . import compressed as _compressed
+from .results import _INT64
+
+# index file header
+_MAGIC = b'GFLNIDX1'
+_HEADER = struct.Struct('>8sQQQQd20s')
+
+# default sidecar file suffix, and default number of lines between sampled lines
+LINE_INDEX_SUFFIX = '.lidx'
+STEP = 1000
+
+# how many bytes to copy at once when counting lines
+_CHUNK = 4 * 1024 * 1024
+
+# how many bytes before the indexed size to hash, to check if file was only appended to
+_TAIL_CHECK_SIZE = 4096
+
+# when looking for the Nth end-of-line, below this many lines find them one by one instead of counting halves
+_FIND_LINES = 32
+
+# size of the first window to count end-of-lines in, when looking for the Nth end-of-line
+_FIRST_WINDOW = 16 * 1024
+
+
+def build_line_index(path, index_path=None, step=None):
+    """
+    Build (or update) the line index of a file, and save it as a sidecar file.
+    :param path: File path to index.
+    :param index_path: Path of index file (default to file path with '.lidx' suffix).
+    :param step: Number of lines between sampled lines (default to 1000). Smaller steps mean less scanning to find a
+                 line, but a bigger index.
+    :return: LineIndex instance.
+    """
+    index = LineIndex(path, index_path, step)
+    index.update()
+    return index
+
+
+class LineIndex(object):
+    """
+    A persistent index of the line offsets of a single file.
+    Pass it as the 'line_index' flag of grep_file() to find the start_line / end_line range without counting lines,
+    or use read_lines() to read any lines of file by their index.
+    The index follows the file: lines appended to file are indexed when needed, and if file was replaced or changed in
+    any other way it is indexed again.
+    """
+
+    def __init__(self, path, index_path=None, step=None):
+        """
+        Open a line index (if index file doesn't exist yet, or was built with a different step, the index is empty
+        until updated).
+        :param path: Indexed file path.
+        :param index_path: Path of index file (default to file path with '.lidx' suffix).
+        :param step: Number of lines between sampled lines (default to the step of the existing index file, or 1000).
+        """
+        self.path = os.path.abspath(path)
+        self.index_path = index_path or path + LINE_INDEX_SUFFIX
+        self.step = step
+        self.__reset()
+        if os.path.exists(self.index_path):
+            self._load()
+        if not self.step:
+            self.step = STEP
+
+    def __reset(self):
+        """
+        Reset index to an empty file.
+        """
+        self.size = 0
+        self.lines_count = 0
+        self.offsets = array(_INT64, [0])
+        self._inode = None
+        self._mtime = None
+        self._tail_check = hashlib.sha1(b'').digest()
+
+    def __repr__(self):
+        """
+        Return a short summary of the index.
+        """
+        return "LineIndex(%r, lines_count=%d, step=%d)" % (self.path, self.lines_count, self.step)
+
+    def update(self):
+        """
+        Index the lines added to file since last update (or the whole file, if it was replaced or changed), and save
+        the index file if anything changed.
+        """
+        with open(self.path, 'rb') as infile:
+            buff = self.__map(infile)
+            try:
+                self._sync(buff, os.fstat(infile.fileno()))
+            finally:
+                if buff is not None:
+                    buff.close()
+
+    def line_offset(self, line):
+        """
+        Get the offset of a line in file (updating the index first, if file changed).
+        :param line: Line index.
+        :return: Offset, in bytes, of the line beginning (or file size, if file has fewer lines).
+        """
+        with open(self.path, 'rb') as infile:
+            buff = self.__map(infile)
+            if buff is None:
+                return 0
+            try:
+                self._sync(buff, os.fstat(infile.fileno()))
+                return self._position(buff, line)
+            finally:
+                buff.close()
+
+    def read_lines(self, start_line, end_line=None, encoding='utf-8', errors='strict'):
+        """
+        Read a range of lines from file by seeking to them (updating the index first, if file changed).
+        Lines are processed like grep_file() returns them (without end-of-line, and without '\\r' before it). This is
+        useful to get the context of matches that grep() returned with line numbers, without reading the file again.
+        :param start_line: Index of first line to read.
+        :param end_line: Index of line to stop at (not included), or None to read until the end of file.
+        :param encoding: File encoding, or None to return lines as bytes.
+        :param errors: How to handle decoding errors.
+        :return: List of lines.
+        """
+        start_line = max(0, start_line)
+        with open(self.path, 'rb') as infile:
+            buff = self.__map(infile)
+            if buff is None:
+                return []
+            try:
+                self._sync(buff, os.fstat(infile.fileno()))
+                start, end = self._range(buff, start_line, end_line)
+                data = buff[start:end]
+            finally:
+                buff.close()
+
+        # split to lines (the last one is empty if data ends with end-of-line)
+        lines = data.split(b'\n')
+        if not lines[-1]:
+            lines.pop()
+        lines = [line[:-1] if line.endswith(b'\r') else line for line in lines]
+        if encoding is not None:
+            lines = [line.decode(encoding, errors) for line in lines]
+        return lines
+
+    def save(self):
+        """
+        Save index file (to a temporary file first, then replace the old index).
+        """
+        offsets = array(_INT64, self.offsets)
+        if sys.byteorder == 'little':
+            offsets.byteswap()
+        temp_path = self.index_path + '.tmp'
+        with open(temp_path, 'wb') as outfile:
+            outfile.write(_HEADER.pack(_MAGIC, self.step, self.size, self.lines_count, self._inode or 0,
+                                       self._mtime or 0.0, self._tail_check))
+            outfile.write(offsets.tostring() if not hasattr(offsets, 'tobytes') else offsets.tobytes())
+
+        # replace old index (python 2 doesn't have os.replace)
+        if hasattr(os, 'replace'):
+            os.replace(temp_path, self.index_path)
+        else:
+            if os.path.exists(self.index_path):
+                os.remove(self.index_path)
+            os.rename(temp_path, self.index_path)
+
+    def _load(self):
+        """
+        Load index file.
+        """
+        with open(self.index_path, 'rb') as infile:
+            data = infile.read()
+        magic, step, size, lines_count, inode, mtime, tail_check = _HEADER.unpack(data[:_HEADER.size])
+        if magic != _MAGIC:
+            raise ValueError("'%s' is not a grepfunc line index file." % self.index_path)
+
+        # index built with a different step is ignored (and built again on update)
+        if self.step and self.step != step:
+            return
+        offsets = array(_INT64)
+        if hasattr(offsets, 'frombytes'):
+            offsets.frombytes(data[_HEADER.size:])
+        else:
+            offsets.fromstring(data[_HEADER.size:])
+        if sys.byteorder == 'little':
+            offsets.byteswap()
+        self.step = step
+        self.size = size
+        self.lines_count = lines_count
+        self.offsets = offsets
+        self._inode = inode
+        self._mtime = mtime
+        self._tail_check = tail_check
+
+    def __map(self, infile):
+        """
+        Memory-map an opened file.
+        :return: Mapped buffer, or None if file is empty (empty files can't be mapped).
+        """
+        if _compressed._detect(infile) is not None:
+            raise ValueError("Can't index lines of compressed file '%s'." % self.path)
+        if not os.fstat(infile.fileno()).st_size:
+            return None
+        return mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _sync(self, buff, stat):
+        """
+        Make sure index matches file: index appended lines, or index the whole file again if it was replaced or
+        changed. Index file is saved if anything changed.
+        :param buff: Mapped file (or None, if file is empty).
+        :param stat: File stat result.
+        """
+        size = len(buff) if buff is not None else 0
+
+        # file didn't change
+        if stat.st_ino == self._inode and stat.st_mtime == self._mtime:
+            return
+
+        # if lines were only appended (same inode and same last indexed bytes), only index the new part
+        if stat.st_ino != self._inode or size < self.size or _tail_check(buff, self.size) != self._tail_check:
+            self.__reset()
+        self._inode = stat.st_ino
+        self._mtime = stat.st_mtime
+        if buff is not None:
+            end = buff.rfind(b'\n', self.size) + 1
+            if end > self.size:
+                self.lines_count += _index_lines(buff, self.size, end, self.lines_count, self.step, self.offsets)
+                self.size = end
+                self._tail_check = _tail_check(buff, end)
+        self.save()
+
+    def _position(self, buff, line):
+        """
+        Get the position of a line beginning in a mapped file (index must be synced with file).
+        :return: Position, or buffer size if file has fewer lines.
+        """
+        line = max(0, line)
+        if line >= self.lines_count:
+            return self.size if line == self.lines_count else len(buff)
+        sample = line // self.step
+        return _line_position(buff, line, self.offsets[sample], sample * self.step)
+
+    def _range(self, buff, start_line, end_line):
+        """
+        Get the positions of a range of lines in a mapped file (index must be synced with file).
+        :param end_line: Index of line to stop at (not included), or None for the end of file.
+        :return: (start, end) positions.
+        """
+        start = self._position(buff, start_line)
+        if end_line is None:
+            return start, len(buff)
+        if end_line <= start_line:
+            return start, start
+        if end_line - start_line < self.step:
+            return start, _line_position(buff, end_line, start, start_line)
+        return start, self._position(buff, end_line)
+
+
+def _tail_check(buff, size):
+    """
+    Get hash of the last bytes before a position in buffer.
+    """
+    if buff is None or not size:
+        return hashlib.sha1(b'').digest()
+    return hashlib.sha1(buff[max(0, size - _TAIL_CHECK_SIZE):size]).digest()
+
+
+def _line_position(buff, line, pos=0, first_line=0):
+    """
+    Find where a line begins in a buffer by counting end-of-lines, starting from a known line.
+    :param buff: Buffer to search (bytes, mmap, or anything else that support slicing).
+    :param line: Index of line to find.
+    :param pos: Position of a known line beginning (before the line to find).
+    :param first_line: Index of the line at pos.
+    :return: Position of line beginning, or buffer size if buffer has fewer lines.
+    """
+    size = len(buff)
+    count = line - first_line
+    while count > 0 and pos < size:
+        chunk_end = min(size, pos + _CHUNK)
+        data = buff[pos:chunk_end]
+        in_chunk = data.count(b'\n')
+        if in_chunk >= count:
+            return pos + __skip_lines(data, 0, len(data), count)
+        count -= in_chunk
+        pos = chunk_end
+    return pos if count <= 0 else size
+
+
+def _index_lines(buff, start, end, first_line, step, offsets):
+    """
+    Add the offsets of sampled lines in a range of buffer to an index.
+    :param buff: Buffer to index.
+    :param start: Range start (must be a beginning of a line).
+    :param end: Range end (must be a beginning of a line).
+    :param first_line: Index of the line at start.
+    :param step: Number of lines between sampled lines.
+    :param offsets: Array of sampled lines offsets to add to (must already contain all sampled lines up to first_line).
+    :return: Number of lines in range.
+    """
+    line = first_line
+    while start < end:
+        chunk_end = min(end, start + _CHUNK)
+        data = buff[start:chunk_end]
+        in_chunk = data.count(b'\n')
+
+        # add the sampled lines that begin in this chunk (the line beginning right after the chunk is added too)
+        pos = 0
+        pos_line = line
+        next_sample = (line // step + 1) * step
+        while next_sample <= line + in_chunk:
+            pos = __skip_lines(data, pos, len(data), next_sample - pos_line)
+            pos_line = next_sample
+            offsets.append(start + pos)
+            next_sample += step
+
+        line += in_chunk
+        start = chunk_end
+    return line - first_line
+
+
+def __skip_lines(data, pos, end, count):
+    """
+    Get the position right after the next 'count' end-of-lines in data (data must contain that many of them).
+    Instead of finding end-of-lines one by one, a growing window is counted until it contains them, and then halves of
+    it are counted until only a few lines are left.
+    """
+    window = _FIRST_WINDOW
+    while count > _FIND_LINES:
+        window_end = min(end, pos + window)
+        in_window = data.count(b'\n', pos, window_end)
+        if in_window >= count or window_end == end:
+            end = window_end
+            break
+        count -= in_window
+        pos = window_end
+        window *= 2
+    while count > _FIND_LINES:
+        middle = (pos + end) // 2
+        in_half = data.count(b'\n', pos, middle)
+        if in_half >= count:
+            end = middle
+        else:
+            count -= in_half
+            pos = middle
+    for _ in range(count):
+        pos = data.find(b'\n', pos) + 1
+    return pos
@@ -0,0 +1,133 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Find the literal strings a regex requires, so lines (or blocks) that don't contain them can be rejected with a cheap
+string search before running the regex.
+
+Author: Ronen Ness.
+Since: 2017.
+"""
+import re
+
+# python regex parser
+try:
+    from re import _parser as _sre_parse
+except ImportError:
+    import sre_parse as _sre_parse
+
+# characters that can be part of a literal: in python 2 only ascii, since pattern may be bytes or unicode
+try:
+    unichr
+    _MAX_LITERAL_CHAR = 127
+except NameError:
+    _MAX_LITERAL_CHAR = None
+
+# when ignoring case, the regex engine matches some non-ascii characters to these letters (like the long 's'), while
+# str.lower() does not turn them to the same letters, or turns other characters to them. so when ignoring case we only
+# use ascii literals without these letters
+_IGNORE_CASE_UNSAFE = frozenset('iIsSkK')
+
+# max number of alternatives in a set of required literals
+MAX_LITERALS = 16
+
+# literals of this length are considered as good as longer literals, when picking which literals to use
+GOOD_LITERAL_LENGTH = 3
+
+
+def required_literals(pattern, flags=0):
+    """
+    Find literal strings that every match of a regex contains.
+    :param pattern: Regex pattern string.
+    :param flags: Regex flags.
+    :return: (literals, ignore_case), where literals is a tuple of strings and every match contains at least one of
+             them (if ignore_case is true, literals are lower case and should be searched in lower cased text).
+             Return None if there are no required literals.
+    """
+    try:
+        parsed = _sre_parse.parse(pattern, flags)
+    except (re.error, TypeError):
+        return None
+    ignore_case = bool((getattr(parsed, 'state', None) or parsed.pattern).flags & re.IGNORECASE)
+    literals = __sequence_literals(parsed, ignore_case)
+    if not literals:
+        return None
+    return literals, ignore_case
+
+
+def __sequence_literals(items, ignore_case):
+    """
+    Find the best set of required literals in a sequence of parsed regex items.
+    :return: Tuple of literals (lower case if ignore_case), or None.
+    """
+    best = None
+
+    # current run of consecutive literal characters
+    run = []
+
+    for op, av in items:
+
+        # literal character - add to current run
+        if op == _sre_parse.LITERAL and __literal_char_ok(av, ignore_case):
+            run.append(chr(av).lower() if ignore_case else chr(av))
+            continue
+
+        # positions don't consume characters, so they don't break literal runs
+        if op == _sre_parse.AT:
+            continue
+
+        # anything else ends current run
+        if run:
+            best = __better_literals(best, (''.join(run),))
+            run = []
+
+        # groups (only if they don't change the ignore case flag)
+        if op == _sre_parse.SUBPATTERN:
+            if len(av) == 4 and (av[1] | av[2]) & re.IGNORECASE:
+                continue
+            best = __better_literals(best, __sequence_literals(av[-1], ignore_case))
+
+        # repeats that must match at least once
+        elif op in (_sre_parse.MAX_REPEAT, _sre_parse.MIN_REPEAT):
+            if av[0] >= 1:
+                best = __better_literals(best, __sequence_literals(av[2], ignore_case))
+
+        # alternation - every branch must have required literals
+        elif op == _sre_parse.BRANCH:
+            literals = []
+            for branch in av[1]:
+                branch_literals = __sequence_literals(branch, ignore_case)
+                if not branch_literals:
+                    break
+                literals.extend(l for l in branch_literals if l not in literals)
+            else:
+                if len(literals) <= MAX_LITERALS:
+                    best = __better_literals(best, tuple(literals))
+
+    # last run
+    if run:
+        best = __better_literals(best, (''.join(run),))
+    return best
+
+
+def __literal_char_ok(code, ignore_case):
+    """
+    Return if a literal character can be part of required literals.
+    """
+    if ignore_case:
+        return code < 128 and chr(code) not in _IGNORE_CASE_UNSAFE
+    return _MAX_LITERAL_CHAR is None or code <= _MAX_LITERAL_CHAR
+
+
+def __better_literals(current, other):
+    """
+    Pick the set of literals that is more likely to reject text: the one with the longest shortest literal (up to
+    GOOD_LITERAL_LENGTH characters). On a tie keep current, since literals that appear first in a pattern are usually
+    the more distinctive ones (like 'ERROR' in log patterns).
+    """
+    if not other:
+        return current
+    if not current:
+        return other
+    current_len = min(GOOD_LITERAL_LENGTH, min(len(l) for l in current))
+    other_len = min(GOOD_LITERAL_LENGTH, min(len(l) for l in other))
+    return other if other_len > current_len else current
@@ -0,0 +1,254 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Grep a single target with many independent queries (different patterns and flags), reading it only once.
+
+Author: Ronen Ness.
+Since: 2017.
+"""
+from itertools import islice
+from . import grepfunc as _grepfunc
+
+# how many lines to read and grep at once (batches start small and grow up to this size, so queries that are done
+# early don't read much more than needed)
+BATCH_LINES = 8 * 1024
+FIRST_BATCH_LINES = 64
+
+
+def grep_multi(target, queries, **kwargs):
+    """
+    Grep a target with multiple independent queries, reading it only once.
+    Target is read batch by batch, and every batch of lines is split, stripped and joined only once and shared by all
+    queries. Queries that support block search (see block_size flag) search the joined batch and only check candidate
+    lines, other queries check every line. Once all queries are done (for example, quiet queries found a match and
+    other queries reached their max_count), stops reading target. Batches start small and grow, so queries that are
+    done early don't read much more than needed.
+    :param target: Target to apply grep on. Can be a single string, an iterable, a function, or an opened file handler.
+                   Strings are a single line, unless the shared block_size flag is set.
+    :param queries: Dictionary of {name: (pattern, flags)}, where pattern is a grep pattern (or a Matcher returned by
+                    compile()) and flags is a dictionary of flags (see grep() help). Value can also be just a pattern
+                    or a Matcher, to use only the shared flags.
+    :param kwargs: Flags shared by all queries (flags of a query override them). Note: the cache flag is ignored, and
+                   stats only collect matching counters and lines read.
+    :return: Dictionary of {name: result}, where result is what grep() would return for the query (a list of matches,
+             a count, or True / False).
+    """
+    # compile all queries
+    queries = [_Query(name, __compile_query(query, kwargs)) for name, query in queries.items()]
+    if not queries:
+        return {}
+    eol = queries[0].matcher.eol
+    if any(query.matcher.eol != eol for query in queries):
+        raise ValueError("All queries must be either bytes patterns or text patterns.")
+
+    # if target is a callable function, call it first to get value
+    if callable(target):
+        target = target()
+
+    # check if target is binary, if any query requested it
+    is_binary = False
+    if any(_grepfunc._checks_binary(query.flags) for query in queries):
+        is_binary, target = _grepfunc._check_binary(target)
+    for query in queries:
+        query.set_binary(is_binary)
+
+    # strings are a single line, unless block mode is set
+    if isinstance(target, _grepfunc._string_types):
+        target = _grepfunc._lines_stream(target) if kwargs.get('block_size') else [target]
+
+    # lines of files end with end-of-line
+    has_eol = hasattr(target, 'readline')
+
+    # count lines read, for every stats object used by queries
+    lines = iter(target)
+    for stats in set(query.flags['stats'] for query in queries if query.flags.get('stats') is not None):
+        lines = stats._wrap_lines(lines)
+
+    # grep batch by batch, until target ends or all queries are done
+    active = [query for query in queries if not query.done]
+    start = 0
+    batch_size = min(FIRST_BATCH_LINES, BATCH_LINES)
+    while active:
+        batch = list(islice(lines, batch_size))
+        if not batch:
+            break
+        views = _BatchViews(batch, eol, has_eol)
+        for query in active:
+            query.grep(views, start)
+        active = [query for query in active if not query.done]
+        start += len(batch)
+        batch_size = min(batch_size * 2, BATCH_LINES)
+
+    return dict((query.name, query.result()) for query in queries)
+
+
+def __compile_query(query, kwargs):
+    """
+    Compile a single query value (see grep_multi() queries param) with the shared flags.
+    :return: Matcher instance.
+    """
+    if isinstance(query, tuple) and len(query) == 2 and isinstance(query[1], dict):
+        pattern, flags = query
+        return _grepfunc.compile(pattern, **dict(kwargs, **flags))
+    return _grepfunc.compile(query, **kwargs)
+
+
+class _BatchViews(object):
+    """
+    A batch of lines, and the different forms of them that queries need, each built once and shared by all queries.
+    """
+
+    def __init__(self, lines, eol, has_eol):
+        """
+        Create batch views.
+        :param lines: Lines, as read from target.
+        :param eol: End-of-line of lines (text or bytes).
+        :param has_eol: If true, lines are from a file and end with end-of-line.
+        """
+        self.raw = lines
+        self.eol = eol
+        self.has_eol = has_eol
+        self.__lines = {}
+        self.__blocks = {}
+
+    def lines(self, kind):
+        """
+        Get lines of a given kind: 'raw' (as read from target), 'stripped' (without end-of-line), or 'trimmed'
+        (without any whitespace at the beginning and end).
+        :return: List of lines.
+        """
+        ret = self.__lines.get(kind)
+        if ret is None:
+            if kind == 'trimmed':
+                ret = [line.strip() for line in self.raw]
+            elif kind == 'stripped' and self.has_eol:
+                eol = self.eol
+                ret = [line[:-1] if line.endswith(eol) else line for line in self.raw]
+            else:
+                ret = self.raw
+            self.__lines[kind] = ret
+        return ret
+
+    def block(self, kind):
+        """
+        Get lines of a given kind (see lines()) joined to a single block, for block search.
+        :return: Block of lines, or None if lines can't be joined.
+        """
+        if kind not in self.__blocks:
+            self.__blocks[kind] = _grepfunc._join_lines(self.lines(kind), self.eol)
+        return self.__blocks[kind]
+
+
+class _Query(object):
+    """
+    State of a single query of grep_multi().
+    """
+
+    def __init__(self, name, matcher):
+        """
+        Create query state.
+        :param name: Query name.
+        :param matcher: Compiled matcher.
+        """
+        flags = matcher.flags
+        self.name = name
+        self.flags = flags
+        self.done = False
+
+        # which lines this query needs (lines are trimmed once for all queries, so the matcher doesn't trim them)
+        if flags.get('trim'):
+            self.kind = 'trimmed'
+            matcher = _grepfunc.compile(matcher, trim=False)
+        elif flags.get('keep_eol'):
+            self.kind = 'raw'
+        else:
+            self.kind = 'stripped'
+        self.matcher = matcher
+
+        # count and quiet only count matching lines, other queries collect matches like grep()
+        self.counting = bool(flags.get('quiet') or flags.get('count'))
+        self.limit = 1 if flags.get('quiet') else flags.get('max_count')
+        self.count = 0
+        self.values = []
+        self.state = None if self.counting else _grepfunc._LinesState(flags)
+
+        # search joined lines when possible (context needs every line, and lines with end-of-line can't be joined)
+        self.use_blocks = matcher.block_search is not None and self.kind != 'raw' and \
+            (self.counting or not (flags.get('after_context') or flags.get('before_context')))
+
+    def set_binary(self, is_binary):
+        """
+        Apply binary_files flag, after checking if target is binary.
+        """
+        self.is_binary = is_binary and self.flags.get('binary_files') in ('binary', 'without-match')
+        if not self.is_binary:
+            return
+        if self.flags.get('binary_files') == 'without-match':
+            self.done = True
+        elif not self.counting:
+            self.state.matches_left = 1
+
+    def grep(self, views, start):
+        """
+        Grep a batch of lines.
+        :param views: Batch of lines (_BatchViews).
+        :param start: Index of the first line in batch.
+        """
+        lines = views.lines(self.kind)
+        block = views.block(self.kind) if self.use_blocks else None
+        matcher = self.matcher
+
+        # counting: check candidate lines (or every line) until reached limit
+        if self.counting:
+            match = matcher.match
+            if block is not None:
+                candidates = _grepfunc._candidate_indices(block, matcher.block_search, views.eol)
+                lines = [lines[index] for index in candidates]
+            for line in lines:
+                if match(line)[0]:
+                    self.count += 1
+                    if self.count == self.limit:
+                        self.done = True
+                        return
+            return
+
+        # collecting matches from every line
+        state = self.state
+        if block is None:
+            self.values.extend(_grepfunc._grep_lines(lines, matcher, state))
+            self.done = state.done
+            return
+
+        # collecting matches from candidate lines only (without context, lines are independent, so only line numbers
+        # need to be converted from candidate index to line index)
+        candidates = list(_grepfunc._candidate_indices(block, matcher.block_search, views.eol))
+        state.line_index = 0
+        values = _grepfunc._grep_lines([lines[index] for index in candidates], matcher, state)
+        if self.flags.get('line_number') and not self.flags.get('byte_offset'):
+            values = ((start + candidates[index], value) for index, value in values)
+        self.values.extend(values)
+        self.done = state.done
+
+    def result(self):
+        """
+        Get query result, like grep() returns it.
+        """
+        if self.flags.get('quiet'):
+            return self.count > 0
+        if self.counting:
+            return self.count
+
+        # complete the trailing context of last matches
+        if not self.is_binary or self.flags.get('binary_files') != 'without-match':
+            self.values.extend(_grepfunc._grep_lines_end(self.matcher, self.state))
+
+        # binary target returns a single message instead of matches
+        if self.is_binary:
+            return [_grepfunc.BINARY_FILE_MATCHES] if self.values else []
+
+        # decode returned lines of bytes patterns, if requested
+        encoding = _grepfunc._decode_encoding(self.matcher)
+        if encoding:
+            errors = self.flags.get('errors') or 'strict'
+            return [_grepfunc._decode_value(value, encoding, errors) for value in self.values]
+        return self.values
@@ -0,0 +1,213 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Compact grep results, returned by grep() when the compact flag is set.
+Matches are kept in arrays of integers with a reference to the grepped source, and lines are only sliced from the
+source when they are accessed.
+
+Author: Ronen Ness.
+Since: 2017.
+"""
+from array import array
+
+# typecode of 64 bit signed integer arrays ('q' is not available in python 2, where 'l' is 64 bit on most platforms)
+try:
+    array('q')
+    _INT64 = 'q'
+except ValueError:
+    _INT64 = 'l'
+
+
+class GrepResults(object):
+    """
+    Compact list of grep matches. Every match takes a few integers (its line number, the span of the match in line,
+    and the offset of its line in source) instead of a string, a tuple and a list, so millions of matches take little
+    memory. Accessing a match returns a GrepMatch view, which slices the line from the source only when requested.
+    The arrays are public, for fast access without views:
+
+        - line_numbers:  Index of the matching line of every match.
+        - starts, ends:  Span of every match in its line (-1 for lines matched by the invert flag).
+        - offsets:       Offset of the matching line in source (in characters, or bytes for bytes targets), or None
+                         if target is a list (where line_numbers are the indices of items).
+    """
+
+    def __init__(self, source, kind, trim=False, encoding=None, errors='strict'):
+        """
+        Create empty results. Don't call this directly, use grep() with the compact flag instead.
+        :param source: The grepped list or string, or a list of the matching lines (for targets that can't be read
+                       again, like files and iterators).
+        :param kind: 'items' if source is the grepped list, 'text' if its the grepped string, or 'lines' if its a list
+                     of the matching lines.
+        :param trim: If true, lines of 'items' sources are trimmed before use (see trim flag).
+        :param encoding: If set, lines of bytes sources are decoded with this encoding when accessed.
+        :param errors: How to handle decoding errors.
+        """
+        self.line_numbers = array(_INT64)
+        self.starts = array(_INT64)
+        self.ends = array(_INT64)
+        self.offsets = None if kind == 'items' else array(_INT64)
+        self._refs = array(_INT64) if kind == 'lines' else None
+        self._source = source
+        self._kind = kind
+        self._trim = trim
+        self._encoding = encoding
+        self._errors = errors
+
+    def __len__(self):
+        """
+        Return number of matches.
+        """
+        return len(self.starts)
+
+    def __getitem__(self, index):
+        """
+        Get a match view by index, or a list of views by slice.
+        """
+        size = len(self.starts)
+        if isinstance(index, slice):
+            return [GrepMatch(self, i) for i in range(*index.indices(size))]
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("GrepResults index out of range.")
+        return GrepMatch(self, index)
+
+    def __iter__(self):
+        """
+        Iterate match views.
+        """
+        for index in range(len(self.starts)):
+            yield GrepMatch(self, index)
+
+    def __repr__(self):
+        """
+        Return a short summary of the results.
+        """
+        return "GrepResults(%d matches)" % len(self.starts)
+
+    def line(self, index):
+        """
+        Get the line of a match.
+        :param index: Match index.
+        :return: Line, as it would be returned by grep() (without end-of-line).
+        """
+        return self.__decode(self.__raw_line(index))
+
+    def __raw_line(self, index):
+        """
+        Get the line of a match, before decoding.
+        """
+        kind = self._kind
+        if kind == 'items':
+            line = self._source[self.line_numbers[index]]
+            if self._trim:
+                line = line.strip()
+        elif kind == 'text':
+            source = self._source
+            start = self.offsets[index]
+            end = source.find(b'\n' if isinstance(source, bytes) else u'\n', start)
+            line = source[start:] if end == -1 else source[start:end]
+        else:
+            line = self._source[self._refs[index]]
+        return line
+
+    def __decode(self, line):
+        """
+        Decode a line of bytes, if encoding is set.
+        """
+        if self._encoding is not None and isinstance(line, bytes):
+            return line.decode(self._encoding, self._errors)
+        return line
+
+    def text(self, index):
+        """
+        Get the matching part of a match's line (or the whole line, for lines matched by the invert flag).
+        :param index: Match index.
+        :return: Matching text.
+        """
+        # spans of bytes lines are in bytes, so slice before decoding
+        line = self.__raw_line(index)
+        start = self.starts[index]
+        if start != -1:
+            line = line[start:self.ends[index]]
+        return self.__decode(line)
+
+    def texts(self):
+        """
+        Get the matching parts of all matches (like grep() with the only_matching flag).
+        :return: List of strings.
+        """
+        return [self.text(index) for index in range(len(self.starts))]
+
+    def lines(self):
+        """
+        Get the lines of all matches (like grep() without flags).
+        :return: List of strings.
+        """
+        return [self.line(index) for index in range(len(self.starts))]
+
+
+class GrepMatch(object):
+    """
+    A lightweight view of a single match in GrepResults.
+    """
+    __slots__ = ('_results', '_index')
+
+    def __init__(self, results, index):
+        """
+        Create view.
+        :param results: GrepResults instance.
+        :param index: Match index in results.
+        """
+        self._results = results
+        self._index = index
+
+    @property
+    def line_number(self):
+        """
+        Index of the matching line.
+        """
+        return self._results.line_numbers[self._index]
+
+    @property
+    def start(self):
+        """
+        Position of the match in line (-1 for lines matched by the invert flag).
+        """
+        return self._results.starts[self._index]
+
+    @property
+    def end(self):
+        """
+        End position of the match in line (-1 for lines matched by the invert flag).
+        """
+        return self._results.ends[self._index]
+
+    @property
+    def line_offset(self):
+        """
+        Offset of the matching line in source, or None if source is a list.
+        """
+        offsets = self._results.offsets
+        return None if offsets is None else offsets[self._index]
+
+    @property
+    def line(self):
+        """
+        The matching line.
+        """
+        return self._results.line(self._index)
+
+    @property
+    def text(self):
+        """
+        The matching part of line (or the whole line, for lines matched by the invert flag).
+        """
+        return self._results.text(self._index)
+
+    def __repr__(self):
+        """
+        Return a short summary of the match.
+        """
+        return "GrepMatch(line_number=%d, start=%d, end=%d, text=%r)" % (self.line_number, self.start, self.end,
+                                                                         self.text)
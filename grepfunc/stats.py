@@ -0,0 +1,274 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""
+Optional statistics and progress hooks for grep calls.
+
+Author: Ronen Ness.
+Since: 2017.
+"""
+import time
+
+# best timer available (python 2 doesn't have perf_counter)
+_timer = getattr(time, 'perf_counter', time.time)
+
+
+class GrepStats(object):
+    """
+    Counters and timings of grep calls. Pass it as the 'stats' flag of grep() or grep_iter() (or compile()) to collect
+    them. When the flag is not set nothing is collected, and there is no overhead at all.
+    A single instance can be used for multiple calls, in which case counters add up (see reset()).
+    """
+
+    # names of all counters, in the order as_dict() returns them
+    COUNTERS = ('lines', 'chars', 'blocks', 'max_line_length', 'match_calls', 'matches', 'prefilter_checks',
+                'prefiltered', 'candidates', 'read_time', 'match_time', 'search_time', 'total_time', 'max_match_time',
+                'slow_matches')
+
+    def __init__(self, on_progress=None, progress_interval=10000, on_slow_match=None, slow_match_time=0.1):
+        """
+        Create stats object.
+        :param on_progress: Optional function to call with this stats object every 'progress_interval' lines read.
+        :param progress_interval: How many lines to read between on_progress calls.
+        :param on_slow_match: Optional function to call with (this stats object, line, seconds) every time matching a
+                              single line takes at least 'slow_match_time' seconds (like catastrophic backtracking).
+        :param slow_match_time: Matching a single line for this many seconds (or more) counts as a slow match.
+        """
+        self.on_progress = on_progress
+        self.progress_interval = progress_interval
+        self.on_slow_match = on_slow_match
+        self.slow_match_time = slow_match_time
+        self.reset()
+
+    def __getstate__(self):
+        """
+        Only pickle settings, without callbacks (stats from worker processes of grep_paths() are not collected).
+        """
+        return {'progress_interval': self.progress_interval, 'slow_match_time': self.slow_match_time}
+
+    def __setstate__(self, state):
+        """
+        Create empty stats after unpickling.
+        """
+        self.__init__(progress_interval=state['progress_interval'], slow_match_time=state['slow_match_time'])
+
+    def reset(self):
+        """
+        Reset all counters.
+        """
+        # input: lines read (for blocks, end-of-lines read), characters (or bytes) read, blocks read, longest line
+        self.lines = 0
+        self.chars = 0
+        self.blocks = 0
+        self.max_line_length = 0
+
+        # matching: calls to per-line match function and how many matched, lines checked and rejected by the regex
+        # literals prefilter (rejected lines never run the regex), and candidates found by block search
+        self.match_calls = 0
+        self.matches = 0
+        self.prefilter_checks = 0
+        self.prefiltered = 0
+        self.candidates = 0
+
+        # timings (in seconds): reading input, per-line matching, block search, and total time of grep() calls
+        self.read_time = 0.0
+        self.match_time = 0.0
+        self.search_time = 0.0
+        self.total_time = 0.0
+
+        # slowest single line match, and how many matches took at least slow_match_time
+        self.max_match_time = 0.0
+        self.slow_matches = 0
+
+    @property
+    def hit_rate(self):
+        """
+        Matching lines out of lines read (or out of lines checked, if lines were not read line by line).
+        """
+        total = self.lines or self.match_calls
+        return float(self.matches) / total if total else 0.0
+
+    @property
+    def regex_calls(self):
+        """
+        Lines that were checked by the match function and not rejected by the literals prefilter.
+        """
+        return self.match_calls - self.prefiltered
+
+    @property
+    def other_time(self):
+        """
+        Time of grep() calls not spent on reading input, matching or searching blocks (processing lines, building
+        results).
+        """
+        return max(0.0, self.total_time - self.read_time - self.match_time - self.search_time)
+
+    def as_dict(self):
+        """
+        Get all counters as a dictionary (for example, to export them to a metrics system).
+        """
+        ret = dict((name, getattr(self, name)) for name in self.COUNTERS)
+        ret['hit_rate'] = self.hit_rate
+        ret['regex_calls'] = self.regex_calls
+        ret['other_time'] = self.other_time
+        return ret
+
+    def __repr__(self):
+        """
+        Return a short summary of the stats.
+        """
+        return "GrepStats(lines=%d, chars=%d, matches=%d, match_calls=%d, prefiltered=%d, read_time=%.4f, " \
+               "match_time=%.4f, total_time=%.4f)" % (self.lines, self.chars, self.matches, self.match_calls,
+                                                      self.prefiltered, self.read_time, self.match_time,
+                                                      self.total_time)
+
+    def _timed(self, func, *args):
+        """
+        Call a function and add its run time to total_time.
+        :return: Function return value.
+        """
+        start = _timer()
+        try:
+            return func(*args)
+        finally:
+            self.total_time += _timer() - start
+
+    def _wrap_lines(self, lines):
+        """
+        Wrap an iterable of lines, to count lines and time reading them.
+        :return: Iterator of lines.
+        """
+        timer = _timer
+        lines = iter(lines)
+        on_progress = self.on_progress
+        interval = self.progress_interval or 0
+        while True:
+            start = timer()
+            try:
+                line = next(lines)
+            except StopIteration:
+                self.read_time += timer() - start
+                return
+            self.read_time += timer() - start
+            self.lines += 1
+            length = len(line)
+            self.chars += length
+            if length > self.max_line_length:
+                self.max_line_length = length
+            if on_progress is not None and interval and not self.lines % interval:
+                on_progress(self)
+            yield line
+
+    def _wrap_blocks(self, blocks):
+        """
+        Wrap an iterable of text blocks, to count blocks, lines and characters, and time reading them.
+        :return: Iterator of blocks.
+        """
+        timer = _timer
+        blocks = iter(blocks)
+        on_progress = self.on_progress
+        interval = self.progress_interval or 0
+        while True:
+            start = timer()
+            try:
+                block = next(blocks)
+            except StopIteration:
+                self.read_time += timer() - start
+                return
+            self.read_time += timer() - start
+            self.blocks += 1
+            self.chars += len(block)
+            lines_before = self.lines
+            self.lines += block.count(b'\n' if isinstance(block, bytes) else '\n')
+            if on_progress is not None and interval and self.lines // interval != lines_before // interval:
+                on_progress(self)
+            yield block
+
+    def _wrap_batches(self, batches):
+        """
+        Wrap an iterable of batches (lists of lines, or text blocks), to count batches (as blocks), lines and
+        characters, and time reading them.
+        :return: Iterator of batches.
+        """
+        timer = _timer
+        batches = iter(batches)
+        on_progress = self.on_progress
+        interval = self.progress_interval or 0
+        while True:
+            start = timer()
+            try:
+                batch = next(batches)
+            except StopIteration:
+                self.read_time += timer() - start
+                return
+            self.read_time += timer() - start
+            self.blocks += 1
+            lines_before = self.lines
+            if isinstance(batch, (bytes, type(u''))):
+                self.chars += len(batch)
+                self.lines += batch.count(b'\n' if isinstance(batch, bytes) else '\n')
+            else:
+                lengths = [len(line) for line in batch]
+                self.lines += len(lengths)
+                if lengths:
+                    self.chars += sum(lengths)
+                    self.max_line_length = max(self.max_line_length, max(lengths))
+            if on_progress is not None and interval and self.lines // interval != lines_before // interval:
+                on_progress(self)
+            yield batch
+
+    def _wrap_match(self, match):
+        """
+        Wrap a per-line match function, to count and time calls.
+        :return: Match function.
+        """
+        timer = _timer
+
+        def counted_match(line):
+            start = timer()
+            ret = match(line)
+            elapsed = timer() - start
+            self.match_calls += 1
+            self.match_time += elapsed
+            if ret[0]:
+                self.matches += 1
+            if elapsed > self.max_match_time:
+                self.max_match_time = elapsed
+            if elapsed >= self.slow_match_time:
+                self.slow_matches += 1
+                if self.on_slow_match is not None:
+                    self.on_slow_match(self, line, elapsed)
+            return ret
+        return counted_match
+
+    def _wrap_prefilter(self, contains):
+        """
+        Wrap the required literals check of a regex match function, to count rejected lines.
+        :return: Check function.
+        """
+        def counted_contains(line):
+            ret = contains(line)
+            self.prefilter_checks += 1
+            if not ret:
+                self.prefiltered += 1
+            return ret
+        return counted_contains
+
+    def _wrap_block_search(self, block_search):
+        """
+        Wrap a block search function, to count candidates and time searching.
+        :return: Block search function.
+        """
+        timer = _timer
+
+        def counted_block_search(buff):
+            find = block_search(buff)
+
+            def counted_find(start, end):
+                begin = timer()
+                found = find(start, end)
+                self.search_time += timer() - begin
+                if start <= found < end:
+                    self.candidates += 1
+                return found
+            return counted_find
+        return counted_block_search
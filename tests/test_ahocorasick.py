@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for the Aho-Corasick automaton.
+"""
+from grepfunc import grep
+from grepfunc.ahocorasick import AhoCorasick
+import random
+import unittest
+
+
+def _find_any(patterns, text):
+    """
+    Reference implementation: try every pattern with find() in list order.
+    """
+    for index, p in enumerate(patterns):
+        position = text.find(p)
+        if position != -1:
+            return index, position
+    return -1, -1
+
+
+class TestAhoCorasick(unittest.TestCase):
+    """
+    Unittests to test the Aho-Corasick automaton.
+    """
+    def test_search(self):
+        """
+        Testing basic search.
+        """
+        automaton = AhoCorasick(["he", "she", "his", "hers"])
+        self.assertEqual((0, 2), automaton.search("ushers"))
+        self.assertEqual((2, 0), automaton.search("his"))
+        self.assertEqual((0, 4), automaton.search("xxxshe"))
+        self.assertEqual((1, 1), AhoCorasick(["hers", "she"]).search("ashe"))
+        self.assertEqual((-1, -1), automaton.search("nothing"))
+        self.assertEqual((1, 0), AhoCorasick(["x", ""]).search("abc"))
+        self.assertEqual((0, 1), AhoCorasick(["b", "b", ""]).search("abc"))
+
+    def test_same_as_find(self):
+        """
+        Testing that automaton results are identical to searching patterns one by one.
+        """
+        rand = random.Random(1234)
+        for _ in range(50):
+            patterns = ["".join(rand.choice("abc") for _ in range(rand.randint(1, 4))) for _ in range(20)]
+            automaton = AhoCorasick(patterns)
+            for _ in range(20):
+                text = "".join(rand.choice("abcd") for _ in range(rand.randint(0, 12)))
+                self.assertEqual(_find_any(patterns, text), automaton.search(text))
+
+    def test_grep_large_list(self):
+        """
+        Testing grep with a large list of fixed strings.
+        """
+        source = ['chubby', 'hub', 'Hub', 'dog', 'hottub  ', 'green HuB.', 'blue hub']
+        patterns = ["word%d" % i for i in range(100)] + ["hub", "dog"]
+        self.assertListEqual(['chubby', 'hub', 'dog', 'blue hub'], grep(source, patterns, F=True))
+        self.assertListEqual(['chubby', 'hub', 'Hub', 'dog', 'green HuB.', 'blue hub'], grep(source, patterns, F=True, i=True))
+        self.assertListEqual(['hub', 'Hub', 'dog', 'green HuB.', 'blue hub'], grep(source, patterns, F=True, i=True, w=True))
+        self.assertListEqual(['hub', 'dog'], grep(source, patterns, F=True, x=True))
+        self.assertListEqual([(1, 'hub'), (0, 'hub')], grep(source, patterns, F=True, b=True, o=True, m=2))
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for async grep.
+"""
+from grepfunc import grep, grep_aiter
+import asyncio
+import unittest
+
+# test file path
+test_file_path = "test.txt"
+
+
+async def _collect(target, pattern, **kwargs):
+    return [value async for value in grep_aiter(target, pattern, **kwargs)]
+
+
+async def _async_lines(lines, read):
+    for line in lines:
+        read.append(line)
+        yield line
+
+
+class TestGrepAiter(unittest.TestCase):
+    """
+    Unittests to test grep_aiter.
+    """
+    # test words (read from file)
+    with open(test_file_path, 'r') as infile:
+        test_words = [x[:-1] for x in infile.readlines()]
+
+    def setUp(self):
+        """
+        Create event loop.
+        """
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        """
+        Close event loop.
+        """
+        self.loop.close()
+
+    def stream(self, data):
+        """
+        Create a stream reader that contains data.
+        """
+        async def create():
+            reader = asyncio.StreamReader()
+            reader.feed_data(data)
+            reader.feed_eof()
+            return reader
+        return self.loop.run_until_complete(create())
+
+    def grep(self, target, pattern, **kwargs):
+        """
+        Run grep_aiter and return results list.
+        """
+        return self.loop.run_until_complete(_collect(target, pattern, **kwargs))
+
+    def test_sources(self):
+        """
+        Testing all kind of sources return the same as grep.
+        """
+        data = ("\n".join(self.test_words) + "\n").encode('utf-8')
+        for flags in ({}, {'i': True}, {'F': True, 'w': True}, {'n': True, 'A': 1, 'B': 2}, {'v': True, 'm': 2},
+                      {'A': 1, 'merge_context': True, 'group_separator': '--'}, {'k': True}):
+            expected = grep(self.test_words, "hub", **dict(flags, k=False))
+            if flags.get('k'):
+                expected = [x + '\n' for x in expected]
+            self.assertListEqual(expected, self.grep(self.stream(data), "hub", read_size=3, **flags))
+            self.assertListEqual(expected, self.grep(_async_lines(data.splitlines(True), []), "hub", **flags))
+            with open(test_file_path, 'r') as infile:
+                self.assertListEqual(expected, self.grep(infile, "hub", **flags))
+
+    def test_stream(self):
+        """
+        Testing stream decoding and splitting to lines.
+        """
+        data = u"first\r\nsecond ü\nlast ü".encode('utf-8')
+        for read_size in (1, 2, 5, 100):
+            self.assertListEqual([(1, u'second ü'), (2, u'last ü')],
+                                 self.grep(self.stream(data), u"ü", n=True, read_size=read_size))
+        self.assertListEqual(['first'], self.grep(self.stream(data), "t$", read_size=4))
+
+        # large batches are grepped in executor
+        data = b"line\n" * 100000 + b"match\n"
+        self.assertListEqual([(100000, 'match')], self.grep(self.stream(data), "match", n=True, read_size=1024 * 1024))
+
+    def test_bytes(self):
+        """
+        Testing bytes patterns match bytes lines of streams and async iterables without decoding them.
+        """
+        data = u"first\nsecond \xfc\nlast \xfc".encode('utf-8')
+        for read_size in (1, 2, 5, 100):
+            self.assertListEqual([(1, u'second \xfc'.encode('utf-8')), (2, u'last \xfc'.encode('utf-8'))],
+                                 self.grep(self.stream(data), u"\xfc".encode('utf-8'), n=True, read_size=read_size))
+        self.assertListEqual([b'second \xc3\xbc\n'], self.grep(self.stream(data), b"second", k=True))
+        self.assertListEqual([u'second \xfc', u'last \xfc'],
+                             self.grep(self.stream(data), b"\xc3\xbc", encoding='utf-8'))
+        self.assertListEqual([b'second \xc3\xbc'], self.grep(_async_lines(data.splitlines(True), []), b"sec"))
+        self.assertListEqual([b'\xff last'], self.grep(_async_lines([b'first', b'\xff last'], []), b"last"))
+        self.assertListEqual([b'last'], self.grep([b'first', b'last'], b"last"))
+
+    def test_max_count_stops_reading(self):
+        """
+        Testing max_count stops reading async iterable after the last match and its context.
+        """
+        read = []
+        lines = ['a', 'x', 'b', 'x', 'c']
+        self.assertListEqual([['x', 'b']], self.grep(_async_lines(lines, read), "x", m=1, A=1))
+        self.assertListEqual(['a', 'x', 'b'], read)
@@ -9,6 +9,26 @@ if __package__ is None:
 
 # import all tests
 from test_grepfunc import *
+from test_ahocorasick import *
+from test_files import *
+from test_batch import *
+from test_literals import *
+from test_index import *
+from test_cache import *
+from test_stats import *
+from test_compressed import *
+from test_multi import *
+from test_follow import *
+from test_results import *
+from test_lineindex import *
+from test_backends import *
+from test_chunked import *
+
+# async tests require python 3.6 or newer
+try:
+    from test_aio import *
+except SyntaxError:
+    pass
 
 # run tests
 if __name__ == '__main__':
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for matcher backends and safety limits.
+"""
+from grepfunc import grep, grep_iter, compile, register_backend, available_backends, GrepTimeout
+from grepfunc import backends
+import re
+import signal
+import threading
+import time
+import unittest
+
+# test file path
+test_file_path = "test.txt"
+
+# a regex that backtracks catastrophically on lines of many 'a' that don't end with 'b'
+slow_pattern = r"(a+)+b|hub"
+slow_line = "a" * 40 + "!"
+
+
+class CountingEngine(object):
+    """
+    Regex engine that uses python regex and counts compiled patterns.
+    """
+    name = 'counting'
+
+    def __init__(self):
+        self.compiled = 0
+
+    def compile(self, pattern, flags=0):
+        self.compiled += 1
+        return re.compile(pattern, flags)
+
+
+class TestBackends(unittest.TestCase):
+    """
+    Unittests to test backends and safety limits.
+    """
+    # test words (read from file)
+    with open(test_file_path, 'r') as infile:
+        test_words = [x[:-1] for x in infile.readlines()]
+
+    def test_literal_backends(self):
+        """
+        Testing literal backends.
+        """
+        strings = ["dog", "hub", "o"]
+        expected = grep(self.test_words, strings, F=True, n=True, o=True)
+        for backend in ('literal', 'multi_literal'):
+            self.assertEqual(compile(strings, backend=backend).backend, backend)
+            self.assertListEqual(grep(self.test_words, strings, backend=backend, n=True, o=True), expected)
+            self.assertListEqual(grep(self.test_words, ["DOG", "hub"], backend=backend, i=True, w=True),
+                                 grep(self.test_words, ["DOG", "hub"], F=True, i=True, w=True))
+
+        # literal backends match pattern as a fixed string
+        self.assertListEqual(grep(["a.c", "abc"], "a.c", backend='literal'), ["a.c"])
+
+        # default backend picked by pattern
+        self.assertEqual(compile(["a"] * 40, F=True).backend, 'multi_literal')
+        self.assertEqual(compile("a", F=True).backend, 'literal')
+        self.assertEqual(compile("a").backend, 're')
+
+    def test_regex_engines(self):
+        """
+        Testing regex engine backends.
+        """
+        engine = CountingEngine()
+        self.assertListEqual(grep(self.test_words, r"h\wb", backend=engine, o=True, all_matches=True),
+                             grep(self.test_words, r"h\wb", o=True, all_matches=True))
+        self.assertEqual(engine.compiled, 2)
+        self.assertEqual(compile("x", backend=engine).backend, 'counting')
+
+        # by name
+        register_backend('counting', engine)
+        self.assertIn('counting', available_backends())
+        self.assertListEqual(grep(self.test_words, "hub", backend='counting', n=True),
+                             grep(self.test_words, "hub", n=True))
+        self.assertRaises(ValueError, lambda: register_backend('literal', engine))
+        self.assertRaises(ValueError, lambda: grep(self.test_words, "hub", backend='no such backend'))
+
+        # auto backend uses re2 only if its installed
+        self.assertEqual(compile("hub", backend='auto').backend, 're2' if 're2' in backends._ENGINES else 're')
+        self.assertEqual(compile(r"\bhub", backend='auto').backend, 're')
+
+    def test_max_line_length(self):
+        """
+        Testing max_line_length flag.
+        """
+        skipped = []
+        lines = ["hub", "a long hub line", "no"]
+        on_skipped = lambda line, reason, seconds: skipped.append((line, reason))
+        self.assertListEqual(grep(lines, "hub", max_line_length=10, on_skipped_line=on_skipped), ["hub"])
+        self.assertListEqual(grep(lines, "hub", v=True, max_line_length=10), ["no"])
+        self.assertListEqual(skipped, [("a long hub line", 'too_long')])
+
+    def test_line_timeout(self):
+        """
+        Testing line_timeout flag.
+        """
+        skipped = []
+        lines = ["hub", slow_line, "bathub"]
+        result = grep(lines, slow_pattern, line_timeout=0.05, on_skipped_line=lambda l, r, s: skipped.append((l, r)))
+        self.assertListEqual(result, ["hub", "bathub"])
+        self.assertListEqual(skipped, [(slow_line, 'timeout')])
+
+        # block mode and counting still check lines one by one
+        self.assertEqual(grep("\n".join(lines), slow_pattern, line_timeout=0.05, block_size=4, c=True), 2)
+
+    def test_line_timeout_in_thread(self):
+        """
+        Testing line_timeout flag outside of the main thread (lines are checked only after matching).
+        """
+        results = []
+        lines = ["hub", "a" * 20 + "!"]
+
+        def run():
+            skipped = []
+            results.append(grep(lines, slow_pattern, line_timeout=0.0001, on_skipped_line=lambda l, r, s:
+                                skipped.append(r)))
+            results.append(skipped)
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+        self.assertListEqual(results[1], ['timeout'] * (2 - len(results[0])))
+        self.assertNotIn(lines[1], results[0])
+
+    def test_timeout(self):
+        """
+        Testing timeout flag.
+        """
+        lines = ["hub", slow_line, "bathub"]
+        try:
+            grep(lines, slow_pattern, timeout=0.05)
+            self.fail("GrepTimeout not raised.")
+        except GrepTimeout as e:
+            self.assertEqual(e.line, slow_line)
+
+        # matches returned until timeout are kept
+        values = []
+        try:
+            for value in grep_iter(lines, slow_pattern, timeout=0.05):
+                values.append(value)
+        except GrepTimeout:
+            pass
+        self.assertListEqual(values, ["hub"])
+
+        # every call of a compiled matcher gets a new budget (all calls together take longer than a single budget)
+        matcher = compile(slow_pattern, timeout=0.15, line_timeout=0.03)
+        for _ in range(3):
+            self.assertListEqual(matcher.grep(lines * 2), ["hub", "bathub"] * 2)
+        for _ in range(3):
+            self.assertListEqual(grep(lines * 2, matcher), ["hub", "bathub"] * 2)
+
+    @unittest.skipUnless(hasattr(signal, 'setitimer'), "Requires signal.setitimer.")
+    def test_outer_timer(self):
+        """
+        Testing line timers keep the SIGALRM timer and handler of the application.
+        """
+        class OuterAlarm(Exception):
+            pass
+
+        fired = []
+
+        def handler(signum, frame):
+            fired.append(signum)
+
+        def raising_handler(signum, frame):
+            raise OuterAlarm()
+
+        previous = signal.signal(signal.SIGALRM, handler)
+        try:
+            # outer timer that fires after grep is restored (minus the time grep took) and still fires
+            signal.setitimer(signal.ITIMER_REAL, 0.5)
+            self.assertListEqual(grep(["hub", slow_line], slow_pattern, line_timeout=0.05), ["hub"])
+            self.assertIs(signal.getsignal(signal.SIGALRM), handler)
+            delay = signal.getitimer(signal.ITIMER_REAL)[0]
+            self.assertTrue(0 < delay < 0.5)
+            time.sleep(delay + 0.1)
+            self.assertListEqual(fired, [signal.SIGALRM])
+
+            # outer timer that fires before line budget ends is not replaced
+            signal.signal(signal.SIGALRM, raising_handler)
+            signal.setitimer(signal.ITIMER_REAL, 0.02)
+            self.assertRaises(OuterAlarm, grep, [slow_line], slow_pattern, line_timeout=5)
+            self.assertIs(signal.getsignal(signal.SIGALRM), raising_handler)
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for grepping sequences as a batch.
+"""
+from grepfunc import grep, grep_indices, grep_mask
+from grepfunc import batch
+import unittest
+
+# test file path
+test_file_path = "test.txt"
+
+
+class TestGrepBatch(unittest.TestCase):
+    """
+    Unittests to test grep_indices and grep_mask.
+    """
+    # test words (read from file)
+    with open(test_file_path, 'r') as infile:
+        test_words = [x[:-1] for x in infile.readlines()]
+
+    def test_indices(self):
+        """
+        Testing indices and mask are the same as grep with line numbers.
+        """
+        for pattern, flags in (("hub", {}), ("hub", {'F': True}), ("hub", {'i': True}), ("hub", {'i': True, 'F': True}),
+                               ("hub", {'w': True}), ("hub", {'x': True}), ("hub", {'v': True}), ("h.b", {'m': 2}),
+                               (["dog", "hub"], {'F': True}), ("hottub", {'t': True, 'x': True})):
+            expected = [index for index, line in grep(self.test_words, pattern, n=True, **flags)]
+            self.assertListEqual(expected, grep_indices(self.test_words, pattern, **flags))
+            self.assertListEqual(expected, grep_indices(iter(self.test_words), pattern, **flags))
+            mask = grep_mask(tuple(self.test_words), pattern, **flags)
+            self.assertListEqual(expected, [index for index, matched in enumerate(mask) if matched])
+
+    def test_lines_with_eol(self):
+        """
+        Testing items with end-of-line in them.
+        """
+        self.assertListEqual([0, 2], grep_indices(["a\nhub", "b", "hub\n"], "hub"))
+        self.assertListEqual([1], grep_indices(["a\nhub", "hub", "c"], "^hub$"))
+
+    @unittest.skipIf(batch._np is None, "numpy is not installed")
+    def test_numpy(self):
+        """
+        Testing numpy arrays give the same results as lists.
+        """
+        np = batch._np
+        array = np.array(self.test_words)
+        for pattern, flags in (("hub", {}), ("hub", {'i': True, 'F': True}), ("hub", {'x': True, 'F': True}),
+                               ("hub", {'v': True}), ("h.b", {}), ("hub", {'w': True}), (["dog", "hub"], {'F': True}),
+                               ("hub", {'m': 2})):
+            expected = grep_indices(self.test_words, pattern, **flags)
+            self.assertListEqual(expected, list(grep_indices(array, pattern, **flags)))
+            self.assertListEqual(grep_mask(self.test_words, pattern, **flags), list(grep_mask(array, pattern, **flags)))
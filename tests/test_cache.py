@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for the results cache.
+"""
+from grepfunc import grep, grep_file, ResultCache
+import marshal
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+
+class TestResultCache(unittest.TestCase):
+    """
+    Unittests to test grepping with a ResultCache.
+    """
+    def setUp(self):
+        """
+        Create temp dir with a test file.
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "test.log")
+        self.append("".join("line %d: %s\n" % (i, "error" if i % 3 == 0 else "ok") for i in range(20)))
+
+    def tearDown(self):
+        """
+        Delete temp dir.
+        """
+        shutil.rmtree(self.temp_dir)
+
+    def append(self, content):
+        """
+        Append content to test file.
+        """
+        with open(self.path, 'a') as outfile:
+            outfile.write(content)
+
+    def grep_both(self, cache, pattern, **flags):
+        """
+        Grep test file with cache (both as an opened file and by path), and check results are the same as without it.
+        """
+        with open(self.path, 'r') as infile:
+            expected = grep(infile, pattern, **flags)
+        with open(self.path, 'r') as infile:
+            self.assertEqual(expected, grep(infile, pattern, cache=cache, **flags))
+        self.assertEqual(grep_file(self.path, pattern, **flags), grep_file(self.path, pattern, cache=cache, **flags))
+        return expected
+
+    def test_hits(self):
+        """
+        Testing that identical calls return cached results, and changed files are grepped again.
+        """
+        cache = ResultCache()
+        self.assertEqual(7, len(self.grep_both(cache, "error")))
+        self.assertEqual({'hits': 0, 'tail_hits': 0, 'misses': 2}, dict((k, cache.stats()[k]) for k in
+                                                                       ('hits', 'tail_hits', 'misses')))
+        self.grep_both(cache, "error")
+        self.assertEqual(2, cache.stats()['hits'])
+
+        # different flags are different entries
+        self.grep_both(cache, "error", n=True)
+        self.assertEqual(4, cache.stats()['misses'])
+
+        # rewritten file is grepped again
+        with open(self.path, 'w') as outfile:
+            outfile.write("new error\n")
+        self.assertEqual(['new error'], self.grep_both(cache, "error"))
+        self.assertEqual(6, cache.stats()['misses'])
+
+    def test_append(self):
+        """
+        Testing that when file was only appended to, cached results are reused and only new lines are grepped.
+        """
+        cache = ResultCache()
+        for flags in ({}, {'n': True}, {'b': True}, {'c': True}, {'q': True}, {'m': 9}, {'c': True, 'm': 9},
+                      {'v': True, 'n': True}, {'A': 1, 'n': True}):
+            self.grep_both(cache, "error", **flags)
+        self.append("line 20: error\nline 21: ok\nline 22: error")
+        for flags in ({}, {'n': True}, {'b': True}, {'c': True}, {'q': True}, {'m': 9}, {'c': True, 'm': 9},
+                      {'v': True, 'n': True}, {'A': 1, 'n': True}):
+            self.grep_both(cache, "error", **flags)
+        self.assertEqual(16, cache.stats()['tail_hits'])
+
+        # file didn't end with end-of-line, so last line may still change
+        self.append(" continued\n")
+        self.assertEqual((22, 'line 22: error continued'), self.grep_both(cache, "error", n=True)[-1])
+        self.assertEqual(16, cache.stats()['tail_hits'])
+
+    def test_cache_key(self):
+        """
+        Testing caching other targets by a caller provided key.
+        """
+        cache = ResultCache()
+        self.assertListEqual(['a', 'ab'], grep(['a', 'b', 'ab'], "a", cache=cache, cache_key='v1'))
+        self.assertListEqual(['a', 'ab'], grep(['x'], "a", cache=cache, cache_key='v1'))
+        self.assertListEqual([], grep(['x'], "a", cache=cache, cache_key='v2'))
+        self.assertListEqual(['a'], grep(['a'], "a", cache=cache))
+        self.assertEqual(1, cache.stats()['hits'])
+
+    def test_eviction(self):
+        """
+        Testing least recently used entries are evicted.
+        """
+        cache = ResultCache(max_entries=2)
+        grep(['a'], "a", cache=cache, cache_key=1)
+        grep(['b'], "b", cache=cache, cache_key=2)
+        grep(['a'], "a", cache=cache, cache_key=1)
+        grep(['c'], "c", cache=cache, cache_key=3)
+        self.assertEqual(1, cache.stats()['evictions'])
+        self.assertListEqual(['a'], grep([], "a", cache=cache, cache_key=1))
+        self.assertListEqual([], grep([], "b", cache=cache, cache_key=2))
+
+        # results larger than max size are not cached
+        cache = ResultCache(max_size=100)
+        grep(['a' * 1000], "a", cache=cache, cache_key=1)
+        self.assertEqual(0, cache.stats()['entries'])
+
+    def test_save(self):
+        """
+        Testing saving cache to file and loading it.
+        """
+        cache_path = os.path.join(self.temp_dir, "cache")
+        cache = ResultCache(path=cache_path)
+        self.grep_both(cache, "error")
+        grep(['a'], "a", cache=cache, cache_key='list')
+        cache.save()
+        cache = ResultCache(path=cache_path)
+        self.assertEqual(3, cache.stats()['entries'])
+        self.grep_both(cache, "error")
+        self.assertListEqual(['a'], grep([], "a", cache=cache, cache_key='list'))
+        self.assertEqual(3, cache.stats()['hits'])
+
+        # results of calls with object flags are not saved
+        grep(['a'], "a", cache=cache, cache_key='callback', on_skipped_line=lambda line, reason, seconds: None)
+        self.assertEqual(4, cache.stats()['entries'])
+        cache.save()
+        self.assertEqual(3, ResultCache(path=cache_path).stats()['entries'])
+
+    def test_load_untrusted(self):
+        """
+        Testing loading files that are not cache files doesn't run code from them.
+        """
+        cache_path = os.path.join(self.temp_dir, "cache")
+
+        # pickle that runs code when unpickled
+        with open(cache_path, 'wb') as outfile:
+            pickle.dump(_Exploit(), outfile)
+        self.assertRaises(ValueError, ResultCache().load, cache_path)
+        self.assertEqual(0, ResultCache(path=cache_path).stats()['entries'])
+        self.assertListEqual([], _exploited)
+
+        # cache file with objects that are not plain data (like code)
+        with open(cache_path, 'wb') as outfile:
+            outfile.write(b'GFRCACHE1\n')
+            outfile.write(marshal.dumps([(('key', 1), None, _exploit.__code__, None, None),
+                                         (('key', 2), None, [u'a'], None, None)]))
+        self.assertEqual(1, ResultCache(path=cache_path).stats()['entries'])
+
+        # truncated cache file
+        with open(cache_path, 'wb') as outfile:
+            outfile.write(b'GFRCACHE1\n[')
+        self.assertRaises(ValueError, ResultCache().load, cache_path)
+
+
+# set when the exploit pickle runs code
+_exploited = []
+
+
+def _exploit():
+    _exploited.append(True)
+
+
+class _Exploit(object):
+    """
+    Object that calls _exploit() when unpickled.
+    """
+    def __reduce__(self):
+        return _exploit, ()
+
+
+if __name__ == '__main__':
+    unittest.main()
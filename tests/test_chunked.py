@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for grepping targets that produce lines in batches.
+"""
+from grepfunc import grep, grep_batches, grep_batches_iter, GrepStats
+from grepfunc import chunked
+import unittest
+
+# test file path
+test_file_path = "test.txt"
+
+
+class TestGrepBatches(unittest.TestCase):
+    """
+    Unittests to test grep_batches and grep_batches_iter.
+    """
+    # test words (read from file)
+    with open(test_file_path, 'r') as infile:
+        test_words = [x[:-1] for x in infile.readlines()]
+
+    # flags to test
+    flags_list = [{}, {'n': True}, {'i': True, 'n': True}, {'w': True}, {'v': True, 'n': True}, {'o': True, 'n': True},
+                  {'o': True, 'all_matches': True, 'n': True}, {'b': True}, {'A': 1, 'B': 2, 'n': True},
+                  {'A': 2, 'merge_context': True, 'group_separator': '--'}, {'t': True, 'x': True}, {'m': 3, 'n': True},
+                  {'m': 2, 'A': 1}, {'c': True}, {'c': True, 'm': 2}, {'q': True}, {'F': True, 'n': True}]
+
+    def __batches(self, size, eol=False):
+        """
+        Split test words to lists of lines.
+        """
+        lines = [word + "\n" for word in self.test_words] if eol else self.test_words
+        return [lines[i:i + size] for i in range(0, len(lines), size)]
+
+    def __blocks(self, size):
+        """
+        Split test words to text blocks (lines are split between blocks).
+        """
+        text = "\n".join(self.test_words) + "\n"
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+    def test_same_as_grep(self):
+        """
+        Testing batches of lines and text blocks return the same as grep() on all lines.
+        """
+        for flags in self.flags_list:
+            pattern = ["hub", "dog"] if flags.get('F') else "h.b" if not flags.get('t') else "hottub"
+            expected = grep(self.test_words, pattern, **flags)
+            for batches in (self.__batches(1), self.__batches(7), self.__batches(7, eol=True), self.__blocks(5),
+                            self.__blocks(64), [self.test_words]):
+                self.assertEqual(expected, grep_batches(batches, pattern, **flags))
+
+    def test_iter(self):
+        """
+        Testing matches are returned batch by batch, with global line numbers.
+        """
+        batches = [["foo", "bar"], ["bar", "baz"], [], ["foo"], ["bar"]]
+        self.assertEqual([[(1, "bar")], [(2, "bar")], [(5, "bar")]], list(grep_batches_iter(batches, "bar", n=True)))
+        self.assertEqual([[["bar", "bar"], ["bar", "baz"]]], list(grep_batches_iter(batches, "bar", A=1, m=2)))
+        self.assertEqual([], list(grep_batches_iter([], "bar")))
+
+    def test_blocks(self):
+        """
+        Testing text blocks with lines split between blocks, and a last line without end-of-line.
+        """
+        blocks = ["foo b", "ar\nba", "", "z\n", "bar"]
+        self.assertEqual([(0, "foo bar"), (2, "bar")], grep_batches(blocks, "bar", n=True))
+        self.assertEqual(["foo bar\n", "bar"], grep_batches(blocks, "bar", keep_eol=True))
+        self.assertEqual([(0, "foo bar"), (1, "baz"), (2, "bar")], grep_batches(blocks + [["qux"]], "ba", n=True))
+
+    def test_merge_context_max_count(self):
+        """
+        Testing the last group of merged contexts is returned after reaching max_count.
+        """
+        self.assertEqual([['a', 'b']], grep_batches([['a', 'b', 'c']], 'a', A=1, m=1, merge_context=True))
+        self.assertEqual([['a', 'b']], grep_batches(["a\nb\nc\n"], 'a', A=1, m=1, merge_context=True))
+        for flags in ({'A': 1, 'm': 2, 'merge_context': True, 'group_separator': '--'},
+                      {'B': 1, 'm': 1, 'merge_context': True}, {'A': 2, 'B': 1, 'm': 3, 'merge_context': True, 'n': True}):
+            expected = grep(self.test_words, "h.b", **flags)
+            for batches in (self.__batches(1), self.__batches(7), self.__blocks(5), [self.test_words]):
+                self.assertEqual(expected, grep_batches(batches, "h.b", **flags))
+
+    def test_callable(self):
+        """
+        Testing a function is called for batches until it returns an empty batch.
+        """
+        rows = iter([["a1", "b1"], ["a2"], [], ["a3"]])
+        self.assertEqual(["a1", "a2"], grep_batches(lambda: next(rows), "a"))
+        self.assertEqual([["a3"]], list(grep_batches_iter(lambda: next(rows, None), "a")))
+
+    def test_stops_reading(self):
+        """
+        Testing batches are not read after reaching max_count.
+        """
+        read = [0]
+
+        def batches():
+            for i in range(1000):
+                read[0] += 1
+                yield ("line %d" % j for j in range(i * 100, i * 100 + 100))
+
+        self.assertEqual(["line 1", "line 10"], grep_batches(batches(), "line 1", m=2))
+        self.assertEqual(1, read[0])
+        self.assertTrue(grep_batches(batches(), "line 5", q=True))
+
+    def test_dense_candidates(self):
+        """
+        Testing batches with many candidates (matched line by line) return the same as sparse ones.
+        """
+        lines = ["line %d %s" % (i, "fail" if i % 3 else "ok") for i in range(3000)]
+        batches = [lines[i:i + 100] for i in range(0, len(lines), 100)]
+        for pattern in ("fail", "ok", "line 1"):
+            self.assertEqual(grep(lines, pattern, n=True), grep_batches(batches, pattern, n=True))
+            self.assertEqual(grep(lines, pattern, c=True), grep_batches(batches, pattern, c=True))
+
+        # block search is tried again after a few batches
+        density = chunked._Density()
+        density.update(50, 100)
+        self.assertEqual([False] * chunked.DENSE_SKIP_BATCHES + [True],
+                         [density.search_block() for _ in range(chunked.DENSE_SKIP_BATCHES + 1)])
+
+    def test_bytes_and_binary(self):
+        """
+        Testing bytes batches, encoding and binary_files flags.
+        """
+        batches = [b"head\x00\nerror 1\n", [b"ok\n", b"error 2\n"]]
+        self.assertEqual([b"error 1", b"error 2"], grep_batches(batches, b"error"))
+        self.assertEqual([(1, u"error 1"), (3, u"error 2")], grep_batches(batches, b"error", encoding='utf-8', n=True))
+        self.assertEqual(['Binary file matches'], grep_batches(batches, b"error", binary_files='binary'))
+        self.assertEqual([], grep_batches(batches, b"error", binary_files='without-match'))
+        self.assertEqual(0, grep_batches(batches, b"error", binary_files='without-match', c=True))
+        self.assertRaises(ValueError, grep_batches, batches, b"error", compact=True)
+
+    def test_stats(self):
+        """
+        Testing stats count batches and lines.
+        """
+        stats = GrepStats()
+        grep_batches(self.__batches(10), "hub", stats=stats)
+        self.assertEqual(len(self.test_words), stats.lines)
+        self.assertEqual(len(self.__batches(10)), stats.blocks)
+
+
+if __name__ == '__main__':
+    unittest.main()
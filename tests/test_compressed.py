@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for grepping compressed files.
+"""
+from grepfunc import grep_file, grep_file_iter, grep_paths, build_index
+from grepfunc import compressed
+import gzip
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import zlib
+
+# bz2 and lzma are optional modules
+try:
+    import bz2
+except ImportError:
+    bz2 = None
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+
+def gzip_compress(data):
+    """
+    Compress data as a single gzip member (gzip.compress() is not available in python 2).
+    """
+    out = io.BytesIO()
+    with gzip.GzipFile(fileobj=out, mode='wb') as outfile:
+        outfile.write(data)
+    return out.getvalue()
+
+
+class TestCompressed(unittest.TestCase):
+    """
+    Unittests to test grepping gzip, bz2 and xz files.
+    """
+    # test data: every 13th line is an error
+    lines = ["line %d: %s" % (i, "error found" if i % 13 == 0 else "all good") for i in range(3000)]
+    data = ("\n".join(lines) + "\n").encode('utf-8')
+
+    def setUp(self):
+        """
+        Create temp dir with the plain test file, and compressors to test.
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.plain = self.write_file(self.data, 'plain.log')
+        self.compressors = [('gz', gzip_compress)]
+        if bz2 is not None:
+            self.compressors.append(('bz2', bz2.compress))
+        if lzma is not None:
+            self.compressors.append(('xz', lzma.compress))
+
+    def tearDown(self):
+        """
+        Delete temp dir.
+        """
+        shutil.rmtree(self.temp_dir)
+
+    def write_file(self, content, name):
+        """
+        Write a test file and return its path.
+        """
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'wb') as outfile:
+            outfile.write(content)
+        return path
+
+    def write_compressed(self, ext, compress, members=1):
+        """
+        Write test data compressed, as a given number of concatenated members.
+        """
+        size = len(self.data) // members + 1
+        content = b''.join(compress(self.data[i:i + size]) for i in range(0, len(self.data), size))
+        return self.write_file(content, 'test%d.log.%s' % (members, ext))
+
+    def test_detect(self):
+        """
+        Testing detecting compression format.
+        """
+        for ext, compress in self.compressors:
+            with open(self.write_compressed(ext, compress), 'rb') as infile:
+                self.assertEqual({'gz': 'gzip'}.get(ext, ext), compressed._detect(infile))
+                self.assertEqual(0, infile.tell())
+        with open(self.plain, 'rb') as infile:
+            self.assertIsNone(compressed._detect(infile))
+
+    def test_same_results(self):
+        """
+        Testing results are the same as grepping the plain file, for single and multiple members files.
+        """
+        for ext, compress in self.compressors:
+            for members in (1, 7):
+                path = self.write_compressed(ext, compress, members)
+                for flags in ({}, {'n': True}, {'A': 2, 'B': 3}, {'b': True}, {'m': 5}, {'v': True, 'n': True},
+                              {'c': True}, {'o': True, 'n': True, 'A': 1}):
+                    expected = grep_file(self.plain, "error", **flags)
+                    self.assertEqual(expected, grep_file(path, "error", **flags))
+                    self.assertEqual(expected, grep_file(path, "error", workers=2, chunk_size=1024, **flags))
+
+    def test_small_blocks(self):
+        """
+        Testing lines and context split between decompressed blocks.
+        """
+        path = self.write_compressed('gz', gzip_compress, 40)
+        with open(path, 'rb') as infile:
+            blocks = list(compressed._decompress_blocks(infile, 'gzip', read_size=64))
+        self.assertTrue(len(blocks) > 40)
+        self.assertEqual(self.data, b''.join(blocks))
+        expected = grep_file(self.plain, "error", n=True, A=3, B=3)
+        self.assertEqual(expected, grep_file(path, "error", n=True, A=3, B=3))
+
+    def test_iter_and_paths(self):
+        """
+        Testing grep_file_iter() and grep_paths() with compressed files.
+        """
+        path = self.write_compressed('gz', gzip_compress, 3)
+        self.assertEqual(grep_file(self.plain, "error"), list(grep_file_iter(path, "error")))
+        result = grep_paths(self.temp_dir, "line 26:", workers=1)
+        self.assertEqual([(self.plain, 26, "line 26: error found"), (path, 26, "line 26: error found")],
+                         sorted(result))
+
+    def test_index(self):
+        """
+        Testing compressed files are always grepped whole with an index.
+        """
+        path = self.write_compressed('gz', gzip_compress, 2)
+        index = build_index(os.path.join(self.temp_dir, 'test.idx'), [path, self.plain], workers=1)
+        try:
+            self.assertIn(os.path.abspath(path), index.candidate_files("line 26: error"))
+            self.assertEqual(["line 26: error found"], grep_file(path, "line 26: error", index=index))
+        finally:
+            index.close()
+
+    @unittest.skipUnless(hasattr(zlib.decompressobj(), 'eof'), "Python 2 zlib can't detect truncated files.")
+    def test_truncated(self):
+        """
+        Testing truncated files raise an error.
+        """
+        content = gzip_compress(self.data)
+        path = self.write_file(content[:len(content) // 2], 'truncated.log.gz')
+        self.assertRaises(EOFError, grep_file, path, "error")
+
+
+if __name__ == '__main__':
+    unittest.main()
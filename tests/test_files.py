@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for grepping files by path.
+"""
+from grepfunc import grep, grep_file, grep_file_iter, grep_paths, grep_paths_iter
+import os
+import shutil
+import tempfile
+import unittest
+
+# test file path
+test_file_path = "test.txt"
+
+
+class TestGrepFile(unittest.TestCase):
+    """
+    Unittests to test grep_file.
+    """
+    # test words (read from file)
+    with open(test_file_path, 'r') as infile:
+        test_words = [x[:-1] for x in infile.readlines()]
+
+    def setUp(self):
+        """
+        Create temp dir for test files.
+        """
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """
+        Delete temp dir.
+        """
+        shutil.rmtree(self.temp_dir)
+
+    def write_file(self, content, name="test.txt"):
+        """
+        Write a test file and return its path.
+        """
+        path = os.path.join(self.temp_dir, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as outfile:
+            outfile.write(content.encode('utf-8'))
+        return path
+
+    def test_same_as_grep(self):
+        """
+        Testing that grep_file returns the same results as grep, for different flags.
+        """
+        for flags in ({}, {'F': True}, {'i': True}, {'i': True, 'F': True}, {'w': True}, {'x': True, 'F': True},
+                      {'n': True}, {'o': True, 'i': True}, {'A': 2, 'B': 1, 'n': True}, {'v': True}, {'t': True},
+                      {'c': True}, {'q': True}, {'m': 2}, {'v': True, 'w': True, 'x': True}):
+            self.assertEqual(grep(self.test_words, "hub", **flags), grep_file(test_file_path, "hub", **flags))
+            self.assertEqual(grep(self.test_words, "h.b", **flags), grep_file(test_file_path, "h.b", **flags))
+            self.assertEqual(grep(self.test_words, r"\w+b$", **flags), grep_file(test_file_path, r"\w+b$", **flags))
+        self.assertListEqual(['dog', 'blue hub'], grep_file(test_file_path, ["dog", "blue"], F=True))
+        self.assertListEqual(['chubby\n', 'hub\n', 'blue hub\n'], grep_file(test_file_path, "hub", k=True))
+        self.assertListEqual(['chubby', 'hub', 'blue hub'], list(grep_file_iter(test_file_path, "hub")))
+
+    def test_byte_offset(self):
+        """
+        Testing byte offset is the offset in file.
+        """
+        path = self.write_file(u"first\r\nsecond hub\nthird\nשלום hub\n  hub")
+        self.assertListEqual([(14, u'second hub'), (33, u'שלום hub'), (39, u'hub')], grep_file(path, "hub", b=True, t=True))
+        self.assertListEqual([(14, 'hub'), (33, 'hub'), (39, 'hub')], grep_file(path, "hub", b=True, o=True, F=True))
+        self.assertListEqual([(0, 'first'), (18, 'third')], grep_file(path, "hub", b=True, v=True))
+
+    def test_unicode(self):
+        """
+        Testing files with non-ascii characters, and patterns that behave differently on bytes.
+        """
+        lines = [u"naïve café", u"İstanbul", u"Kelvin", u"x١٢y", u"über alles", u"a-é"]
+        path = self.write_file(u"\n".join(lines) + u"\n")
+        for pattern, flags in ((u"caf.", {}), (u"na.ve", {}), (u"i", {'i': True, 'F': True}),
+                               (u"k", {'i': True, 'F': True}), (u"x\\d+y", {}), (u"r\\s+a", {}),
+                               (u"café", {'w': True}), (u"-\\b", {}), (u"İ", {'i': True}), (u"\\w+e", {'o': True})):
+            self.assertListEqual(grep(lines, pattern, **flags), grep_file(path, pattern, **flags))
+
+    def test_dense_matches(self):
+        """
+        Testing switching to checking every line when matches are dense.
+        """
+        lines = [u"line %d %s" % (i, u"hub" if i % 3 else u"dog") for i in range(5000)]
+        path = self.write_file(u"\n".join(lines))
+        self.assertListEqual(grep(lines, "hub", n=True), grep_file(path, "hub", n=True))
+        self.assertListEqual(grep(lines, "dog", A=1, B=1), grep_file(path, "dog", A=1, B=1))
+
+    def test_empty_file(self):
+        """
+        Testing empty file.
+        """
+        path = self.write_file(u"")
+        self.assertListEqual([], grep_file(path, "hub"))
+        self.assertListEqual(['hub'], grep_file(self.write_file(u"hub", "no_eol.txt"), "^hub$"))
+
+    def test_bad_encoding(self):
+        """
+        Testing non ascii-compatible encoding.
+        """
+        self.assertRaises(ValueError, grep_file, test_file_path, "hub", encoding='utf-16')
+
+    def test_grep_paths(self):
+        """
+        Testing grep on multiple files and directories.
+        """
+        a = self.write_file(u"hub\ndog\nblue hub\n", "a.log")
+        b = self.write_file(u"cat\nhub\n", os.path.join("sub", "b.log"))
+        c = self.write_file(u"hub", os.path.join("sub", "c.txt"))
+        expected = [(a, 0, 'hub'), (a, 2, 'blue hub'), (b, 1, 'hub'), (c, 0, 'hub')]
+        for workers in (1, 2):
+            self.assertListEqual(expected, sorted(grep_paths(self.temp_dir, "hub", workers=workers)))
+            self.assertListEqual(expected[:3], sorted(grep_paths(self.temp_dir, "hub", workers=workers, include=["*.log"])))
+            self.assertListEqual(expected[:2], sorted(grep_paths(self.temp_dir, "hub", workers=workers, recursive=False)))
+            self.assertListEqual(expected[2:], sorted(grep_paths([b, os.path.join(self.temp_dir, "*", "*.txt")], "hub",
+                                                                 workers=workers)))
+            self.assertListEqual(expected[:2] + expected[3:],
+                                 sorted(grep_paths(self.temp_dir, "hub", workers=workers, exclude=["b.*"])))
+            self.assertListEqual([(b, 0, ['cat', 'hub'])], grep_paths(self.temp_dir, "cat", workers=workers, A=1))
+            self.assertEqual(4, grep_paths(self.temp_dir, "hub", workers=workers, c=True))
+            self.assertEqual(2, grep_paths(self.temp_dir, "hub", workers=workers, c=True, m=2))
+            self.assertEqual(True, grep_paths(self.temp_dir, "dog", workers=workers, q=True))
+            self.assertEqual(False, grep_paths(self.temp_dir, "wrong", workers=workers, q=True))
+            self.assertEqual(1, len(list(grep_paths_iter(self.temp_dir, "hub", workers=workers, m=1))))
+
+    def test_parallel_chunks(self):
+        """
+        Testing grep of a single file split into chunks and grepped by multiple processes.
+        """
+        lines = [u"line %d %s" % (i, u"hub" if i % 7 == 0 else u"dog") for i in range(300)]
+        path = self.write_file(u"\n".join(lines))
+        for flags in ({'n': True}, {'b': True}, {'A': 3, 'B': 3, 'n': True}, {'v': True, 'c': True}, {'m': 10},
+                      {'q': True}):
+            self.assertEqual(grep_file(path, "hub", **flags), grep_file(path, "hub", workers=2, chunk_size=100, **flags))
+
+    @unittest.skipIf(bytes is str, "Python 2 has no separate bytes type.")
+    def test_bytes_pattern(self):
+        """
+        Testing grep of a file with bytes patterns, which match lines without decoding them.
+        """
+        lines = [u"line %d %s" % (i, u"Hub größe" if i % 7 == 0 else u"dog") for i in range(300)]
+        path = self.write_file(u"\r\n".join(lines) + u"\n")
+        for pattern, flags in (("hub", {'i': True}), ("Hub", {'F': True, 'n': True}), (["Hub", "line 5"], {'F': True}),
+                               (r"line \d+ H", {'b': True}), (r"g\S+", {'o': True}), ("Hub", {'A': 2, 'B': 1}),
+                               ("Hub", {'v': True, 'c': True}), ("dog", {'x': True}), ("Hub", {'w': True, 'm': 3})):
+            expected = grep_file(path, pattern, **flags)
+            bytes_pattern = pattern.encode('utf-8') if not isinstance(pattern, list) else \
+                [p.encode('utf-8') for p in pattern]
+            self.assertEqual(expected, grep_file(path, bytes_pattern, encoding='utf-8', **flags))
+            self.assertEqual(expected, grep_file(path, bytes_pattern, encoding='utf-8', workers=2, chunk_size=500,
+                                                 **flags))
+
+        # without encoding lines are returned as bytes (and \w only matches ascii)
+        self.assertListEqual([(0, u"line 0 Hub größe".encode('utf-8'))], grep_file(path, b"Hub", n=True, m=1))
+        self.assertListEqual([b"gr"], grep_file(path, br"g\w+", o=True, m=1))
+
+    def test_binary_files(self):
+        """
+        Testing binary_files flag with files.
+        """
+        a = self.write_file(u"hub\ndog\n", "a.log")
+        b = self.write_file(u"x\x00y\nblue hub\n", "b.log")
+        for workers in (1, 2):
+            self.assertListEqual([(a, 0, 'hub'), (b, 1, 'blue hub')],
+                                 sorted(grep_paths(self.temp_dir, "hub", workers=workers)))
+            self.assertListEqual([(a, 0, 'hub'), (b, 1, 'Binary file matches')],
+                                 sorted(grep_paths(self.temp_dir, "hub", workers=workers, binary_files='binary')))
+            self.assertListEqual([(a, 0, b'hub')],
+                                 sorted(grep_paths(self.temp_dir, b"hub", workers=workers, binary_files='without-match')))
+        self.assertEqual(1, grep_file(b, "hub", binary_files='binary', c=True))
+        self.assertEqual(0, grep_file(b, "hub", binary_files='without-match', c=True))
+        self.assertListEqual([], grep_file(b, "dog", binary_files='binary'))
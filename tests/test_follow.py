@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for following growing files.
+"""
+from grepfunc import grep, grep_follow, FollowCheckpoint
+from grepfunc import follow
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+
+class TestFollow(unittest.TestCase):
+    """
+    Unittests to test grep_follow and checkpoints.
+    """
+    # test lines: every 7th line is an error
+    lines = ["line %d: %s" % (i, "error found" if i % 7 == 0 else "all good") for i in range(500)]
+    data = ("\n".join(lines) + "\n").encode('utf-8')
+
+    def setUp(self):
+        """
+        Create temp dir with an empty log file.
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'app.log')
+        self.write(b'', 'wb')
+
+    def tearDown(self):
+        """
+        Delete temp dir.
+        """
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, content, mode='ab'):
+        """
+        Write (or append) to the log file.
+        """
+        with open(self.path, mode) as outfile:
+            outfile.write(content)
+
+    def test_whole_file(self):
+        """
+        Testing following until end of file returns the same as grep.
+        """
+        self.write(self.data + b"error without end-of-line")
+        lines = self.lines + ["error without end-of-line"]
+        for flags in ({}, {'n': True}, {'A': 2, 'B': 1}, {'v': True, 'm': 5}, {'o': True, 'i': True}, {'k': True}):
+            expected = grep(lines, "ERROR" if flags.get('i') else "error", **flags)
+            if flags.get('k'):
+                expected = [line + "\n" for line in expected[:-1]] + expected[-1:]
+            self.assertEqual(expected, list(grep_follow(self.path, "error", follow=False, **flags)))
+        self.assertEqual([b"error without end-of-line"], list(grep_follow(self.path, b"without", follow=False)))
+
+    def test_resume(self):
+        """
+        Testing resuming from saved checkpoints returns the same matches as a single run.
+        """
+        checkpoint_path = os.path.join(self.temp_dir, 'checkpoint.json')
+        data = self.data + b"end\n" * 3
+        old_read_size = follow.READ_SIZE
+        try:
+            follow.READ_SIZE = 50
+            for flags in ({'n': True}, {'A': 3, 'n': True}, {'B': 2, 'A': 1}):
+                self.write(b'', 'wb')
+                FollowCheckpoint().save(checkpoint_path)
+                ret = []
+                for start in range(0, len(data), 333):
+
+                    # append some data (lines are split between runs), and grep it from the last checkpoint
+                    self.write(data[start:start + 333])
+                    checkpoint = FollowCheckpoint.load(checkpoint_path)
+                    ret.extend(grep_follow(self.path, "error", follow=False, checkpoint=checkpoint, **flags))
+                    checkpoint.save(checkpoint_path)
+
+                self.assertEqual(grep(self.lines + ["end"] * 3, "error", **flags), ret)
+        finally:
+            follow.READ_SIZE = old_read_size
+
+    def test_checkpoint(self):
+        """
+        Testing checkpoint values and serialization.
+        """
+        self.write(b"a\nb\r\nerror\nc\nd")
+        checkpoint = FollowCheckpoint()
+        self.assertEqual([["a", "b", "error"]],
+                         list(grep_follow(self.path, "error", B=2, follow=False, checkpoint=checkpoint)))
+        self.assertEqual(os.stat(self.path).st_ino, checkpoint.inode)
+        self.assertEqual((14, 4, b"d", [b"error", b"c"]),
+                         (checkpoint.offset, checkpoint.line, checkpoint.partial, checkpoint.context))
+        self.assertEqual(checkpoint.as_dict(), FollowCheckpoint.from_dict(checkpoint.as_dict()).as_dict())
+
+        # file truncated or replaced since checkpoint: start from its beginning
+        self.write(b"error 2\n", 'wb')
+        self.assertEqual(["error 2"], list(grep_follow(self.path, "error", follow=False, checkpoint=checkpoint)))
+        os.rename(self.path, self.path + '.1')
+        self.write(b"x\nerror 3 and more data\n", 'wb')
+        self.assertEqual([(1, "error 3 and more data")],
+                         list(grep_follow(self.path, "error", n=True, follow=False, checkpoint=checkpoint)))
+
+    def test_follow(self):
+        """
+        Testing following lines appended to file, and file rotation.
+        """
+        def write_log():
+            time.sleep(0.1)
+            self.write(b"error 1\nok\nerror 2")
+            time.sleep(0.1)
+            os.rename(self.path, self.path + '.1')
+            self.write(b"error 3\n", 'wb')
+
+        writer = threading.Thread(target=write_log)
+        writer.start()
+        ret = list(grep_follow(self.path, "error", n=True, poll_interval=0.01, idle_timeout=0.5))
+        writer.join()
+        self.assertEqual([(0, "error 1"), (2, "error 2"), (0, "error 3")], ret)
+
+        # missing file without follow returns nothing
+        self.assertEqual([], list(grep_follow(self.path + '.2', "error", follow=False)))
+
+
+if __name__ == '__main__':
+    unittest.main()
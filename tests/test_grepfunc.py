@@ -4,6 +4,8 @@
 Tests for the file filters.
 """
 from grepfunc import grep, grep_iter
+import grepfunc
+import io
 import unittest
 
 # test file path
@@ -212,3 +214,181 @@ class TestGrep(unittest.TestCase):
         # combined with after-context
         for title, source in self.get_sources():
             self.assertListEqual([['hub', 'Hub', 'dog', 'hottub  ']], grep(source, "dog", B=2, A=1))
+
+    def test_compile(self):
+        """
+        Testing precompiled matcher.
+        """
+        for title, source in self.get_sources():
+
+            # basic compiled patterns
+            self.assertListEqual(['chubby', 'hub', 'blue hub'], grepfunc.compile("hub").grep(source))
+            self.assertListEqual(['chubby', 'hub', 'blue hub'], list(grepfunc.compile("hub", F=True).grep_iter(source)))
+            self.assertEqual(5, grepfunc.compile("hub", i=True).count(source))
+            self.assertEqual(2, grepfunc.compile("hub", i=True, m=2).count(source))
+            self.assertEqual(True, grepfunc.compile("dog", F=True).quiet(source))
+            self.assertEqual(False, grepfunc.compile("wrong").quiet(source))
+
+            # compiled pattern passed to grep, with additional flags
+            matcher = grepfunc.compile("hub", i=True, F=True)
+            self.assertListEqual(['chubby', 'hub', 'Hub', 'green HuB.', 'blue hub'], grep(source, matcher))
+            self.assertListEqual([(0, 'chubby'), (1, 'hub')], grep(source, matcher, n=True, m=2))
+            self.assertListEqual(['dog', 'hottub  '], grep(source, matcher, v=True))
+
+            # all flags combinations of words / line / invert should be the same for regex and fixed strings
+            for flags in ({'w': True}, {'x': True}, {'w': True, 'v': True}, {'x': True, 'i': True, 'v': True}):
+                self.assertListEqual(grep(source, "hub", **flags), grepfunc.compile("hub", F=True, **flags).grep(source))
+
+    def test_fixed_strings_list_flags(self):
+        """
+        Testing list of fixed strings with additional flags.
+        """
+        for title, source in self.get_sources():
+            self.assertListEqual(['hub', 'Hub', 'dog', 'green HuB.', 'blue hub'],
+                                 grep(source, ["dog", "hub"], F=True, i=True, w=True))
+            self.assertListEqual([(0, 'hub'), (0, 'dog')], grep(source, ["dog", "hub"], F=True, b=True, m=2, w=True))
+
+    def test_block_size(self):
+        """
+        Testing block scan mode returns the same results as scanning line by line.
+        """
+        text = "\n".join(self.test_list) + "\n"
+        for block_size in (1, 5, 1024):
+            for flags in ({}, {'F': True}, {'i': True}, {'i': True, 'F': True}, {'w': True}, {'x': True, 'F': True},
+                          {'n': True}, {'b': True, 'o': True}, {'A': 2, 'B': 1, 'n': True}, {'v': True}):
+                expected = grep(self.test_list, "hub", **flags)
+                self.assertListEqual(expected, grep(self.test_file, "hub", block_size=block_size, **flags))
+                self.assertListEqual(expected, grep(text, "hub", block_size=block_size, **flags))
+            self.assertListEqual(['dog', 'green HuB.'], grep(self.test_file, ["dog", "green"], F=True, block_size=block_size))
+            self.assertListEqual([['Hub', 'dog', 'hottub  ']], grep(self.test_file, "^d.g$", A=1, B=1, block_size=block_size))
+            self.assertListEqual(['hottub'], grep(self.test_file, "hottub", t=True, block_size=block_size))
+
+        # string without end of line at the end
+        self.assertListEqual([(2, 'last')], grep("first\nsecond\nlast", "last", n=True, block_size=4))
+
+    def test_context_following_matches(self):
+        """
+        Testing trailing context doesn't skip following matches, on any input type.
+        """
+        lines = ['a', 'x', 'b', 'x', 'c', 'd', 'e', 'x', 'f', 'g', 'h', 'x']
+        expected = [['x', 'b'], ['x', 'c'], ['x', 'f'], ['x']]
+        self.assertListEqual(expected, grep(lines, "x", A=1))
+        self.assertListEqual(expected, grep(iter(lines), "x", A=1))
+        self.assertListEqual(expected, list(grep_iter((x for x in lines), "x", A=1)))
+        self.assertListEqual([(1, ['a', 'x', 'b']), (3, ['b', 'x', 'c'])], grep(iter(lines), "x", A=1, B=1, n=True, m=2))
+
+        # test file
+        for title, source in self.get_sources():
+            self.assertListEqual([['hub', 'Hub'], ['blue hub']], grep(source, "hub", A=1, m=3)[1:])
+
+    def test_merge_context(self):
+        """
+        Testing merging overlapping contexts into groups.
+        """
+        lines = ['a', 'x', 'b', 'x', 'c', 'd', 'e', 'x', 'f', 'g', 'h', 'x']
+        self.assertListEqual([['a', 'x', 'b', 'x', 'c'], '--', ['e', 'x', 'f'], '--', ['h', 'x']],
+                             grep(iter(lines), "x", A=1, B=1, merge_context=True, group_separator='--'))
+        self.assertListEqual([['x', 'b', 'x', 'c'], ['x', 'f'], ['x']], grep(lines, "x", A=1, merge_context=True))
+        self.assertListEqual([(0, ['a', 'x', 'b', 'x']), (6, ['e', 'x']), (10, ['h', 'x'])],
+                             grep(lines, "x", B=1, n=True, merge_context=True))
+        self.assertListEqual([['x', 'b', 'x', 'c']], grep(lines, "x", A=1, m=2, merge_context=True))
+
+        # adjacent contexts are merged too
+        self.assertListEqual([['x', 'b', 'c', 'x']], grep(['x', 'b', 'c', 'x'], "x", A=1, B=1, merge_context=True))
+
+        # test file
+        for title, source in self.get_sources():
+            self.assertListEqual([['chubby', 'hub', 'Hub'], ['blue hub']], grep(source, "hub", A=1, merge_context=True))
+            self.assertEqual(3, grep(source, "hub", A=1, c=True, merge_context=True))
+
+    def test_max_count_stops_reading(self):
+        """
+        Testing grep_iter stops reading target after max_count matches (and their trailing context).
+        """
+        lines = iter(['a', 'x', 'b', 'x', 'c', 'x'])
+        self.assertListEqual(['x'], list(grep_iter(lines, "x", m=1)))
+        self.assertListEqual(['b', 'x', 'c', 'x'], list(lines))
+
+        lines = iter(['a', 'x', 'b', 'x', 'c', 'x'])
+        self.assertListEqual([['x', 'b']], list(grep_iter(lines, "x", m=1, A=1)))
+        self.assertListEqual(['x', 'c', 'x'], list(lines))
+
+        # test block mode
+        for title, source in self.get_sources():
+            self.assertListEqual([(0, ['chubby', 'hub'])], list(grep_iter(source, "hub", m=1, A=1, n=True)))
+            self.assertListEqual(['chubby', 'hub'], list(grep_iter(self.test_file, "hub", m=2, block_size=4)))
+
+    def test_count_fast_path(self):
+        """
+        Testing count and quiet flags with all kind of sources return the same as counting grep_iter results.
+        """
+        text = "\n".join(self.test_list) + "\n"
+        for flags in ({}, {'F': True}, {'i': True}, {'w': True}, {'x': True, 'F': True}, {'v': True}, {'t': True},
+                      {'k': True}, {'m': 2}, {'i': True, 'm': 4}):
+            expected = len(grep(self.test_file, "hub", **flags))
+            self.assertEqual(expected, grep(self.test_file, "hub", c=True, **flags))
+            self.assertEqual(expected, grep(text, "hub", c=True, block_size=5, **flags))
+            self.assertEqual(expected, grepfunc.compile("hub", **flags).count(self.test_file))
+            self.assertEqual(expected > 0, grep(self.test_file, "hub", q=True, **flags))
+
+        # string without block_size is a single line
+        self.assertEqual(1, grep(text, "hub", c=True))
+        self.assertEqual(False, grep(text, "wrong", q=True))
+
+    @unittest.skipIf(bytes is str, "Python 2 has no separate bytes type.")
+    def test_bytes(self):
+        """
+        Testing bytes patterns and targets return the same as text, for all kind of sources and flags.
+        """
+        text = "\n".join(self.test_list) + "\n"
+        data = text.encode('utf-8')
+        sources = [lambda: data.split(b"\n")[:-1], lambda: io.BytesIO(data), lambda: iter(data.split(b"\n")[:-1])]
+        for pattern, flags in (("hub", {}), ("hub", {'F': True}), (["hub", "dog"], {'F': True}), ("HUB", {'i': True}),
+                               (r"h\w+", {'n': True}), ("hub", {'w': True}), ("hub", {'x': True, 'v': True}),
+                               ("hub", {'A': 1, 'B': 2}), ("hub", {'o': True, 'b': True}), ("hub", {'t': True}),
+                               ("hub", {'A': 1, 'merge_context': True}), ("hub", {'c': True}), ("hub", {'q': True})):
+            expected = grep(io.StringIO(text), pattern, **flags)
+            bytes_pattern = pattern.encode('utf-8') if isinstance(pattern, str) else [p.encode('utf-8') for p in pattern]
+            for source in sources:
+                self.assertEqual(expected, grep(source(), bytes_pattern, encoding='utf-8', **flags))
+            self.assertEqual(expected, grep(io.BytesIO(data), bytes_pattern, block_size=7, encoding='utf-8', **flags))
+
+        # without encoding lines are returned as bytes
+        self.assertListEqual([b'hub', b'blue hub'], grep(io.BytesIO(data), b"hub", w=True))
+        self.assertListEqual([b'hub'], grep(b'hub', b"hub"))
+        self.assertListEqual([b'hub\n', b'blue hub\n'], grep(io.BytesIO(data), b"hub", w=True, k=True))
+
+        # ignoring case of bytes only folds ascii letters
+        self.assertListEqual([b'\xc3\x84 A'], grep([b'\xc3\x84 A', b'\xc3\xa4 b'], b"\xc3\x84 a", i=True))
+
+    def test_empty_fixed_strings(self):
+        """
+        Testing an empty list of fixed strings never matches, for text and bytes lines.
+        """
+        for source in (["hub", "dog"], [b"hub", b"dog"]):
+            self.assertListEqual([], grep(source, [], F=True))
+            self.assertListEqual([], grep(iter(source), [], F=True, n=True))
+            self.assertListEqual([], grep(source, (), F=True, i=True))
+            self.assertListEqual(source, grep(source, [], F=True, v=True))
+            self.assertEqual(0, grep(source, [], F=True, c=True))
+            self.assertEqual(False, grep(source, [], F=True, q=True))
+        self.assertListEqual([], grep("hub\ndog\n", [], F=True, block_size=4))
+
+    def test_binary_files(self):
+        """
+        Testing binary_files flag.
+        """
+        data = [b'abc\x00', b'hub', b'blue hub']
+        for source in (lambda: data, lambda: iter(data), lambda: io.BytesIO(b"\n".join(data)), lambda: b"\n".join(data)):
+            self.assertListEqual([b'hub', b'blue hub'], grep(source(), b"hub", block_size=4))
+            self.assertListEqual([b'hub', b'blue hub'], grep(source(), b"hub", block_size=4, binary_files='text'))
+            self.assertListEqual([], grep(source(), b"hub", block_size=4, binary_files='without-match'))
+            self.assertListEqual(['Binary file matches'], grep(source(), b"hub", block_size=4, binary_files='binary'))
+            self.assertListEqual([], grep(source(), b"wrong", block_size=4, binary_files='binary'))
+            self.assertEqual(0, grep(source(), b"hub", block_size=4, c=True, binary_files='without-match'))
+            self.assertEqual(2, grep(source(), b"hub", block_size=4, c=True, binary_files='binary'))
+
+        # text targets are checked too, and iterators are not consumed by the check
+        lines = iter(['a\x00', 'hub'])
+        self.assertListEqual(['Binary file matches'], grep(lines, "hub", binary_files='binary'))
+        self.assertListEqual(self.test_list, grep(iter(self.test_list), "", binary_files='without-match'))
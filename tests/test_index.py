@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for the trigram index.
+"""
+from grepfunc import compile, grep_file, grep_paths, build_index, TrigramIndex
+from grepfunc import index
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestTrigramIndex(unittest.TestCase):
+    """
+    Unittests to test build_index and grepping with an index.
+    """
+    def setUp(self):
+        """
+        Create temp dir with test files, and index them.
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.files_dir = os.path.join(self.temp_dir, 'files')
+        os.makedirs(self.files_dir)
+        for i in range(4):
+            lines = ["line %d of file %d: %s" % (n, i, "Error found" if n % (100 + i * 37) == 5 else "all good")
+                     for n in range(1000)]
+            self.write_file("\n".join(lines) + "\n", "file%d.log" % i)
+        self.write_file(u"stränge ünicode line\nKILO LINE\n", "unicode.log")
+        self.index = build_index(os.path.join(self.temp_dir, 'test.idx'), self.files_dir, block_size=1024, workers=1)
+
+    def tearDown(self):
+        """
+        Delete temp dir.
+        """
+        self.index.close()
+        shutil.rmtree(self.temp_dir)
+
+    def write_file(self, content, name):
+        """
+        Write a test file and return its path.
+        """
+        path = os.path.join(self.files_dir, name)
+        with open(path, 'wb') as outfile:
+            outfile.write(content.encode('utf-8'))
+        return path
+
+    def assert_same_results(self, idx):
+        """
+        Check that grepping with index returns the same results as without it, for different patterns and flags.
+        """
+        for pattern, flags in (("Error", {}), ("error found", {'i': True}), ("Error", {'F': True, 'n': True}),
+                               (["good", "Error"], {'F': True}), (r"line \d+ of file 2: Error", {}),
+                               ("(Error|Warning) found", {}), ("line 5 ", {'A': 1, 'B': 2}), ("Error", {'b': True}),
+                               ("found", {'v': True, 'c': True}), ("nomatch", {}), ("ünicode", {}),
+                               ("kilo", {'i': True}), ("ERROR", {'i': True, 'F': True}), (r"\d", {})):
+            expected = sorted(grep_paths(self.files_dir, pattern, workers=1, **flags)) \
+                if not flags.get('c') else grep_paths(self.files_dir, pattern, workers=1, **flags)
+            for workers in (1, 2):
+                result = grep_paths(self.files_dir, pattern, workers=workers, index=idx, **flags)
+                self.assertEqual(expected, sorted(result) if not flags.get('c') else result)
+            path = os.path.join(self.files_dir, "file2.log")
+            self.assertEqual(grep_file(path, pattern, **flags), grep_file(path, pattern, index=idx, **flags))
+
+    def test_same_as_grep(self):
+        """
+        Testing that results with index are the same as without it.
+        """
+        self.assert_same_results(self.index)
+        self.assert_same_results(TrigramIndex(self.index.path))
+
+    def test_candidates(self):
+        """
+        Testing that index narrows down candidate files and blocks.
+        """
+        path = os.path.join(self.files_dir, "file0.log")
+        self.assertListEqual([path], self.index.candidate_files(r"file 0: Err\w+"))
+        self.assertListEqual([], self.index.candidate_blocks(path, compile("nomatch")))
+        blocks = self.index.candidate_blocks(path, compile("Error"))
+        self.assertTrue(0 < sum(end - start for start, end, first_line in blocks) < os.path.getsize(path) // 2)
+
+        # patterns without literals can't use the index
+        self.assertIsNone(self.index.candidate_blocks(path, compile(r"\d")))
+        self.assertIsNone(self.index.candidate_blocks(path, compile("Error", v=True)))
+        self.assertIsNone(self.index.candidate_blocks(path, compile("Er")))
+
+    def test_refresh(self):
+        """
+        Testing that changed files are grepped entirely until refreshing index, and that refresh updates index.
+        """
+        path = self.write_file("new file with Error in it\n", "file1.log")
+        os.remove(os.path.join(self.files_dir, "file3.log"))
+        self.write_file("another new file\n", "new.log")
+        self.assertIsNone(self.index.candidate_blocks(path, compile("Error")))
+        self.assert_same_results(self.index)
+
+        self.index.refresh(workers=1)
+        self.assertEqual(sorted(["file0.log", "file1.log", "file2.log", "new.log", "unicode.log"]),
+                         sorted(os.path.basename(p) for p in self.index.files))
+        self.assertEqual([(0, 26, 0)], self.index.candidate_blocks(path, compile("Error")))
+        self.assert_same_results(self.index)
+
+    def test_postings_encoding(self):
+        """
+        Testing encoding and decoding posting lists.
+        """
+        for block_ids in ([], [0], [1, 2, 3], [5, 127, 128, 300, 70000, 2 ** 40]):
+            self.assertListEqual(block_ids, index._decode_postings(index._encode_postings(block_ids)))
+
+
+if __name__ == '__main__':
+    unittest.main()
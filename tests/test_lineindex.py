@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for the line index and grepping ranges of lines.
+"""
+from grepfunc import grep_file, build_line_index, LineIndex, build_index, compile
+from grepfunc import lineindex, files
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestLineIndex(unittest.TestCase):
+    """
+    Unittests to test build_line_index and grepping ranges of lines.
+    """
+    def setUp(self):
+        """
+        Create temp dir with a test file.
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.lines = [u"line %d: %s" % (n, u"Error größe" if n % 37 == 5 else u"all good") for n in range(2000)]
+        self.path = self.write_file(u"\n".join(self.lines) + u"\n", "test.log")
+
+    def tearDown(self):
+        """
+        Delete temp dir.
+        """
+        shutil.rmtree(self.temp_dir)
+
+    def write_file(self, content, name, mode='wb'):
+        """
+        Write a test file and return its path.
+        """
+        path = os.path.join(self.temp_dir, name)
+        with open(path, mode) as outfile:
+            outfile.write(content.encode('utf-8'))
+        return path
+
+    def expected(self, pattern, start_line, end_line, **flags):
+        """
+        Get the expected results of grepping a range of lines, by grepping the whole file.
+        """
+        values = files._grep_path(self.path, compile(pattern, **flags), True)
+        return [value for line_index, value in values if start_line <= line_index < end_line]
+
+    def test_build(self):
+        """
+        Testing building, saving and loading a line index.
+        """
+        idx = build_line_index(self.path, step=100)
+        self.assertTrue(os.path.exists(self.path + '.lidx'))
+        self.assertEqual(idx.lines_count, 2000)
+        self.assertEqual(len(idx.offsets), 21)
+        loaded = LineIndex(self.path)
+        self.assertEqual(loaded.step, 100)
+        self.assertListEqual(list(loaded.offsets), list(idx.offsets))
+        self.assertEqual(loaded.line_offset(250), len(u"\n".join(self.lines[:250]).encode('utf-8')) + 1)
+
+        # different step builds a new index
+        self.assertEqual(LineIndex(self.path, step=10).lines_count, 0)
+
+    def test_read_lines(self):
+        """
+        Testing reading ranges of lines with index.
+        """
+        idx = build_line_index(self.path, step=64)
+        self.assertListEqual(idx.read_lines(130, 140), self.lines[130:140])
+        self.assertListEqual(idx.read_lines(1990), self.lines[1990:])
+        self.assertListEqual(idx.read_lines(0, 3, encoding=None), [line.encode('utf-8') for line in self.lines[:3]])
+        self.assertListEqual(idx.read_lines(5000, 5010), [])
+
+    def test_append(self):
+        """
+        Testing that lines appended to file are indexed incrementally, and changed files are indexed again.
+        """
+        idx = build_line_index(self.path, step=64)
+        self.write_file(u"new line 1\nnew line 2\npartial", "test.log", 'ab')
+        self.assertListEqual(idx.read_lines(1999, 2010), [self.lines[-1], u"new line 1", u"new line 2", u"partial"])
+        self.assertEqual(idx.lines_count, 2002)
+        self.assertListEqual(list(idx.offsets), list(build_line_index(self.path, self.path + '.new', 64).offsets))
+
+        # replaced file
+        os.rename(self.path, self.path + '.old')
+        self.write_file(u"other\nfile\n", "test.log")
+        self.assertListEqual(idx.read_lines(0), [u"other", u"file"])
+        self.assertEqual(idx.lines_count, 2)
+
+    def test_grep_range(self):
+        """
+        Testing grepping a range of lines, with and without index.
+        """
+        idx = build_line_index(self.path, step=50)
+        for pattern, flags in (("Error", {'n': True}), ("größe", {'b': True}), ("good", {'v': True}),
+                               ("Error", {'A': 2, 'B': 3}), ("Error", {'F': True, 'o': True, 'n': True})):
+            for start_line, end_line in ((0, 10), (120, 480), (1990, 2000), (1000, 1000), (300, 200), (1500, 9000)):
+                expected = self.expected(pattern, start_line, end_line, **flags)
+                for line_index in (None, idx, True):
+                    result = grep_file(self.path, pattern, start_line=start_line, end_line=end_line,
+                                       line_index=line_index, **flags)
+                    self.assertEqual(result, expected)
+
+        # max count and count
+        self.assertListEqual(grep_file(self.path, "Error", start_line=500, end_line=1000, m=2, n=True),
+                             self.expected("Error", 500, 1000, n=True)[:2])
+        self.assertEqual(grep_file(self.path, "Error", start_line=500, end_line=1000, c=True, line_index=idx),
+                         len(self.expected("Error", 500, 1000)))
+
+        # without end line, and with a line index of another file
+        self.assertListEqual(grep_file(self.path, "Error", start_line=1900, n=True),
+                             self.expected("Error", 1900, 2000, n=True))
+        other = self.write_file(u"other\n", "other.log")
+        self.assertRaises(ValueError, lambda: grep_file(other, "Error", start_line=1, line_index=idx))
+
+    def test_grep_range_with_trigram_index(self):
+        """
+        Testing grepping a range of lines with a trigram index.
+        """
+        idx = build_index(os.path.join(self.temp_dir, 'test.idx'), self.path, block_size=512, workers=1)
+        try:
+            result = grep_file(self.path, "Error", index=idx, start_line=300, end_line=700, n=True)
+            self.assertListEqual(result, self.expected("Error", 300, 700, n=True))
+        finally:
+            idx.close()
+
+    def test_grep_range_compressed(self):
+        """
+        Testing grepping a range of lines in a compressed file.
+        """
+        path = os.path.join(self.temp_dir, 'test.log.gz')
+        with gzip.open(path, 'wb') as outfile:
+            outfile.write((u"\n".join(self.lines) + u"\n").encode('utf-8'))
+        self.assertListEqual(grep_file(path, "Error", start_line=300, end_line=700, n=True, A=1),
+                             self.expected("Error", 300, 700, n=True, A=1))
+        self.assertRaises(ValueError, lambda: build_line_index(path))
+
+    def test_line_position(self):
+        """
+        Testing finding the position of a line by counting lines.
+        """
+        buff = b"a\nbb\n\nccc\nd"
+        for line, position in ((0, 0), (1, 2), (2, 5), (3, 6), (4, 10), (5, 11), (9, 11)):
+            self.assertEqual(lineindex._line_position(buff, line), position)
+        self.assertEqual(lineindex._line_position(buff, 4, 5, 2), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for finding the literals a regex requires.
+"""
+from grepfunc import grep
+from grepfunc.literals import required_literals
+import re
+import sys
+import unittest
+
+
+class TestRequiredLiterals(unittest.TestCase):
+    """
+    Unittests to test required_literals.
+    """
+
+    def test_literals(self):
+        """
+        Testing literals found in regex patterns.
+        """
+        self.assertEqual((('ERROR ',), False), required_literals(r"ERROR .* user=\d+"))
+        self.assertEqual((('ms timeout',), False), required_literals(r"\d+ms timeout"))
+        self.assertEqual((('ERROR', 'WARN'), False), required_literals(r"(ERROR|WARN) .*user"))
+        self.assertEqual((('hub',), False), required_literals(r"\bhub\b"))
+        self.assertEqual((('abc',), False), required_literals(r"x?(abc)+"))
+        self.assertEqual((('fatal',), False), required_literals(r"(?:warn)?fatal"))
+
+    def test_no_literals(self):
+        """
+        Testing patterns without required literals.
+        """
+        self.assertEqual(None, required_literals(r"\d+"))
+        self.assertEqual(None, required_literals(r"a|\d"))
+        self.assertEqual(None, required_literals(r"(abc)*"))
+        self.assertEqual(None, required_literals(r"(?!abc)"))
+
+    def test_ignore_case(self):
+        """
+        Testing literals when ignoring case skip letters that match special unicode characters.
+        """
+        self.assertEqual((('error ',), True), required_literals(r"ERROR \d+", re.IGNORECASE))
+        self.assertEqual((('error ',), True), required_literals(r"(?i)ERROR \d+"))
+        self.assertEqual((('tatu',), True), required_literals(r"status", re.IGNORECASE))
+
+    @unittest.skipIf(sys.version_info < (3, 6), "Scoped inline flags require Python 3.6 or newer.")
+    def test_scoped_ignore_case(self):
+        """
+        Testing literals of a pattern that ignores case only in a group.
+        """
+        self.assertEqual((('ab',), False), required_literals(r"ab(?i:cd)"))
+
+    def test_grep_results(self):
+        """
+        Testing prefilter doesn't change grep results.
+        """
+        lines = [u'status ok', u'ſtatus ok', u'STATUS ok', u'Kelvin', u'kelvin', u'other']
+        for pattern in (u"status", u"kelvin", u"stat\\w+ ok"):
+            expected = [line for line in lines if re.search(pattern, line, re.IGNORECASE)]
+            self.assertListEqual(expected, grep(lines, pattern, i=True))
+            self.assertListEqual(expected, grep(u"\n".join(lines), pattern, i=True, block_size=7))
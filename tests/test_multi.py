@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for grepping with multiple queries.
+"""
+from grepfunc import grep, grep_multi, compile, GrepStats
+from grepfunc import multi
+import io
+import unittest
+
+# test file path
+test_file_path = "test.txt"
+
+
+class TestGrepMulti(unittest.TestCase):
+    """
+    Unittests to test grep_multi.
+    """
+    # test words (read from file)
+    with open(test_file_path, 'r') as infile:
+        test_words = [x[:-1] for x in infile.readlines()]
+
+    # queries to test, with different patterns and flags
+    queries = {
+        'plain': ("hub", {}),
+        'fixed': (["dog", "hub"], {'F': True, 'n': True}),
+        'ignore_case': ("HUB", {'i': True, 'b': True}),
+        'words': ("hub", {'w': True}),
+        'invert': ("o", {'v': True, 'm': 5}),
+        'count': ("h.b", {'c': True}),
+        'quiet': ("dog", {'q': True}),
+        'quiet_no_match': ("not there", {'q': True}),
+        'only_matching': (r"h\w+", {'o': True, 'n': True}),
+        'context': ("hub", {'A': 1, 'B': 2}),
+        'merge': ("hub", {'A': 2, 'merge_context': True, 'group_separator': '--'}),
+        'trim': ("hottub", {'t': True, 'x': True}),
+        'max_count': ("o", {'m': 3, 'n': True}),
+        'compiled': compile("dog", i=True),
+    }
+
+    def __expected(self, target_factory):
+        """
+        Grep every query separately.
+        """
+        ret = {}
+        for name, query in self.queries.items():
+            if isinstance(query, tuple):
+                ret[name] = grep(target_factory(), query[0], **query[1])
+            else:
+                ret[name] = grep(target_factory(), query)
+        return ret
+
+    def test_targets(self):
+        """
+        Testing multiple queries return the same as grepping every query separately, for different targets.
+        """
+        text = u"\n".join(self.test_words) + u"\n"
+        for target_factory in (lambda: self.test_words, lambda: iter(self.test_words), lambda: io.StringIO(text),
+                               lambda: (lambda: self.test_words)):
+            self.assertEqual(self.__expected(target_factory), grep_multi(target_factory(), self.queries))
+
+    def test_batches(self):
+        """
+        Testing results don't depend on batches size.
+        """
+        expected = self.__expected(lambda: self.test_words)
+        first, size = multi.FIRST_BATCH_LINES, multi.BATCH_LINES
+        try:
+            multi.FIRST_BATCH_LINES, multi.BATCH_LINES = 1, 7
+            self.assertEqual(expected, grep_multi(self.test_words, self.queries))
+        finally:
+            multi.FIRST_BATCH_LINES, multi.BATCH_LINES = first, size
+
+    def test_shared_flags(self):
+        """
+        Testing flags shared by all queries.
+        """
+        self.assertEqual({'a': grep(self.test_words, "HUB", i=True, n=True),
+                          'b': grep(self.test_words, "DOG", i=True, c=True)},
+                         grep_multi(self.test_words, {'a': "HUB", 'b': ("DOG", {'c': True})}, i=True, n=True))
+        self.assertEqual({}, grep_multi(self.test_words, {}))
+
+    def test_stops_reading(self):
+        """
+        Testing target is not read after all queries are done.
+        """
+        read = [0]
+
+        def lines():
+            for i in range(100000):
+                read[0] += 1
+                yield "line %d" % i
+
+        self.assertEqual({'q': True, 'm': ["line 1", "line 10"]},
+                         grep_multi(lines(), {'q': ("line 5", {'q': True}), 'm': ("line 1", {'m': 2})}))
+        self.assertTrue(read[0] < 1000)
+
+    def test_bytes_and_binary(self):
+        """
+        Testing bytes queries and binary_files flag.
+        """
+        data = b"head\x00\nerror 1\nok\nerror 2\n"
+        queries = {'all': b"error", 'binary': (b"error", {'binary_files': 'binary'}),
+                   'skip': (b"error", {'binary_files': 'without-match'}),
+                   'decoded': (b"error", {'encoding': 'utf-8', 'n': True})}
+        self.assertEqual({'all': [b"error 1", b"error 2"], 'binary': ['Binary file matches'], 'skip': [],
+                          'decoded': [(1, u"error 1"), (3, u"error 2")]},
+                         grep_multi(io.BytesIO(data), queries))
+
+        # mixing bytes and text queries (on python 2 bytes is str, so they can't be mixed)
+        if bytes is not str:
+            self.assertRaises(ValueError, grep_multi, self.test_words, {'a': "hub", 'b': b"hub"})
+
+    def test_stats(self):
+        """
+        Testing stats are collected once for lines read.
+        """
+        stats = GrepStats()
+        grep_multi(self.test_words, {'a': "hub", 'b': ("dog", {'c': True})}, stats=stats)
+        self.assertEqual(len(self.test_words), stats.lines)
+
+
+if __name__ == '__main__':
+    unittest.main()
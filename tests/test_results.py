@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for compact results and the all_matches flag.
+"""
+from grepfunc import grep, grep_iter, grep_multi, GrepResults, GrepMatch
+import io
+import unittest
+
+# test file path
+test_file_path = "test.txt"
+
+
+class TestGrepResults(unittest.TestCase):
+    """
+    Unittests to test compact results and all_matches.
+    """
+    # test words (read from file)
+    with open(test_file_path, 'r') as infile:
+        test_words = [x[:-1] for x in infile.readlines()]
+
+    def test_list_target(self):
+        """
+        Testing compact results of a list target.
+        """
+        results = grep(self.test_words, "hub", compact=True)
+        self.assertIsInstance(results, GrepResults)
+        self.assertListEqual(results.lines(), grep(self.test_words, "hub"))
+        self.assertListEqual(list(results.line_numbers), [i for i, _ in grep(self.test_words, "hub", n=True)])
+        self.assertIsNone(results.offsets)
+        self.assertListEqual(results.texts(), grep(self.test_words, "hub", o=True))
+
+    def test_string_target(self):
+        """
+        Testing compact results of a string target, with line offsets.
+        """
+        text = "one\ntwo hub\nthree\nhub hub\n"
+        results = grep(text, "hub", compact=True, block_size=8)
+        self.assertListEqual(results.lines(), ["two hub", "hub hub"])
+        self.assertListEqual(list(results.offsets), [4, 18])
+        match = results[1]
+        self.assertIsInstance(match, GrepMatch)
+        self.assertEqual(match.line_number, 3)
+        self.assertEqual(match.line_offset, 18)
+        self.assertEqual((match.start, match.end), (0, 3))
+        self.assertEqual(match.text, "hub")
+
+    def test_file_target(self):
+        """
+        Testing compact results of a file target.
+        """
+        with open(test_file_path, 'r') as infile:
+            results = grep(infile, "hub", compact=True, i=True)
+        self.assertListEqual(results.lines(), grep(self.test_words, "hub", i=True))
+        self.assertEqual(len(results), len(grep(self.test_words, "hub", i=True)))
+
+    def test_invert(self):
+        """
+        Testing compact results with invert flag.
+        """
+        results = grep(self.test_words, "o", compact=True, v=True, m=3)
+        self.assertListEqual(results.lines(), grep(self.test_words, "o", v=True, m=3))
+        self.assertTrue(all(match.start == -1 for match in results))
+        self.assertListEqual(results.texts(), results.lines())
+
+    def test_indexing(self):
+        """
+        Testing indexing and slicing compact results.
+        """
+        results = grep(self.test_words, "o", compact=True)
+        self.assertEqual(results[-1].line, results.lines()[-1])
+        self.assertListEqual([match.line for match in results[1:3]], results.lines()[1:3])
+        self.assertRaises(IndexError, lambda: results[len(results)])
+
+    @unittest.skipIf(bytes is str, "Python 2 has no separate bytes type.")
+    def test_bytes(self):
+        """
+        Testing compact results of bytes targets.
+        """
+        target = io.BytesIO(u"größe\nklein\ngröß\n".encode('utf-8'))
+        results = grep(target, u"größ".encode('utf-8'), compact=True)
+        self.assertListEqual(results.lines(), [u"größe".encode('utf-8'), u"größ".encode('utf-8')])
+        target = io.BytesIO(u"größe\nklein\ngröß\n".encode('utf-8'))
+        results = grep(target, u"größ".encode('utf-8'), compact=True, encoding='utf-8')
+        self.assertListEqual(results.texts(), [u"größ", u"größ"])
+
+    def test_context_not_supported(self):
+        """
+        Testing that compact results don't support context.
+        """
+        self.assertRaises(ValueError, lambda: grep(self.test_words, "hub", compact=True, A=1))
+
+    def test_all_matches(self):
+        """
+        Testing all_matches flag.
+        """
+        lines = ["a hub and a hub", "nothing", "hubhub"]
+        self.assertListEqual(grep(lines, "hub", o=True), ["hub", "hub"])
+        self.assertListEqual(grep(lines, "hub", o=True, all_matches=True), ["hub"] * 4)
+        self.assertListEqual(grep(lines, "hub", o=True, n=True, all_matches=True),
+                             [(0, "hub"), (0, "hub"), (2, "hub"), (2, "hub")])
+        self.assertListEqual(list(grep_iter(lines, "hub", o=True, all_matches=True)), ["hub"] * 4)
+        self.assertListEqual(grep(lines, ["hub", "and"], F=True, o=True, all_matches=True),
+                             ["hub", "and", "hub", "hub", "hub"])
+        self.assertListEqual(grep(lines, "hub", o=True, w=True, all_matches=True), ["hub", "hub"])
+        self.assertDictEqual(grep_multi(lines, {'all': ("hub", {'o': True, 'all_matches': True})}),
+                             {'all': ["hub"] * 4})
+
+        # compact results keep every match
+        results = grep(lines, "hub", compact=True, all_matches=True)
+        self.assertListEqual(list(results.line_numbers), [0, 0, 2, 2])
+        self.assertListEqual([(match.start, match.end) for match in results], [(2, 5), (12, 15), (0, 3), (3, 6)])
+
+        # context is not supported
+        self.assertRaises(ValueError, lambda: grep(lines, "hub", o=True, A=1, all_matches=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Tests for grep statistics.
+"""
+from grepfunc import grep, grep_iter, compile, GrepStats
+import io
+import unittest
+
+
+class TestGrepStats(unittest.TestCase):
+    """
+    Unittests to test collecting stats with GrepStats.
+    """
+    # test lines: every 10th line is an error
+    lines = ["line %d: %s" % (i, "error found" if i % 10 == 0 else "all good") for i in range(1000)]
+
+    def test_counters(self):
+        """
+        Testing counters for different targets and flags.
+        """
+        text = u"\n".join(self.lines) + u"\n"
+        for target, flags in ((self.lines, {}), (iter(self.lines), {}), (io.StringIO(text), {}),
+                              (io.StringIO(text), {'c': True}), (text, {'block_size': 1000}),
+                              (lambda: self.lines, {'n': True})):
+            stats = GrepStats()
+            result = grep(target, "error", stats=stats, **flags)
+            self.assertEqual(100, result if flags.get('c') else len(result))
+            self.assertEqual(1000, stats.lines)
+            self.assertEqual(100, stats.matches)
+            self.assertTrue(stats.chars >= len(text) - 1000)
+            self.assertAlmostEqual(0.1, stats.hit_rate)
+            self.assertTrue(stats.total_time >= stats.read_time + stats.match_time)
+            self.assertEqual(set(GrepStats.COUNTERS) | set(['hit_rate', 'regex_calls', 'other_time']),
+                             set(stats.as_dict()))
+
+    def test_prefilter(self):
+        """
+        Testing counting lines rejected by the regex literals prefilter.
+        """
+        stats = GrepStats()
+        self.assertEqual(100, len(grep(iter(self.lines), r"err\w+ found", stats=stats)))
+        self.assertEqual(1000, stats.match_calls)
+        self.assertEqual(900, stats.prefiltered)
+        self.assertEqual(100, stats.regex_calls)
+
+        # counters add up over calls with the same stats, until reset
+        matcher = compile(r"err\w+ found", stats=stats)
+        self.assertEqual(100, len(list(grep_iter(iter(self.lines), matcher))))
+        self.assertEqual(2000, stats.lines)
+        stats.reset()
+        self.assertEqual(0, stats.lines)
+
+    def test_callbacks(self):
+        """
+        Testing progress and slow match callbacks.
+        """
+        progress = []
+        slow = []
+        stats = GrepStats(on_progress=lambda s: progress.append(s.lines), progress_interval=300,
+                          on_slow_match=lambda s, line, seconds: slow.append(line), slow_match_time=0)
+        grep(iter(self.lines), "error", stats=stats)
+        self.assertListEqual([300, 600, 900], progress)
+        self.assertEqual(1000, len(slow))
+        self.assertEqual(1000, stats.slow_matches)
+
+    def test_results_unchanged(self):
+        """
+        Testing stats don't change results.
+        """
+        for flags in ({}, {'i': True}, {'v': True, 'n': True}, {'A': 1, 'B': 1}, {'o': True}, {'q': True}, {'m': 3},
+                      {'F': True, 'w': True}, {'A': 2, 'merge_context': True}):
+            self.assertEqual(grep(self.lines, "error", **flags), grep(self.lines, "error", stats=GrepStats(), **flags))
+
+
+if __name__ == '__main__':
+    unittest.main()